@@ -1,44 +1,82 @@
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
+from pydantic import ValidationError
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.pagination import Cursor, decode_cursor
 from app.core.security import verify_token
 from app.database import get_session
 from app.models.user import User, UserRole
 from app.schemas.user import TokenData
+from app.services.user_cache import CachedUser, get_cached_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
 
+def get_token_data(token: str = Depends(oauth2_scheme)) -> TokenData:
     try:
         payload = verify_token(token)
-        email: str | None = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except jwt.InvalidTokenError:
+        return TokenData(
+            user_id=payload.get("sub"),  # type: ignore
+            role=payload.get("role"),  # type: ignore
+            version=payload.get("ver"),  # type: ignore
+        )
+    except (jwt.InvalidTokenError, ValidationError):
+        raise credentials_exception
+
+
+async def get_current_identity(
+    token_data: TokenData = Depends(get_token_data),
+    session: AsyncSession = Depends(get_session),
+) -> CachedUser:
+    cached = await get_cached_user(token_data.user_id, session)
+    if cached is None or cached.token_version != token_data.version:
         raise credentials_exception
 
-    user = session.exec(select(User).where(User.email == token_data.email)).first()
+    return cached
+
+
+async def get_current_user(
+    identity: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
+) -> User:
+    user = await session.get(User, identity.id)
     if user is None:
         raise credentials_exception
 
     return user
 
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
-    if current_user.role != UserRole.ADMIN:
+async def require_admin(
+    identity: CachedUser = Depends(get_current_identity),
+) -> CachedUser:
+    if identity.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required"
         )
-    return current_user
+    return identity
+
+
+def get_cursor(cursor: str | None = Query(default=None)) -> Cursor | None:
+    if cursor is None:
+        return None
+
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def get_idempotency_key(
+    idempotency_key: str | None = Header(default=None, min_length=1, max_length=255),
+) -> str | None:
+    return idempotency_key
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1 import auth, cart, orders, products, users, webhooks
+from app.api.v1 import admin, auth, cart, orders, products, users, webhooks
 
 api_router = APIRouter()
 
@@ -10,3 +10,4 @@ api_router.include_router(products.router, prefix="/products", tags=["Products"]
 api_router.include_router(cart.router, prefix="/cart", tags=["Shopping Cart"])
 api_router.include_router(orders.router, prefix="/orders", tags=["Orders"])
 api_router.include_router(webhooks.router, prefix="/webhooks", tags=["Webhooks"])
+api_router.include_router(admin.router, prefix="/admin", tags=["Admin"])
@@ -0,0 +1,115 @@
+from datetime import date
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.dependencies import require_admin
+from app.database import get_session
+from app.models.report import DailyOrderStatus, DailyProductSales
+from app.models.webhook import WebhookEvent, WebhookEventStatus
+from app.schemas.report import OrderStatusReport, ProductRevenueReport
+from app.schemas.webhook import (
+    WebhookEventResponse,
+    WebhookInboxStats,
+    WebhookReplayRequest,
+    WebhookReplayResponse,
+)
+from app.services.reports import from_cents
+from app.services.user_cache import CachedUser
+from app.services.webhook_inbox import replay_webhook_events, webhook_inbox_stats
+
+router = APIRouter()
+
+
+@router.get("/reports/revenue-by-product", response_model=list[ProductRevenueReport])
+async def revenue_by_product(
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    limit: int = Query(10, ge=1, le=1000),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    revenue = func.sum(DailyProductSales.revenue_cents)
+    query = select(
+        DailyProductSales.product_id, func.sum(DailyProductSales.quantity), revenue
+    )
+    if start is not None:
+        query = query.where(DailyProductSales.day >= start)
+    if end is not None:
+        query = query.where(DailyProductSales.day <= end)
+    query = (
+        query.group_by(col(DailyProductSales.product_id))
+        .having(revenue != 0)
+        .order_by(revenue.desc(), col(DailyProductSales.product_id))
+        .limit(limit)
+    )
+
+    return [
+        ProductRevenueReport(
+            product_id=product_id, quantity=quantity, revenue=from_cents(cents)
+        )
+        for product_id, quantity, cents in (await session.exec(query)).all()
+    ]
+
+
+@router.get("/reports/orders-by-status", response_model=list[OrderStatusReport])
+async def orders_by_status(
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    query = select(DailyOrderStatus).where(DailyOrderStatus.orders != 0)
+    if start is not None:
+        query = query.where(DailyOrderStatus.day >= start)
+    if end is not None:
+        query = query.where(DailyOrderStatus.day <= end)
+    query = query.order_by(col(DailyOrderStatus.day), col(DailyOrderStatus.status))
+
+    return [
+        OrderStatusReport(
+            day=row.day,
+            status=row.status,
+            orders=row.orders,
+            revenue=from_cents(row.revenue_cents),
+        )
+        for row in (await session.exec(query)).all()
+    ]
+
+
+@router.get("/webhooks/stats", response_model=WebhookInboxStats)
+async def webhook_stats(
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    return await webhook_inbox_stats(session)
+
+
+@router.get("/webhooks/events", response_model=list[WebhookEventResponse])
+async def list_webhook_events(
+    status: WebhookEventStatus = Query(default=WebhookEventStatus.FAILED),
+    limit: int = Query(50, ge=1, le=1000),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    query = (
+        select(WebhookEvent)
+        .where(WebhookEvent.status == status)
+        .order_by(col(WebhookEvent.received_at))
+        .limit(limit)
+    )
+
+    return (await session.exec(query)).all()
+
+
+@router.post("/webhooks/replay", response_model=WebhookReplayResponse)
+async def replay_webhooks(
+    replay: WebhookReplayRequest,
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    replayed = await replay_webhook_events(session, replay.event_ids)
+
+    return WebhookReplayResponse(replayed=replayed)
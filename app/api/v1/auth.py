@@ -1,21 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session, select
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import create_access_token, hash_password, verify_password
+from app.core.security import (
+    create_access_token,
+    hash_password_async,
+    password_needs_rehash,
+    verify_password_async,
+)
 from app.database import get_session
 from app.models.user import User
-from app.schemas.user import Token, UserCreate, UserResponse
+from app.schemas.user import RefreshRequest, Token, UserCreate, UserResponse
+from app.services.refresh_token import issue_refresh_token, rotate_refresh_token
+from app.services.user_cache import CachedUser, cache_user, get_cached_user
 
 router = APIRouter()
 
 
+def issue_access_token(user: User | CachedUser) -> str:
+    return create_access_token(
+        {"sub": str(user.id), "role": user.role.value, "ver": user.token_version}
+    )
+
+
 @router.post(
     "/register", status_code=status.HTTP_201_CREATED, response_model=UserResponse
 )
-def register(user_data: UserCreate, session: Session = Depends(get_session)):
-    existing_user = session.exec(
-        select(User).where(User.email == user_data.email)
+async def register(user_data: UserCreate, session: AsyncSession = Depends(get_session)):
+    existing_user = (
+        await session.exec(select(User).where(User.email == user_data.email))
     ).first()
     if existing_user:
         raise HTTPException(
@@ -25,30 +39,75 @@ def register(user_data: UserCreate, session: Session = Depends(get_session)):
     new_user = User(
         full_name=user_data.full_name,
         email=user_data.email,
-        hashed_password=hash_password(user_data.password),
+        hashed_password=await hash_password_async(user_data.password),
     )
 
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user)
 
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ):
-    user = session.exec(select(User).where(User.email == form_data.username)).first()
+    user = (
+        await session.exec(select(User).where(User.email == form_data.username))
+    ).first()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await verify_password_async(
+        form_data.password, user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token({"sub": user.email})
+    if password_needs_rehash(user.hashed_password):
+        await session.exec(
+            update(User)
+            .where(User.id == user.id)  # type: ignore
+            .values(hashed_password=await hash_password_async(form_data.password))
+        )
+
+    assert user.id is not None
+    refresh_token = issue_refresh_token(session, user.id)
+    await session.commit()
 
-    return Token(access_token=access_token, token_type="bearer")
+    cache_user(user)
+
+    return Token(
+        access_token=issue_access_token(user),
+        token_type="bearer",
+        refresh_token=refresh_token,
+    )
+
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    refresh_data: RefreshRequest, session: AsyncSession = Depends(get_session)
+):
+    invalid_refresh_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    rotated = await rotate_refresh_token(session, refresh_data.refresh_token)
+    if rotated is None:
+        raise invalid_refresh_token
+
+    user_id, refresh_token = rotated
+    identity = await get_cached_user(user_id, session)
+    if identity is None:
+        raise invalid_refresh_token
+
+    return Token(
+        access_token=issue_access_token(identity),
+        token_type="bearer",
+        refresh_token=refresh_token,
+    )
@@ -1,42 +1,72 @@
+from collections.abc import Sequence
 from datetime import datetime, timezone
 from decimal import Decimal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
-
-from app.api.dependencies import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import insert
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.dependencies import get_current_identity
+from app.core.conditional import (
+    is_not_modified,
+    make_etag,
+    not_modified,
+    validator_headers,
+)
 from app.database import get_session
 from app.models.cart import Cart, CartItem
+from app.models.order import Order, OrderItem
 from app.models.product import Product
-from app.models.user import User
 from app.schemas.cart import (
+    CartBatchRequest,
     CartItemCreate,
     CartItemResponse,
     CartItemUpdate,
+    CartOperation,
+    CartOperationType,
     CartResponse,
 )
-from app.schemas.product import ProductResponse
+from app.services.product_cache import (
+    CachedProduct,
+    available_stock,
+    get_cached_products,
+)
+from app.services.user_cache import CachedUser
 
 router = APIRouter()
 
 
-def get_user_cart(user_id: int, session: Session) -> Cart:
-    cart = session.exec(select(Cart).where(Cart.user_id == user_id)).first()
+async def get_user_cart(user_id: int, session: AsyncSession) -> Cart:
+    cart = (await session.exec(select(Cart).where(Cart.user_id == user_id))).first()
 
     if not cart:
         cart = Cart(user_id=user_id)
 
         session.add(cart)
-        session.commit()
-        session.refresh(cart)
+        await session.commit()
+        await session.refresh(cart)
 
     return cart
 
 
-def build_cart_response(cart: Cart, session: Session) -> CartResponse:
-    assert cart.id is not None
+async def load_cart_lines(
+    cart: Cart, session: AsyncSession
+) -> tuple[Sequence[CartItem], dict[int, CachedProduct]]:
+    cart_items = (
+        await session.exec(select(CartItem).where(CartItem.cart_id == cart.id))
+    ).all()
+    products = await get_cached_products(
+        (item.product_id for item in cart_items), session
+    )
+
+    return cart_items, products
 
-    cart_items = session.exec(select(CartItem).where(CartItem.cart_id == cart.id)).all()
+
+def assemble_cart_response(
+    cart: Cart, cart_items: Sequence[CartItem], products: dict[int, CachedProduct]
+) -> CartResponse:
+    assert cart.id is not None
 
     items_response: list[CartItemResponse] = []
     total = Decimal(0)
@@ -44,24 +74,26 @@ def build_cart_response(cart: Cart, session: Session) -> CartResponse:
     for item in cart_items:
         assert item.id is not None
 
-        product = session.get(Product, item.product_id)
-        if not product:
+        cached = products.get(item.product_id)
+        if not cached:
             continue
 
-        subtotal = product.price * item.quantity
+        subtotal = cached.response.price * item.quantity
         total += subtotal
 
+        # Every value already has its schema type (ORM columns and cached,
+        # validated products), so the responses are built without validation.
         items_response.append(
-            CartItemResponse(
+            CartItemResponse.model_construct(
                 id=item.id,
-                product=ProductResponse(**product.model_dump()),
+                product=cached.response,
                 quantity=item.quantity,
                 subtotal=subtotal,
                 added_at=item.added_at,
             )
         )
 
-    return CartResponse(
+    return CartResponse.model_construct(
         id=cart.id,
         user_id=cart.user_id,
         items=items_response,
@@ -71,44 +103,152 @@ def build_cart_response(cart: Cart, session: Session) -> CartResponse:
     )
 
 
+async def build_cart_response(cart: Cart, session: AsyncSession) -> CartResponse:
+    cart_items, products = await load_cart_lines(cart, session)
+
+    return assemble_cart_response(cart, cart_items, products)
+
+
+async def apply_cart_operations(
+    cart: Cart, operations: Sequence[CartOperation], session: AsyncSession
+) -> None:
+    assert cart.id is not None
+
+    items = {
+        item.product_id: item
+        for item in (
+            await session.exec(select(CartItem).where(CartItem.cart_id == cart.id))
+        ).all()
+    }
+    quantities = {product_id: item.quantity for product_id, item in items.items()}
+
+    product_ids = {
+        operation.product_id
+        for operation in operations
+        if operation.op != CartOperationType.REMOVE
+    }
+    stock: dict[int, int] = {}
+    if product_ids:
+        stock = await available_stock(
+            (
+                await session.exec(
+                    select(
+                        Product.id, Product.stock_quantity, Product.stock_shards
+                    ).where(col(Product.id).in_(product_ids))
+                )
+            ).all(),
+            session,
+        )
+
+    missing = sorted(product_ids - stock.keys())
+    if missing:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND,
+            detail=f"Products not found: {', '.join(map(str, missing))}",
+        )
+
+    for operation in operations:
+        if operation.op == CartOperationType.REMOVE:
+            quantities.pop(operation.product_id, None)
+            continue
+
+        assert operation.quantity is not None
+        if operation.op == CartOperationType.ADD:
+            quantities[operation.product_id] = (
+                quantities.get(operation.product_id, 0) + operation.quantity
+            )
+        else:
+            quantities[operation.product_id] = operation.quantity
+
+    short = sorted(
+        product_id
+        for product_id in product_ids
+        if product_id in quantities and stock[product_id] < quantities[product_id]
+    )
+    if short:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail=f"Insufficient stock for products: {', '.join(map(str, short))}",
+        )
+
+    for product_id, item in items.items():
+        if product_id not in quantities:
+            await session.delete(item)
+        elif item.quantity != quantities[product_id]:
+            item.quantity = quantities[product_id]
+            session.add(item)
+
+    now = datetime.now(timezone.utc)
+    new_items = [
+        {
+            "cart_id": cart.id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "added_at": now,
+        }
+        for product_id, quantity in quantities.items()
+        if product_id not in items
+    ]
+    if new_items:
+        await session.exec(insert(CartItem), params=new_items)  # type: ignore
+
+    cart.updated_at = now
+    session.add(cart)
+
+
 @router.get("/", response_model=CartResponse)
-def get_my_cart(
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+async def get_my_cart(
+    request: Request,
+    response: Response,
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
-    cart = get_user_cart(current_user.id, session)
+    cart = await get_user_cart(current_user.id, session)
+    cart_items, products = await load_cart_lines(cart, session)
+
+    etag = make_etag(
+        "cart", cart.id, cart.updated_at, *sorted(p.etag for p in products.values())
+    )
+    last_modified = max(
+        [cart.updated_at, *(p.last_modified for p in products.values())]
+    )
+    headers = validator_headers(etag, last_modified, "private, no-cache")
+
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(headers)
 
-    return build_cart_response(cart, session)
+    response.headers.update(headers)
+    return assemble_cart_response(cart, cart_items, products)
 
 
 @router.post("/items", response_model=CartResponse)
-def add_item_to_cart(
+async def add_item_to_cart(
     item_data: CartItemCreate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
-
-    cart = get_user_cart(current_user.id, session)
+    cart = await get_user_cart(current_user.id, session)
     assert cart.id is not None
 
-    product = session.get(Product, item_data.product_id)
+    product = await session.get(Product, item_data.product_id)
     if not product:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Product not found")
 
-    if product.stock_quantity < item_data.quantity:
+    stock = (await available_stock([product], session))[item_data.product_id]
+    if stock < item_data.quantity:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="Insufficient stock")
 
-    existing_item = session.exec(
-        select(CartItem).where(
-            CartItem.cart_id == cart.id, CartItem.product_id == item_data.product_id
+    existing_item = (
+        await session.exec(
+            select(CartItem).where(
+                CartItem.cart_id == cart.id, CartItem.product_id == item_data.product_id
+            )
         )
     ).first()
 
     if existing_item:
         new_quantity = existing_item.quantity + item_data.quantity
-        if product.stock_quantity < new_quantity:
+        if stock < new_quantity:
             raise HTTPException(
                 status.HTTP_400_BAD_REQUEST, detail="Insufficient stock"
             )
@@ -125,29 +265,76 @@ def add_item_to_cart(
     cart.updated_at = datetime.now(timezone.utc)
     session.add(cart)
 
-    session.commit()
+    await session.commit()
+
+    return await build_cart_response(cart, session)
+
+
+@router.post("/items:batch", response_model=CartResponse)
+async def batch_update_cart(
+    batch: CartBatchRequest,
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
+):
+    cart = await get_user_cart(current_user.id, session)
+
+    await apply_cart_operations(cart, batch.operations, session)
+    await session.commit()
+
+    return await build_cart_response(cart, session)
+
+
+@router.post("/reorder/{order_id}", response_model=CartResponse)
+async def reorder(
+    order_id: int,
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
+):
+    order_items = (
+        await session.exec(
+            select(OrderItem.product_id, OrderItem.quantity)
+            .join(Order)
+            .where(Order.id == order_id, Order.user_id == current_user.id)
+        )
+    ).all()
+    if not order_items:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Order not found")
+
+    cart = await get_user_cart(current_user.id, session)
+
+    await apply_cart_operations(
+        cart,
+        [
+            CartOperation(
+                op=CartOperationType.ADD, product_id=product_id, quantity=quantity
+            )
+            for product_id, quantity in order_items
+        ],
+        session,
+    )
+    await session.commit()
 
-    return build_cart_response(cart, session)
+    return await build_cart_response(cart, session)
 
 
 @router.patch("/items/{item_id}", response_model=CartResponse)
-def update_cart_item(
+async def update_cart_item(
     item_id: int,
     item_data: CartItemUpdate,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
-    cart = get_user_cart(current_user.id, session)
+    cart = await get_user_cart(current_user.id, session)
 
-    cart_item = session.get(CartItem, item_id)
+    cart_item = await session.get(CartItem, item_id)
     if not cart_item or cart_item.cart_id != cart.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found"
         )
 
-    product = session.get(Product, item_id)
-    if product and product.stock_quantity < item_data.quantity:
+    product = await session.get(Product, cart_item.product_id)
+    stock = await available_stock([product] if product else [], session)
+    if stock.get(cart_item.product_id, 0) < item_data.quantity:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Insufficient stock"
         )
@@ -159,48 +346,48 @@ def update_cart_item(
     cart.updated_at = datetime.now(timezone.utc)
     session.add(cart)
 
-    session.commit()
+    await session.commit()
 
-    return build_cart_response(cart, session)
+    return await build_cart_response(cart, session)
 
 
 @router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-def remove_cart_item(
+async def remove_cart_item(
     item_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
-    cart = get_user_cart(current_user.id, session)
+    cart = await get_user_cart(current_user.id, session)
 
-    cart_item = session.get(CartItem, item_id)
+    cart_item = await session.get(CartItem, item_id)
     if not cart_item or cart_item.cart_id != cart.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Cart item not found"
         )
 
-    session.delete(cart_item)
+    await session.delete(cart_item)
 
     cart.updated_at = datetime.now(timezone.utc)
     session.add(cart)
 
-    session.commit()
+    await session.commit()
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
-def clear_cart(
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+async def clear_cart(
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
-    cart = get_user_cart(current_user.id, session)
+    cart = await get_user_cart(current_user.id, session)
 
-    cart_items = session.exec(select(CartItem).where(CartItem.cart_id == cart.id)).all()
+    cart_items = (
+        await session.exec(select(CartItem).where(CartItem.cart_id == cart.id))
+    ).all()
 
     for item in cart_items:
-        session.delete(item)
+        await session.delete(item)
 
     cart.updated_at = datetime.now(timezone.utc)
     session.add(cart)
 
-    session.commit()
+    await session.commit()
@@ -1,87 +1,187 @@
+import math
+from collections import defaultdict
+from collections.abc import AsyncIterator, Sequence
 from datetime import datetime, timezone
 from decimal import Decimal
+from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlmodel import Session, desc, select  # type: ignore # noqa: F401
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlmodel import col, desc, select, update  # type: ignore # noqa: F401
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.dependencies import get_current_user, require_admin
+from app.api.dependencies import (
+    get_current_identity,
+    get_cursor,
+    get_idempotency_key,
+    require_admin,
+)
 from app.api.v1.cart import get_user_cart
-from app.database import get_session
+from app.api.v1.products import as_utc
+from app.core.export import ExportFormat, export_response
+from app.core.pagination import NEXT_CURSOR_HEADER, Cursor, apply_keyset, split_page
+from app.database import get_session, stream_records
 from app.models.cart import CartItem
 from app.models.order import Order, OrderItem, OrderStatus
 from app.models.product import Product
-from app.models.user import User
+from app.models.reservation import StockReservation
 from app.schemas.order import (
     CheckoutResponse,
     OrderItemResponse,
     OrderResponse,
     OrderStatusUpdate,
 )
-from app.schemas.product import ProductResponse
-from app.services.payment import create_checkout_session
+from app.services.idempotency import run_idempotent
+from app.services.payment import (
+    PaymentUnavailable,
+    checkout_expiry,
+    create_checkout_session,
+)
+from app.services.product_cache import (
+    CachedProduct,
+    get_cached_products,
+    invalidate_products,
+)
+from app.services.reports import record_order_placed, record_status_changes
+from app.services.reservation import (
+    confirm_order_reservations,
+    extend_order_reservations,
+    release_order_reservations,
+    reservation_expiry,
+)
+from app.services.stock import InsufficientStock, take_stock
+from app.services.user_cache import CachedUser
 
 router = APIRouter()
 
 
-def build_order_response(order: Order, session: Session) -> OrderResponse:
-    assert order.id is not None
+async def build_order_responses(
+    orders: Sequence[Order], session: AsyncSession
+) -> list[OrderResponse]:
+    order_ids = [order.id for order in orders]
+    if not order_ids:
+        return []
 
-    order_items = session.exec(
-        select(OrderItem).where(OrderItem.order_id == order.id)
+    order_items = (
+        await session.exec(
+            select(OrderItem)
+            .where(OrderItem.order_id.in_(order_ids))  # type: ignore
+            .order_by(OrderItem.id)  # type: ignore
+        )
     ).all()
+    products = await get_cached_products(
+        (item.product_id for item in order_items), session
+    )
+
+    return assemble_order_responses(orders, order_items, products)
+
 
-    items_response: list[OrderItemResponse] = []
+def assemble_order_responses(
+    orders: Sequence[Order],
+    order_items: Sequence[OrderItem],
+    products: dict[int, CachedProduct],
+) -> list[OrderResponse]:
+    items_by_order: dict[int, list[OrderItemResponse]] = defaultdict(list)
     for item in order_items:
         assert item.id is not None
 
-        product = session.get(Product, item.product_id)
-        if not product:
+        cached = products.get(item.product_id)
+        if not cached:
             continue
 
-        items_response.append(
-            OrderItemResponse(
+        # Built from ORM columns and cached, validated products, so there is
+        # nothing left to validate.
+        items_by_order[item.order_id].append(
+            OrderItemResponse.model_construct(
                 id=item.id,
-                product=ProductResponse(**product.model_dump()),
+                product=cached.response,
                 quantity=item.quantity,
                 price_at_purchase=item.price_at_purchase,
                 subtotal=item.subtotal,
             )
         )
 
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        items=items_response,
-        total_price=order.total_price,
-        status=order.status,
-        created_at=order.created_at,
-        updated_at=order.updated_at,
-    )
+    responses: list[OrderResponse] = []
+    for order in orders:
+        assert order.id is not None
+
+        responses.append(
+            OrderResponse.model_construct(
+                id=order.id,
+                user_id=order.user_id,
+                items=items_by_order[order.id],
+                total_price=order.total_price,
+                status=order.status,
+                created_at=order.created_at,
+                updated_at=order.updated_at,
+            )
+        )
+
+    return responses
+
+
+async def build_order_response(order: Order, session: AsyncSession) -> OrderResponse:
+    return (await build_order_responses([order], session))[0]
+
+
+def paginate_orders(
+    query: Any, cursor: Cursor | None, skip: int, limit: int | None
+) -> Any:
+    try:
+        return apply_keyset(
+            query, Order.created_at, Order.id, cursor, limit, descending=True
+        ).offset(skip)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=OrderResponse)
-def create_order(
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+async def create_order(
+    request: Request,
+    idempotency_key: str | None = Depends(get_idempotency_key),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
+    return await run_idempotent(
+        request,
+        current_user.id,
+        idempotency_key,
+        lambda: place_order(current_user, session),
+        status_code=status.HTTP_201_CREATED,
+    )
+
 
-    cart = get_user_cart(current_user.id, session)
-    cart_items = session.exec(select(CartItem).where(CartItem.cart_id == cart.id)).all()
+async def place_order(current_user: CachedUser, session: AsyncSession) -> OrderResponse:
+    cart = await get_user_cart(current_user.id, session)
+    cart_items = (
+        await session.exec(select(CartItem).where(CartItem.cart_id == cart.id))
+    ).all()
     if not cart_items:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Cart is empty"
         )
 
+    products = {
+        product.id: product
+        for product in (
+            await session.exec(
+                select(Product).where(
+                    Product.id.in_([item.product_id for item in cart_items])  # type: ignore
+                )
+            )
+        ).all()
+    }
+
     total_price = Decimal(0)
     for item in cart_items:
-        product = session.get(Product, item.product_id)
+        product = products.get(item.product_id)
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Product {item.product_id} not found",
             )
-        if product.stock_quantity < item.quantity:
+        if not product.stock_shards and product.stock_quantity < item.quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Insufficient stock for {product.name}",
@@ -91,118 +191,259 @@ def create_order(
     order = Order(user_id=current_user.id, total_price=total_price)
 
     session.add(order)
-    session.commit()
-    session.refresh(order)
+    await session.flush()
 
     assert order.id is not None
 
+    expires_at = reservation_expiry()
+    order_items: list[OrderItem] = []
     for item in cart_items:
-        product = session.get(Product, item.product_id)
-        if not product:
-            continue
-        assert product.id is not None
+        product = products[item.product_id]
 
-        subtotal = product.price * item.quantity
+        try:
+            slot = await take_stock(session, product, item.quantity)
+        except InsufficientStock:
+            detail = f"Insufficient stock for {product.name}"
+            await session.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
 
         order_item = OrderItem(
             order_id=order.id,
-            product_id=product.id,
+            product_id=item.product_id,
             quantity=item.quantity,
             price_at_purchase=product.price,
-            subtotal=subtotal,
+            subtotal=product.price * item.quantity,
         )
+        order_items.append(order_item)
         session.add(order_item)
+        session.add(
+            StockReservation(
+                order_id=order.id,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                stock_slot=slot,
+                expires_at=expires_at,
+            )
+        )
+        await session.delete(item)
 
-        product.stock_quantity -= item.quantity
-        session.add(product)
+    cart.updated_at = datetime.now(timezone.utc)
+    session.add(cart)
 
-    for item in cart_items:
-        session.delete(item)
+    await record_order_placed(session, order, order_items)
+    await session.commit()
 
-    session.commit()
+    invalidate_products(*(item.product_id for item in cart_items))
 
-    return build_order_response(order, session)
+    return await build_order_response(order, session)
 
 
 @router.get("/", response_model=list[OrderResponse])
-def get_my_orders(
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+async def get_my_orders(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int | None = Query(default=None, ge=1, le=100),
+    cursor: Cursor | None = Depends(get_cursor),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    orders = session.exec(select(Order).where(Order.user_id == current_user.id)).all()
-    return [build_order_response(order, session) for order in orders]
+    query = select(Order).where(Order.user_id == current_user.id)
+    query = paginate_orders(query, cursor, skip, limit)
+
+    orders, next_cursor = split_page((await session.exec(query)).all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return await build_order_responses(orders, session)
 
 
 @router.get("/all", response_model=list[OrderResponse])
-def get_all_orders(
+async def get_all_orders(
+    response: Response,
     status: OrderStatus | None = Query(default=None),
     user_id: int | None = Query(default=None),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    admin: User = Depends(require_admin),
-    session: Session = Depends(get_session),
+    cursor: Cursor | None = Depends(get_cursor),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
 ):
     query = select(Order)
     if status:
         query = query.where(Order.status == status)
     if user_id:
         query = query.where(Order.user_id == user_id)
-    query = query.order_by(Order.created_at.desc()).offset(skip).limit(limit)  # type: ignore
+    query = paginate_orders(query, cursor, skip, limit)
+
+    orders, next_cursor = split_page((await session.exec(query)).all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return await build_order_responses(orders, session)
+
+
+ORDER_EXPORT_COLUMNS = [
+    "order_id",
+    "user_id",
+    "status",
+    "total_price",
+    "created_at",
+    "updated_at",
+    "item_id",
+    "product_id",
+    "quantity",
+    "price_at_purchase",
+    "subtotal",
+]
+ORDER_ITEM_EXPORT_COLUMNS = ORDER_EXPORT_COLUMNS[6:]
+
+
+async def nest_order_items(
+    chunks: AsyncIterator[list[dict[str, Any]]],
+) -> AsyncIterator[list[dict[str, Any]]]:
+    current: dict[str, Any] | None = None
+
+    async for rows in chunks:
+        orders: list[dict[str, Any]] = []
+        for row in rows:
+            item = {name: row.pop(name) for name in ORDER_ITEM_EXPORT_COLUMNS}
+            if current is None or current["order_id"] != row["order_id"]:
+                if current is not None:
+                    orders.append(current)
+                current = {**row, "items": []}
+            if item["item_id"] is not None:
+                current["items"].append(item)
+        yield orders
+
+    if current is not None:
+        yield [current]
+
+
+@router.get("/export")
+async def export_orders(
+    status: OrderStatus | None = Query(default=None),
+    user_id: int | None = Query(default=None),
+    created_after: datetime | None = Query(default=None),
+    created_before: datetime | None = Query(default=None),
+    format: ExportFormat = Query(default=ExportFormat.CSV),
+    gzip: bool = Query(default=False),
+    admin: CachedUser = Depends(require_admin),
+):
+    query = select(
+        col(Order.id).label("order_id"),
+        Order.user_id,
+        Order.status,
+        Order.total_price,
+        Order.created_at,
+        Order.updated_at,
+        col(OrderItem.id).label("item_id"),
+        OrderItem.product_id,
+        OrderItem.quantity,
+        OrderItem.price_at_purchase,
+        OrderItem.subtotal,
+    ).outerjoin(OrderItem, col(OrderItem.order_id) == Order.id)
+    if status:
+        query = query.where(Order.status == status)
+    if user_id:
+        query = query.where(Order.user_id == user_id)
+    if created_after is not None:
+        query = query.where(Order.created_at >= as_utc(created_after))
+    if created_before is not None:
+        query = query.where(Order.created_at < as_utc(created_before))
+    query = query.order_by(Order.created_at, Order.id, OrderItem.id)  # type: ignore
 
-    orders = session.exec(query).all()
-    return [build_order_response(order, session) for order in orders]
+    chunks = stream_records(query)
+    if format == ExportFormat.NDJSON:
+        chunks = nest_order_items(chunks)
+
+    return export_response(chunks, format, ORDER_EXPORT_COLUMNS, "orders", gzip)
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
-def get_order(
+async def get_order(
     order_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    assert current_user.id is not None
-
-    order = session.exec(
-        select(Order).where(Order.id == order_id, Order.user_id == current_user.id)
+    order = (
+        await session.exec(
+            select(Order).where(Order.id == order_id, Order.user_id == current_user.id)
+        )
     ).first()
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
         )
 
-    return build_order_response(order, session)
+    return await build_order_response(order, session)
 
 
 @router.patch("/{order_id}", response_model=OrderResponse)
-def update_order_status(
+async def update_order_status(
     order_id: int,
     status_update: OrderStatusUpdate,
-    admin: User = Depends(require_admin),
-    session: Session = Depends(get_session),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
 ):
-    order = session.get(Order, order_id)
+    order = await session.get(Order, order_id)
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Order not found"
         )
 
+    if (
+        order.status == OrderStatus.CANCELLED
+        and status_update.status != OrderStatus.CANCELLED
+    ):
+        # The stock of a cancelled order has already gone back on sale.
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cancelled orders cannot be reopened",
+        )
+
+    released: list[int] = []
+    if status_update.status == OrderStatus.CANCELLED:
+        released = await release_order_reservations(session, order_id)
+    elif status_update.status != OrderStatus.PENDING:
+        await confirm_order_reservations(session, order_id)
+
+    await record_status_changes(session, [order], order.status, status_update.status)
+
     order.status = status_update.status
     order.updated_at = datetime.now(timezone.utc)
 
     session.add(order)
-    session.commit()
-    session.refresh(order)
+    await session.commit()
+    await session.refresh(order)
+
+    invalidate_products(*released)
 
-    return build_order_response(order, session)
+    return await build_order_response(order, session)
 
 
 @router.post("/{order_id}/checkout", response_model=CheckoutResponse)
-def create_order_checkout(
+async def create_order_checkout(
     order_id: int,
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    request: Request,
+    idempotency_key: str | None = Depends(get_idempotency_key),
+    current_user: CachedUser = Depends(get_current_identity),
+    session: AsyncSession = Depends(get_session),
 ):
-    order = session.exec(
-        select(Order).where(Order.id == order_id, Order.user_id == current_user.id)
+    return await run_idempotent(
+        request,
+        current_user.id,
+        idempotency_key,
+        lambda: start_checkout(order_id, current_user, session),
+    )
+
+
+async def start_checkout(
+    order_id: int, current_user: CachedUser, session: AsyncSession
+) -> CheckoutResponse:
+    order = (
+        await session.exec(
+            select(Order).where(Order.id == order_id, Order.user_id == current_user.id)
+        )
     ).first()
     if not order:
         raise HTTPException(
@@ -215,21 +456,46 @@ def create_order_checkout(
             detail=f"Order is already {order.status}",
         )
 
+    # SQLite holds the database lock for as long as a transaction is open, so
+    # none may span the Stripe round trip.
+    await session.commit()
+
+    # The reservations are extended to the session's expiry, so the stock stays
+    # held for as long as the customer can pay.
+    expires_at = checkout_expiry(reservation_expiry())
     try:
-        checkout = create_checkout_session(
-            order_id=order_id,
-            amount=order.total_price,
+        checkout = await create_checkout_session(
+            order_id=order_id, amount=order.total_price, expires_at=expires_at
+        )
+    except PaymentUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(max(e.retry_after, 1)))},
         )
-
-        order.stripe_checkout_session_id = checkout["id"]
-        order.updated_at = datetime.now(timezone.utc)
-
-        session.add(order)
-        session.commit()
-
-        return CheckoutResponse(session_id=checkout["id"], checkout_url=checkout["url"])
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create checkout: {str(e)}",
         )
+
+    # The sweeper may have cancelled the order while Stripe was answering.
+    attached = await session.exec(
+        update(Order)
+        .where(col(Order.id) == order_id, col(Order.status) == OrderStatus.PENDING)
+        .values(
+            stripe_checkout_session_id=checkout["id"],
+            updated_at=datetime.now(timezone.utc),
+        )
+    )
+    if not attached.rowcount:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Order is no longer pending",
+        )
+
+    await extend_order_reservations(session, order_id, expires_at)
+    await session.commit()
+
+    return CheckoutResponse(session_id=checkout["id"], checkout_url=checkout["url"])
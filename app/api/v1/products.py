@@ -1,96 +1,387 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlmodel import Session, select
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any
 
-from app.api.dependencies import require_admin
-from app.database import get_session
-from app.models.product import Product
-from app.models.user import User
-from app.schemas.product import ProductCreate, ProductResponse, ProductUpdate
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import case, func, literal_column
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.dependencies import get_cursor, require_admin
+from app.config import settings
+from app.core.conditional import is_not_modified, not_modified, validator_headers
+from app.core.export import ExportFormat, export_response
+from app.core.pagination import NEXT_CURSOR_HEADER, Cursor, apply_keyset, split_page
+from app.database import get_session, stream_records
+from app.models.product import Product, ProductStockShard
+from app.schemas.product import (
+    ProductCreate,
+    ProductImportReport,
+    ProductResponse,
+    ProductSort,
+    ProductUpdate,
+    StockShardsUpdate,
+)
+from app.services.product_cache import (
+    cache_page,
+    cache_products,
+    clear_product_caches,
+    get_cached_product,
+    invalidate_products,
+    product_page_cache,
+)
+from app.services.product_import import (
+    import_products,
+    iter_csv_rows,
+    iter_ndjson_rows,
+)
+from app.services.search import build_match_query, search_products_query
+from app.services.stock import set_sharded_stock, set_stock_shards
+from app.services.user_cache import CachedUser
 
 router = APIRouter()
 
 
+def catalog_cache_control() -> str:
+    return f"public, max-age={settings.catalog_cache_max_age_seconds}"
+
+
+PRODUCT_SORTS: dict[ProductSort, tuple[Any, bool]] = {
+    ProductSort.CREATED: (Product.created_at, False),
+    ProductSort.NEWEST: (Product.created_at, True),
+    ProductSort.PRICE: (Product.price, False),
+    ProductSort.PRICE_DESC: (Product.price, True),
+    ProductSort.NAME: (Product.name, False),
+}
+
+
+def as_utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def product_list_query(
+    *,
+    min_price: Decimal | None = None,
+    max_price: Decimal | None = None,
+    in_stock: bool = False,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    sort: ProductSort = ProductSort.CREATED,
+    cursor: Cursor | None = None,
+    skip: int = 0,
+    limit: int | None = 10,
+) -> Any:
+    query = select(Product)
+    if min_price is not None:
+        query = query.where(Product.price >= min_price)
+    if max_price is not None:
+        query = query.where(Product.price <= max_price)
+    if in_stock:
+        query = query.where(Product.stock_quantity > literal_column("0"))
+    if created_after is not None:
+        query = query.where(Product.created_at >= as_utc(created_after))
+    if created_before is not None:
+        query = query.where(Product.created_at < as_utc(created_before))
+
+    key_column, descending = PRODUCT_SORTS[sort]
+
+    return apply_keyset(
+        query, key_column, Product.id, cursor, limit, descending=descending
+    ).offset(skip)
+
+
 @router.get("/", response_model=list[ProductResponse])
-def list_products(
+async def list_products(
+    request: Request,
+    response: Response,
+    min_price: Decimal | None = Query(default=None, ge=0),
+    max_price: Decimal | None = Query(default=None, ge=0),
+    in_stock: bool = Query(default=False),
+    created_after: datetime | None = Query(default=None),
+    created_before: datetime | None = Query(default=None),
+    sort: ProductSort = Query(default=ProductSort.CREATED),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    session: Session = Depends(get_session),
+    cursor: Cursor | None = Depends(get_cursor),
+    session: AsyncSession = Depends(get_session),
+):
+    page_key = (
+        min_price,
+        max_price,
+        in_stock,
+        created_after,
+        created_before,
+        sort,
+        skip,
+        limit,
+        cursor,
+    )
+    page = product_page_cache.get(page_key)
+
+    if page is None:
+        try:
+            query = product_list_query(
+                min_price=min_price,
+                max_price=max_price,
+                in_stock=in_stock,
+                created_after=created_after,
+                created_before=created_before,
+                sort=sort,
+                cursor=cursor,
+                skip=skip,
+                limit=limit,
+            )
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+        key = PRODUCT_SORTS[sort][0].key
+        rows, next_cursor = split_page((await session.exec(query)).all(), limit, key)
+        page = await cache_page(page_key, rows, next_cursor, session)
+
+    headers = validator_headers(page.etag, cache_control=catalog_cache_control())
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+
+    if is_not_modified(request, page.etag):
+        return not_modified(headers)
+
+    response.headers.update(headers)
+    return page.products
+
+
+PRODUCT_EXPORT_COLUMNS = list(ProductResponse.model_fields)
+
+# Sharded stock lives in its slots, like in the other product responses.
+exported_stock = case(
+    (
+        col(Product.stock_shards) > 0,
+        select(func.coalesce(func.sum(ProductStockShard.quantity), 0))
+        .where(ProductStockShard.product_id == Product.id)
+        .scalar_subquery(),
+    ),
+    else_=col(Product.stock_quantity),
+).label("stock_quantity")
+
+
+def export_column(name: str) -> Any:
+    return exported_stock if name == "stock_quantity" else getattr(Product, name)
+
+
+@router.get("/export")
+async def export_products(
+    min_price: Decimal | None = Query(default=None, ge=0),
+    max_price: Decimal | None = Query(default=None, ge=0),
+    in_stock: bool = Query(default=False),
+    created_after: datetime | None = Query(default=None),
+    created_before: datetime | None = Query(default=None),
+    format: ExportFormat = Query(default=ExportFormat.CSV),
+    gzip: bool = Query(default=False),
+    admin: CachedUser = Depends(require_admin),
 ):
-    products = session.exec(select(Product).offset(skip).limit(limit)).all()
+    query = product_list_query(
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+        created_after=created_after,
+        created_before=created_before,
+        limit=None,
+    ).with_only_columns(*(export_column(name) for name in PRODUCT_EXPORT_COLUMNS))
+
+    return export_response(
+        stream_records(query), format, PRODUCT_EXPORT_COLUMNS, "products", gzip
+    )
 
-    return products
+
+async def ensure_sku_available(
+    sku: str | None, product_id: int | None, session: AsyncSession
+) -> None:
+    if sku is None:
+        return
+
+    existing = (
+        await session.exec(
+            select(Product.id).where(Product.sku == sku, Product.id != product_id)
+        )
+    ).first()
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="SKU already in use"
+        )
+
+
+@router.get("/search", response_model=list[ProductResponse])
+async def search_products(
+    q: str = Query(min_length=1, max_length=200),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    session: AsyncSession = Depends(get_session),
+):
+    match = build_match_query(q)
+    if match is None:
+        return []
+
+    products = (await session.exec(search_products_query(match, skip, limit))).all()
+
+    return [cached.response for cached in await cache_products(products, session)]
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, session: Session = Depends(get_session)):
-    product = session.get(Product, product_id)
+async def get_product(
+    product_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+):
+    product = await get_cached_product(product_id, session)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
 
-    return product
+    headers = validator_headers(
+        product.etag, product.last_modified, catalog_cache_control()
+    )
+    if is_not_modified(request, product.etag, product.last_modified):
+        return not_modified(headers)
+
+    response.headers.update(headers)
+    return product.response
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=ProductResponse)
-def create_product(
+async def create_product(
     product_data: ProductCreate,
-    admin: User = Depends(require_admin),
-    session: Session = Depends(get_session),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
 ):
+    await ensure_sku_available(product_data.sku, None, session)
+
     new_product = Product(
         name=product_data.name,
         description=product_data.description,
         price=product_data.price,
         stock_quantity=product_data.stock_quantity,
         image_url=product_data.image_url,
+        sku=product_data.sku,
     )
 
     session.add(new_product)
-    session.commit()
-    session.refresh(new_product)
+    await session.commit()
+    await session.refresh(new_product)
+
+    invalidate_products()
 
     return new_product
 
 
+@router.post("/import", response_model=ProductImportReport)
+async def import_product_catalog(
+    request: Request,
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == "text/csv":
+        rows = iter_csv_rows(
+            request.stream(), settings.product_import_max_record_length
+        )
+    elif content_type in ("application/x-ndjson", "application/ndjson"):
+        rows = iter_ndjson_rows(
+            request.stream(), settings.product_import_max_record_length
+        )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload text/csv or application/x-ndjson",
+        )
+
+    report = await import_products(
+        session,
+        rows,
+        batch_size=settings.product_import_batch_size,
+        max_errors=settings.product_import_max_errors,
+    )
+
+    clear_product_caches()
+
+    return report
+
+
 @router.patch("/{product_id}", response_model=ProductResponse)
-def update_product(
+async def update_product(
     product_id: int,
     product_update: ProductUpdate,
-    admin: User = Depends(require_admin),
-    session: Session = Depends(get_session),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
 ):
-    product = session.get(Product, product_id)
+    product = await session.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
 
     update_data = product_update.model_dump(exclude_unset=True)
+    await ensure_sku_available(update_data.get("sku"), product_id, session)
 
     for key, value in update_data.items():
         setattr(product, key, value)
 
+    if product.stock_shards and "stock_quantity" in update_data:
+        await set_sharded_stock(session, product, product.stock_quantity)
+
+    product.version += 1
+    product.updated_at = datetime.now(timezone.utc)
+
     session.add(product)
-    session.commit()
-    session.refresh(product)
+    await session.commit()
+    await session.refresh(product)
+
+    invalidate_products(product_id)
 
-    return product
+    return (await cache_products([product], session))[0].response
+
+
+@router.put("/{product_id}/stock-shards", response_model=ProductResponse)
+async def update_stock_shards(
+    product_id: int,
+    shards_update: StockShardsUpdate,
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
+):
+    product = await session.get(Product, product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
+        )
+
+    await set_stock_shards(session, product, shards_update.shards)
+    await session.commit()
+    await session.refresh(product)
+
+    invalidate_products(product_id)
+
+    return (await cache_products([product], session))[0].response
 
 
 @router.delete("/{product_id}", status_code=204)
-def delete_product(
+async def delete_product(
     product_id: int,
-    admin: User = Depends(require_admin),
-    session: Session = Depends(get_session),
+    admin: CachedUser = Depends(require_admin),
+    session: AsyncSession = Depends(get_session),
 ):
-    product = session.get(Product, product_id)
+    product = await session.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
 
-    session.delete(product)
-    session.commit()
+    await session.delete(product)
+    await session.commit()
+
+    invalidate_products(product_id)
 
     return None
@@ -1,32 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.dependencies import get_current_user
-from app.core.security import hash_password, verify_password
+from app.api.dependencies import get_current_identity, get_current_user
+from app.core.security import hash_password_async, verify_password_async
 from app.database import get_session
 from app.models.user import User
 from app.schemas.user import ChangePassword, UserResponse, UserUpdate
+from app.services.refresh_token import revoke_user_refresh_tokens
+from app.services.user_cache import CachedUser, invalidate_user
 
 router = APIRouter()
 
 
 @router.get("/me", response_model=UserResponse)
-def get_my_profile(current_user: User = Depends(get_current_user)):
-    return current_user
+async def get_my_profile(identity: CachedUser = Depends(get_current_identity)):
+    return identity.profile
 
 
 @router.patch("/me", response_model=UserResponse)
-def update_my_profile(
+async def update_my_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ):
     update_data = user_update.model_dump(exclude_unset=True)
 
     if "email" in update_data:
-        existing_user = session.exec(
-            select(User).where(
-                User.email == update_data["email"], User.id != current_user.id
+        existing_user = (
+            await session.exec(
+                select(User).where(
+                    User.email == update_data["email"], User.id != current_user.id
+                )
             )
         ).first()
         if existing_user:
@@ -38,19 +43,22 @@ def update_my_profile(
         setattr(current_user, key, value)
 
     session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    await session.commit()
+    await session.refresh(current_user)
+
+    assert current_user.id is not None
+    invalidate_user(current_user.id)
 
     return current_user
 
 
 @router.put("/me/password")
-def change_password(
+async def change_password(
     password_data: ChangePassword,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
 ):
-    if not verify_password(
+    if not await verify_password_async(
         password_data.current_password, current_user.hashed_password
     ):
         raise HTTPException(
@@ -58,9 +66,13 @@ def change_password(
             detail="Current password is incorrect",
         )
 
-    current_user.hashed_password = hash_password(password_data.new_password)
+    current_user.hashed_password = await hash_password_async(password_data.new_password)
 
+    assert current_user.id is not None
     session.add(current_user)
-    session.commit()
+    await revoke_user_refresh_tokens(session, current_user.id)
+    await session.commit()
+
+    invalidate_user(current_user.id)
 
     return {"message": "Password updated successfully"}
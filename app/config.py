@@ -1,4 +1,10 @@
+from typing import Literal, Self
+
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.engine import make_url
+
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
 
 
 class Settings(BaseSettings):
@@ -7,6 +13,11 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "my_secret_key"
     jwt_expire_minutes: int = 10
     jwt_algorithm: str = "HS256"
+    refresh_token_expire_days: int = 30
+
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64
 
     admin_full_name: str = "Admin"
     admin_email: str = "admin@example.com"
@@ -14,10 +25,84 @@ class Settings(BaseSettings):
 
     stripe_secret_key: str = "sk_test..."
     stripe_webhook_secret: str | None = None
+    stripe_api_base: str = "https://api.stripe.com"
+    stripe_connect_timeout_seconds: float = 2
+    stripe_read_timeout_seconds: float = 10
+    stripe_max_connections: int = 20
+    stripe_max_retries: int = 2
+    stripe_retry_backoff_seconds: float = 0.25
+    stripe_breaker_threshold: int = 5
+    stripe_breaker_reset_seconds: float = 30
 
     database_url: str = "sqlite:///./ecommerce.db"
+    # Derived from database_url when empty; both engines must share one schema.
+    async_database_url: str = ""
+    database_async: bool = True
+    database_echo: bool = False
+
+    cache_backend: Literal["memory", "redis"] = "memory"
+    cache_url: str = "redis://localhost:6379/0"
+    cache_max_entries: int = 10000
+    cache_pool_size: int = 10
+    cache_timeout_seconds: float = 1
+
+    product_cache_size: int = 1024
+    product_cache_ttl_seconds: float = 60
+    catalog_cache_max_age_seconds: int = 30
+
+    user_cache_size: int = 4096
+    user_cache_ttl_seconds: float = 30
+
+    # Checkout reuses the TTL for the Stripe session, which must last 30 min to 24 h.
+    reservation_ttl_minutes: int = Field(default=30, ge=30, le=24 * 60)
+    reservation_sweep_interval_seconds: float = 60
+    reservation_sweep_batch_size: int = 500
+
+    stock_rebalance_interval_seconds: float = 30
+
+    product_import_batch_size: int = 1000
+    product_import_max_errors: int = 100
+    product_import_max_record_length: int = 64 * 1024
+
+    export_chunk_size: int = 1000
+
+    webhook_workers: int = 2
+    webhook_batch_size: int = 50
+    webhook_poll_interval_seconds: float = 1
+    webhook_lease_seconds: float = 60
+    webhook_max_attempts: int = 5
+
+    idempotency_ttl_hours: float = 24
+    idempotency_lock_seconds: float = 60
+    idempotency_wait_seconds: float = 10
+    idempotency_purge_interval_seconds: float = 300
+    idempotency_purge_batch_size: int = 1000
+
+    server_timing: bool = True
+    query_count_warning_threshold: int = 30
 
     model_config = SettingsConfigDict(env_file=".env")
 
+    @model_validator(mode="after")
+    def derive_async_database_url(self) -> Self:
+        url = make_url(self.database_url)
+        backend = url.get_backend_name()
+
+        if not self.async_database_url:
+            if backend not in ASYNC_DRIVERS:
+                raise ValueError(f"Set ASYNC_DATABASE_URL for a {backend} database")
+            self.async_database_url = url.set(
+                drivername=f"{backend}+{ASYNC_DRIVERS[backend]}"
+            ).render_as_string(hide_password=False)
+            return self
+
+        async_url = make_url(self.async_database_url)
+        if async_url.set(drivername=backend) != url.set(drivername=backend):
+            raise ValueError(
+                "ASYNC_DATABASE_URL must point at the same database as DATABASE_URL"
+            )
+
+        return self
+
 
 settings = Settings()
@@ -0,0 +1,295 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Any
+from urllib.parse import unquote, urlparse
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend(ABC):
+    """Byte-valued key/value store shared by everything that caches.
+
+    ``ttl`` is in seconds; ``None`` keeps the key until it is evicted or
+    deleted.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    async def get_many(self, keys: Sequence[str]) -> list[bytes | None]: ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None: ...
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> int: ...
+
+    @abstractmethod
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        """Adds ``amount`` to an integer counter; ``ttl`` applies when it is new."""
+
+    @abstractmethod
+    async def expire(self, key: str, ttl: float) -> bool: ...
+
+    @abstractmethod
+    async def ttl(self, key: str) -> float | None:
+        """Remaining lifetime, or None for missing keys and keys without one."""
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """Process-local LRU; each uvicorn worker keeps its own copy."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, tuple[float | None, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def _set(self, key: str, value: bytes, expires_at: float | None) -> None:
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    @staticmethod
+    def _expires_at(ttl: float | None) -> float | None:
+        return None if ttl is None else time.monotonic() + ttl
+
+    async def get(self, key: str) -> bytes | None:
+        with self._lock:
+            return self._get(key)
+
+    async def get_many(self, keys: Sequence[str]) -> list[bytes | None]:
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        with self._lock:
+            self._set(key, value, self._expires_at(ttl))
+
+    async def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        with self._lock:
+            current = self._get(key)
+            if current is None:
+                value, expires_at = amount, self._expires_at(ttl)
+            else:
+                try:
+                    value = int(current) + amount
+                except ValueError:
+                    raise CacheError(f"Value of {key!r} is not an integer")
+                expires_at = self._data[key][0]
+
+            self._set(key, str(value).encode(), expires_at)
+            return value
+
+    async def expire(self, key: str, ttl: float) -> bool:
+        with self._lock:
+            value = self._get(key)
+            if value is None:
+                return False
+
+            self._data[key] = (self._expires_at(ttl), value)
+            return True
+
+    async def ttl(self, key: str) -> float | None:
+        with self._lock:
+            if self._get(key) is None:
+                return None
+
+            expires_at = self._data[key][0]
+            return None if expires_at is None else expires_at - time.monotonic()
+
+
+def encode_command(*args: Any) -> bytes:
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        value = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readuntil(b"\r\n")
+    kind, payload = line[:1], line[1:-2]
+
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise CacheError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+
+    raise CacheError(f"Unexpected reply {line!r}")
+
+
+class RedisCache(CacheBackend):
+    """Speaks the Redis protocol (RESP) over a small pool of connections."""
+
+    def __init__(self, url: str, pool_size: int, timeout: float) -> None:
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported cache URL {url!r}")
+
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots: asyncio.Semaphore | None = None
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        try:
+            for command in setup:
+                writer.write(encode_command(*command))
+                await writer.drain()
+                await read_reply(reader)
+        except BaseException:
+            writer.close()
+            raise
+
+        return reader, writer
+
+    async def execute(self, *args: Any) -> Any:
+        return (await self.pipeline(args))[0]
+
+    async def pipeline(self, *commands: Sequence[Any]) -> list[Any]:
+        """Sends the commands in one write and returns their replies in order."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            try:
+                async with asyncio.timeout(self.timeout):
+                    if connection is None:
+                        connection = await self._connect()
+                    reader, writer = connection
+                    writer.write(b"".join(encode_command(*args) for args in commands))
+                    await writer.drain()
+                    replies: list[Any] = []
+                    for _ in commands:
+                        # Read every reply, even after an error, to keep the
+                        # connection in a clean state.
+                        try:
+                            replies.append(await read_reply(reader))
+                        except CacheError as e:
+                            replies.append(e)
+            except (OSError, TimeoutError, asyncio.IncompleteReadError) as e:
+                if connection is not None:
+                    connection[1].close()
+                raise CacheError(f"Cache unavailable: {type(e).__name__}") from e
+            except BaseException:
+                # The reply may still be in flight, so the connection is unusable.
+                if connection is not None:
+                    connection[1].close()
+                raise
+
+            self._idle.append(connection)
+
+        for reply in replies:
+            if isinstance(reply, CacheError):
+                raise reply
+        return replies
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.execute("GET", key)
+
+    async def get_many(self, keys: Sequence[str]) -> list[bytes | None]:
+        if not keys:
+            return []
+        return await self.execute("MGET", *keys)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        if ttl is None:
+            await self.execute("SET", key, value)
+        else:
+            await self.execute("SET", key, value, "PX", max(int(ttl * 1000), 1))
+
+    async def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return await self.execute("DEL", *keys)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float | None = None) -> int:
+        if ttl is None:
+            return await self.execute("INCRBY", key, amount)
+
+        # Creating the key with its expiry first means no counter ever exists
+        # without one, even if the connection drops between the two commands.
+        _, value = await self.pipeline(
+            ("SET", key, 0, "NX", "PX", max(int(ttl * 1000), 1)),
+            ("INCRBY", key, amount),
+        )
+        return value
+
+    async def expire(self, key: str, ttl: float) -> bool:
+        return await self.execute("PEXPIRE", key, max(int(ttl * 1000), 1)) == 1
+
+    async def ttl(self, key: str) -> float | None:
+        remaining = await self.execute("PTTL", key)
+        return None if remaining < 0 else remaining / 1000
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+def create_cache_backend(
+    backend: str, url: str, maxsize: int, pool_size: int, timeout: float
+) -> CacheBackend:
+    if backend == "memory":
+        return MemoryCache(maxsize)
+    if backend == "redis":
+        return RedisCache(url, pool_size, timeout)
+
+    raise ValueError(f"Unknown cache backend {backend!r}")
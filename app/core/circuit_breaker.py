@@ -0,0 +1,47 @@
+import time
+
+
+class CircuitOpen(Exception):
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"Circuit open, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Fails fast after ``threshold`` consecutive failures.
+
+    Once ``reset_seconds`` have passed a single trial call is let through;
+    its outcome closes the circuit again or restarts the wait.
+    """
+
+    def __init__(self, threshold: int, reset_seconds: float) -> None:
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self) -> None:
+        if self.opened_at is None:
+            return
+
+        remaining = self.opened_at + self.reset_seconds - time.monotonic()
+        if remaining > 0 or self._trial:
+            raise CircuitOpen(max(remaining, 0))
+
+        self._trial = True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._trial = False
@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import zlib
+from collections.abc import AsyncIterator, Iterable, Sequence
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+
+from fastapi.responses import StreamingResponse
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
+
+
+MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+    ExportFormat.NDJSON: "application/x-ndjson",
+}
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_ndjson(records: Iterable[dict[str, Any]]) -> bytes:
+    return "".join(
+        json.dumps(record, default=_plain, separators=(",", ":")) + "\n"
+        for record in records
+    ).encode("utf-8")
+
+
+def encode_csv(rows: Iterable[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_plain(value) for value in row])
+
+    return buffer.getvalue().encode("utf-8")
+
+
+async def encode_records(
+    chunks: AsyncIterator[list[dict[str, Any]]],
+    format: ExportFormat,
+    columns: Sequence[str],
+) -> AsyncIterator[bytes]:
+    if format == ExportFormat.CSV:
+        yield encode_csv([columns])
+
+    async for records in chunks:
+        if format == ExportFormat.CSV:
+            yield encode_csv(
+                [record.get(name) for name in columns] for record in records
+            )
+        else:
+            yield encode_ndjson(records)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def export_response(
+    chunks: AsyncIterator[list[dict[str, Any]]],
+    format: ExportFormat,
+    columns: Sequence[str],
+    filename: str,
+    gzip: bool = False,
+) -> StreamingResponse:
+    body = encode_records(chunks, format, columns)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}.{format.value}"'
+    }
+
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(body, media_type=MEDIA_TYPES[format], headers=headers)
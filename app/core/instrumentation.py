@@ -0,0 +1,127 @@
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    db_seconds: float = 0
+
+
+# Holds the stats of the request being served. The object is shared rather than
+# replaced, so statements run in threadpool copies of the context still count.
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn: Any, *args: Any) -> None:
+    if _query_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn: Any, *args: Any) -> None:
+    stats = _query_stats.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+
+    stats.queries += 1
+    stats.db_seconds += time.perf_counter() - started.pop()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context: Any) -> None:
+    started = (
+        context.connection.info.get("query_started") if context.connection else None
+    )
+    if _query_stats.get() is not None and started:
+        started.pop()
+
+
+def server_timing(stats: QueryStats, total_seconds: float) -> str:
+    return (
+        f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+        f"total;dur={total_seconds * 1000:.1f}"
+    )
+
+
+class RequestStatsMiddleware:
+    """Counts SQL statements and database time per request.
+
+    The totals go out in a ``Server-Timing`` header and an ``app.access`` log
+    line; requests over ``query_count_warning_threshold`` statements also log
+    a warning.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.server_timing:
+                    timing = server_timing(stats, time.perf_counter() - started)
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (b"server-timing", timing.encode()),
+                        ],
+                    }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _query_stats.reset(token)
+            self.log(scope, status_code, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def log(
+        scope: Scope, status_code: int, stats: QueryStats, total_seconds: float
+    ) -> None:
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(total_seconds * 1000, 1),
+            "db_queries": stats.queries,
+            "db_ms": round(stats.db_seconds * 1000, 1),
+        }
+        access_logger.info(
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra=fields,
+        )
+
+        threshold = settings.query_count_warning_threshold
+        if threshold and stats.queries > threshold:
+            logger.warning(
+                "%s %s issued %d SQL statements (threshold %d)",
+                scope["method"],
+                scope["path"],
+                stats.queries,
+                threshold,
+            )
@@ -0,0 +1,97 @@
+import base64
+import json
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Any, NamedTuple, TypeVar
+
+from sqlalchemy import DateTime, Integer, Numeric, literal, tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+T = TypeVar("T")
+
+
+class Cursor(NamedTuple):
+    key: str
+    value: Any
+    id: int
+
+
+def encode_cursor(key: str, value: Any, id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+
+    raw = json.dumps([key, value, id]).encode("utf-8")
+
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, value, id = json.loads(base64.urlsafe_b64decode(padded))
+        return Cursor(str(key), value, int(id))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _coerce_cursor_value(column: Any, value: Any) -> Any:
+    column_type = getattr(column.type, "impl", column.type)
+
+    try:
+        if isinstance(column_type, DateTime):
+            timestamp = datetime.fromisoformat(value)
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            return timestamp
+        if isinstance(column_type, Numeric):
+            return Decimal(value)
+        if isinstance(column_type, Integer):
+            return int(value)
+        return str(value)
+    except (ValueError, TypeError, InvalidOperation) as e:
+        raise ValueError(f"Invalid cursor value for {column.key}") from e
+
+
+def apply_keyset(
+    query: Any,
+    key_column: Any,
+    id_column: Any,
+    cursor: Cursor | None,
+    limit: int | None,
+    descending: bool = False,
+) -> Any:
+    if cursor is not None:
+        if cursor.key != key_column.key:
+            raise ValueError(f"Cursor is not ordered by {key_column.key}")
+
+        key = tuple_(key_column, id_column)
+        bound = tuple_(
+            literal(_coerce_cursor_value(key_column, cursor.value), key_column.type),
+            literal(cursor.id, type_=id_column.type),
+        )
+        query = query.where(key < bound if descending else key > bound)
+
+    if descending:
+        query = query.order_by(key_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(key_column, id_column)
+
+    if limit is None:
+        return query
+
+    return query.limit(limit + 1)
+
+
+def split_page(
+    rows: Sequence[T], limit: int | None, key: str = "created_at"
+) -> tuple[list[T], str | None]:
+    page = list(rows[:limit])
+    if limit is None or len(rows) <= limit or not page:
+        return page, None
+
+    last = page[-1]
+    return page, encode_cursor(key, getattr(last, key), last.id)  # type: ignore
@@ -1,22 +1,157 @@
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.config import settings
 from app.models.cart import Cart, CartItem
+from app.models.idempotency import IdempotencyKey
 from app.models.order import Order, OrderItem
-from app.models.product import Product
+from app.models.product import Product, ProductStockShard
+from app.models.report import DailyOrderStatus, DailyProductSales
+from app.models.reservation import StockReservation
+from app.models.token import RefreshToken
 from app.models.user import User
+from app.models.webhook import WebhookEvent
+from app.services.search import create_search_index
+
+MODELS: list[type[SQLModel]] = [
+    User,
+    Product,
+    ProductStockShard,
+    Cart,
+    CartItem,
+    Order,
+    OrderItem,
+    RefreshToken,
+    StockReservation,
+    DailyProductSales,
+    DailyOrderStatus,
+    WebhookEvent,
+    IdempotencyKey,
+]
+
+
+def use_write_ahead_log(engine: Engine) -> None:
+    """Puts SQLite in WAL mode, so readers and writers no longer block each other.
+
+    In the default rollback journal a writer cannot commit while any read
+    transaction is open, such as a streamed export.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_journal_mode(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
 
-MODELS: list[type[SQLModel]] = [User, Product, Cart, CartItem, Order, OrderItem]
 
 engine = create_engine(
-    settings.database_url, connect_args={"check_same_thread": False}, echo=True
+    settings.database_url,
+    connect_args={"check_same_thread": False},
+    echo=settings.database_echo,
+)
+
+async_engine = create_async_engine(
+    settings.async_database_url, echo=settings.database_echo
 )
 
+use_write_ahead_log(engine)
+use_write_ahead_log(async_engine.sync_engine)
+
+
+class ThreadpoolResult:
+    def __init__(self, result: Any) -> None:
+        self.result = result
+
+    async def partitions(self, size: int | None = None) -> AsyncGenerator[Any, None]:
+        partitions = self.result.partitions(size)
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
+
+
+class ThreadpoolSession:
+    """Awaitable facade over a blocking Session, used when async mode is off.
+
+    It mirrors the subset of the AsyncSession API the routers rely on, so
+    handlers are written once and each blocking call is pushed to the
+    threadpool instead of running on the event loop.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.sync_session = session
+
+    async def _run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(func, *args, **kwargs)
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances: Any) -> None:
+        self.sync_session.add_all(instances)
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+    async def exec(self, statement: Any, **kwargs: Any) -> Any:
+        return await self._run(self.sync_session.exec, statement, **kwargs)
+
+    async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        return await self._run(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def stream(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        result = await self._run(self.sync_session.execute, statement, *args, **kwargs)
+        return ThreadpoolResult(result)
+
+    async def scalar(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        return await self._run(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def get(self, entity: Any, ident: Any, **kwargs: Any) -> Any:
+        return await self._run(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance: Any) -> None:
+        await self._run(self.sync_session.delete, instance)
+
+    async def refresh(self, instance: Any, *args: Any, **kwargs: Any) -> None:
+        await self._run(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def flush(self) -> None:
+        await self._run(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await self._run(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await self._run(self.sync_session.rollback)
+
+
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    if settings.database_async:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    else:
+        with Session(engine, expire_on_commit=False) as session:
+            yield ThreadpoolSession(session)  # type: ignore
+
+
+session_scope = asynccontextmanager(get_session)
+
+
+async def stream_records(statement: Any) -> AsyncGenerator[list[dict[str, Any]], None]:
+    statement = statement.execution_options(yield_per=settings.export_chunk_size)
+
+    async with session_scope() as session:
+        result = await session.stream(statement)
+        async for partition in result.partitions():
+            yield [dict(row._mapping) for row in partition]
 
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        create_search_index(connection)
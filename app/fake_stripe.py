@@ -0,0 +1,120 @@
+"""A local stand-in for the Stripe API, for offline development and load tests.
+
+Run with ``uv run -m app.fake_stripe`` and point the app at it with
+``STRIPE_API_BASE=http://127.0.0.1:12111``.
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+import time
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def decode_form(fields: list[tuple[str, str]]) -> dict[str, Any]:
+    params: dict[str, Any] = {}
+
+    for name, value in fields:
+        keys = name.replace("]", "").split("[")
+        target = params
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+
+    return params
+
+
+def create_fake_stripe(
+    latency_seconds: float = 0, failure_rate: float = 0, seed: int | None = None
+) -> FastAPI:
+    app = FastAPI(title="Fake Stripe")
+    rng = random.Random(seed)
+    sessions: dict[str, dict[str, Any]] = {}
+    idempotent: dict[str, dict[str, Any]] = {}
+
+    @app.post("/v1/checkout/sessions")
+    async def create_checkout_session(request: Request):
+        if latency_seconds:
+            await asyncio.sleep(latency_seconds)
+        if rng.random() < failure_rate:
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"type": "api_error", "message": "Fake failure"}},
+            )
+
+        key = request.headers.get("Idempotency-Key")
+        if key in idempotent:
+            return idempotent[key]
+
+        form = await request.form()
+        params = decode_form([(name, str(value)) for name, value in form.multi_items()])
+        if "expires_at" in params and not (
+            30 * 60 <= int(params["expires_at"]) - time.time() <= 24 * 60 * 60
+        ):
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "error": {
+                        "type": "invalid_request_error",
+                        "message": "expires_at must be between 30 minutes and "
+                        "24 hours after the session is created",
+                    }
+                },
+            )
+        session_id = f"cs_test_{secrets.token_hex(12)}"
+        session = {
+            "id": session_id,
+            "object": "checkout.session",
+            "url": f"{request.base_url}pay/{session_id}",
+            "mode": params.get("mode"),
+            "metadata": params.get("metadata", {}),
+            "expires_at": int(params["expires_at"]) if "expires_at" in params else None,
+            "status": "open",
+        }
+
+        sessions[session_id] = session
+        if key:
+            idempotent[key] = session
+        return session
+
+    @app.get("/v1/checkout/sessions/{session_id}")
+    async def get_checkout_session(session_id: str):
+        if session_id not in sessions:
+            return JSONResponse(
+                status_code=404,
+                content={
+                    "error": {
+                        "type": "invalid_request_error",
+                        "message": f"No such checkout.session: '{session_id}'",
+                    }
+                },
+            )
+        return sessions[session_id]
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake Stripe API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_fake_stripe(args.latency_ms / 1000, args.failure_rate),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,63 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI, Query
+from fastapi import FastAPI, Query, Request, status
+from fastapi.responses import JSONResponse
 
 from app.api.v1 import api_router
 from app.config import settings
+from app.core.cache_backend import create_cache_backend
+from app.core.instrumentation import RequestStatsMiddleware
+from app.core.security import PasswordHasherBusy, password_hasher
 from app.database import create_db_and_tables
+from app.services.idempotency import run_idempotency_purger
+from app.services.payment import stripe_client
+from app.services.reservation import run_reservation_sweeper
+from app.services.stock import run_stock_rebalancer
+from app.services.webhook_inbox import run_webhook_worker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
+    app.state.cache = create_cache_backend(
+        settings.cache_backend,
+        settings.cache_url,
+        settings.cache_max_entries,
+        settings.cache_pool_size,
+        settings.cache_timeout_seconds,
+    )
+    tasks = [
+        asyncio.create_task(run_reservation_sweeper()),
+        asyncio.create_task(run_stock_rebalancer()),
+        asyncio.create_task(run_idempotency_purger()),
+        *(
+            asyncio.create_task(run_webhook_worker())
+            for _ in range(settings.webhook_workers)
+        ),
+    ]
     yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await stripe_client.aclose()
+    await app.state.cache.close()
+    password_hasher.shutdown()
 
 
 app = FastAPI(title=settings.app_name, lifespan=lifespan)
+app.add_middleware(RequestStatsMiddleware)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
 
 app.include_router(api_router, prefix="/api/v1")
 
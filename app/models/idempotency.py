@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+
+from sqlmodel import Field, SQLModel  # type: ignore
+
+
+class IdempotencyKey(SQLModel, table=True):
+    __tablename__ = "idempotency_key"  # type: ignore
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    fingerprint: str
+    status_code: int | None = Field(default=None)
+    response_body: str | None = Field(default=None)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: datetime = Field(index=True)
@@ -2,6 +2,7 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from enum import Enum
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel  # type: ignore
 
 
@@ -10,9 +11,15 @@ class OrderStatus(str, Enum):
     PAID = "paid"
     SHIPPING = "shipping"
     DELIVERED = "delivered"
+    CANCELLED = "cancelled"
 
 
 class Order(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_order_created_at_id", "created_at", "id"),
+        Index("ix_order_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id", index=True)
     total_price: Decimal = Field(max_digits=10, decimal_places=2, gt=0)
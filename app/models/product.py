@@ -1,14 +1,53 @@
 from datetime import datetime, timezone
 from decimal import Decimal
 
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel  # type: ignore
 
 
 class Product(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_product_created_at_id", "created_at", "id"),
+        Index("ix_product_price_id", "price", "id"),
+        Index("ix_product_name_id", "name", "id"),
+        Index(
+            "ix_product_in_stock_created_at_id",
+            "created_at",
+            "id",
+            sqlite_where=text("stock_quantity > 0"),
+        ),
+        Index(
+            "ix_product_in_stock_price_id",
+            "price",
+            "id",
+            sqlite_where=text("stock_quantity > 0"),
+        ),
+        Index(
+            "ix_product_in_stock_name_id",
+            "name",
+            "id",
+            sqlite_where=text("stock_quantity > 0"),
+        ),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
-    name: str = Field(min_length=10, max_length=200, index=True)
+    name: str = Field(min_length=10, max_length=200)
     description: str
     price: Decimal = Field(max_digits=10, decimal_places=2, gt=0)
     stock_quantity: int = Field(ge=0)
+    reserved_quantity: int = Field(default=0, ge=0)
+    stock_shards: int = Field(default=0, ge=0)
     image_url: str | None = Field(default=None)
+    sku: str | None = Field(default=None, unique=True, index=True)
+    version: int = Field(default=1)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class ProductStockShard(SQLModel, table=True):
+    __tablename__ = "product_stock_shard"  # type: ignore
+
+    product_id: int = Field(foreign_key="product.id", primary_key=True)
+    slot: int = Field(primary_key=True)
+    quantity: int = Field(default=0, ge=0)
+    reserved: int = Field(default=0, ge=0)
@@ -0,0 +1,23 @@
+from datetime import date
+
+from sqlmodel import Field, SQLModel  # type: ignore
+
+from app.models.order import OrderStatus
+
+
+class DailyProductSales(SQLModel, table=True):
+    __tablename__ = "daily_product_sales"  # type: ignore
+
+    day: date = Field(primary_key=True)
+    product_id: int = Field(primary_key=True, index=True)
+    quantity: int = Field(default=0)
+    revenue_cents: int = Field(default=0)
+
+
+class DailyOrderStatus(SQLModel, table=True):
+    __tablename__ = "daily_order_status"  # type: ignore
+
+    day: date = Field(primary_key=True)
+    status: OrderStatus = Field(primary_key=True)
+    orders: int = Field(default=0)
+    revenue_cents: int = Field(default=0)
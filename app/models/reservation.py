@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from enum import Enum
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel  # type: ignore
+
+
+class ReservationStatus(str, Enum):
+    ACTIVE = "active"
+    CONFIRMED = "confirmed"
+    RELEASED = "released"
+
+
+class StockReservation(SQLModel, table=True):
+    __tablename__ = "stock_reservation"  # type: ignore
+    __table_args__ = (
+        Index("ix_stock_reservation_status_expires_at", "status", "expires_at"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="order.id", index=True)
+    product_id: int = Field(foreign_key="product.id")
+    quantity: int = Field(gt=0)
+    stock_slot: int | None = Field(default=None)
+    status: ReservationStatus = Field(default=ReservationStatus.ACTIVE)
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+
+from sqlmodel import Field, SQLModel  # type: ignore
+
+
+class RefreshToken(SQLModel, table=True):
+    __tablename__ = "refresh_token"  # type: ignore
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    token_hash: str = Field(unique=True, index=True)
+    family_id: str = Field(index=True)
+    expires_at: datetime
+    revoked_at: datetime | None = Field(default=None)
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
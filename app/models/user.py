@@ -1,6 +1,9 @@
 from datetime import datetime, timezone
 from enum import Enum
+from typing import Any
 
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import NO_VALUE
 from sqlmodel import Field, SQLModel  # type: ignore
 
 
@@ -15,4 +18,14 @@ class User(SQLModel, table=True):
     email: str = Field(unique=True, index=True)
     hashed_password: str
     role: UserRole = Field(default=UserRole.CUSTOMER)
+    token_version: int = Field(default=0)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+@event.listens_for(User.hashed_password, "set", active_history=True)
+@event.listens_for(User.role, "set", active_history=True)
+def _revoke_tokens(target: User, value: Any, oldvalue: Any, initiator: Any) -> None:
+    if oldvalue is NO_VALUE or value == oldvalue:
+        return
+
+    target.token_version = (target.token_version or 0) + 1
@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+from enum import Enum
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel  # type: ignore
+
+
+class WebhookEventStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    PROCESSED = "processed"
+    FAILED = "failed"
+
+
+class WebhookEvent(SQLModel, table=True):
+    __tablename__ = "webhook_event"  # type: ignore
+    __table_args__ = (
+        Index("ix_webhook_event_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: str = Field(primary_key=True)
+    type: str
+    payload: str
+    status: WebhookEventStatus = Field(default=WebhookEventStatus.PENDING)
+    attempts: int = Field(default=0)
+    last_error: str | None = Field(default=None)
+    received_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    next_attempt_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc)
+    )
+    processed_at: datetime | None = Field(default=None)
@@ -0,0 +1,15 @@
+from app.database import create_db_and_tables, engine
+from app.services.reports import rebuild_reports
+
+
+def rebuild():
+    create_db_and_tables()
+
+    with engine.begin() as connection:
+        rebuild_reports(connection)
+
+    print("Sales reports rebuilt")
+
+
+if __name__ == "__main__":
+    rebuild()
@@ -1,7 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
+from enum import Enum
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 from app.schemas.product import ProductResponse
 
@@ -15,6 +16,28 @@ class CartItemUpdate(BaseModel):
     quantity: int = Field(gt=0)
 
 
+class CartOperationType(str, Enum):
+    ADD = "add"
+    SET = "set"
+    REMOVE = "remove"
+
+
+class CartOperation(BaseModel):
+    op: CartOperationType
+    product_id: int
+    quantity: int | None = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def check_quantity(self) -> "CartOperation":
+        if self.op != CartOperationType.REMOVE and self.quantity is None:
+            raise ValueError(f"quantity is required for {self.op.value}")
+        return self
+
+
+class CartBatchRequest(BaseModel):
+    operations: list[CartOperation] = Field(min_length=1, max_length=100)
+
+
 class CartItemResponse(BaseModel):
     id: int
     product: ProductResponse
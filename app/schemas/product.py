@@ -1,7 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
+from enum import Enum
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ProductCreate(BaseModel):
@@ -10,15 +11,19 @@ class ProductCreate(BaseModel):
     price: Decimal = Field(max_digits=10, decimal_places=2, gt=0)
     stock_quantity: int = Field(ge=0)
     image_url: str | None = None
+    sku: str | None = Field(default=None, min_length=1, max_length=64)
 
 
 class ProductResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
     description: str
     price: Decimal
     stock_quantity: int
     image_url: str | None
+    sku: str | None = None
     created_at: datetime
 
 
@@ -28,3 +33,28 @@ class ProductUpdate(BaseModel):
     price: Decimal | None = None
     stock_quantity: int | None = None
     image_url: str | None = None
+    sku: str | None = Field(default=None, min_length=1, max_length=64)
+
+
+class ProductImportError(BaseModel):
+    row: int
+    errors: list[str]
+
+
+class ProductImportReport(BaseModel):
+    rows: int
+    imported: int
+    failed: int
+    errors: list[ProductImportError]
+
+
+class StockShardsUpdate(BaseModel):
+    shards: int = Field(ge=0, le=64)
+
+
+class ProductSort(str, Enum):
+    CREATED = "created"
+    NEWEST = "newest"
+    PRICE = "price"
+    PRICE_DESC = "-price"
+    NAME = "name"
@@ -0,0 +1,19 @@
+from datetime import date
+from decimal import Decimal
+
+from pydantic import BaseModel
+
+from app.models.order import OrderStatus
+
+
+class ProductRevenueReport(BaseModel):
+    product_id: int
+    quantity: int
+    revenue: Decimal
+
+
+class OrderStatusReport(BaseModel):
+    day: date
+    status: OrderStatus
+    orders: int
+    revenue: Decimal
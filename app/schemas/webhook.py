@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from app.models.webhook import WebhookEventStatus
+
+
+class WebhookInboxStats(BaseModel):
+    pending: int
+    processing: int
+    processed: int
+    failed: int
+    lag_seconds: float
+
+
+class WebhookEventResponse(BaseModel):
+    id: str
+    type: str
+    status: WebhookEventStatus
+    attempts: int
+    last_error: str | None
+    received_at: datetime
+    next_attempt_at: datetime
+    processed_at: datetime | None
+
+
+class WebhookReplayRequest(BaseModel):
+    event_ids: list[str] | None = None
+
+
+class WebhookReplayResponse(BaseModel):
+    replayed: int
@@ -0,0 +1,241 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response
+from pydantic_core import to_json
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import col, select, update
+
+from app.config import settings
+from app.database import session_scope
+from app.models.idempotency import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+POLL_INTERVAL_SECONDS = 0.05
+
+key_table = IdempotencyKey.__table__  # type: ignore
+
+# Requests running in this process, so local duplicates wake up as soon as the
+# first one finishes instead of polling.
+_in_flight: dict[tuple[int, str], asyncio.Event] = {}
+
+
+async def request_fingerprint(request: Request) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}\n".encode())
+    digest.update(await request.body())
+
+    return digest.hexdigest()
+
+
+async def _claim(user_id: int, key: str, fingerprint: str) -> bool:
+    now = datetime.now(timezone.utc)
+    claim = insert(key_table).values(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.idempotency_lock_seconds),
+    )
+    # Expired keys, including locks left behind by a crashed request, are
+    # taken over as if they were new.
+    claim = claim.on_conflict_do_update(
+        index_elements=[key_table.c.user_id, key_table.c.key],
+        set_={
+            "fingerprint": claim.excluded.fingerprint,
+            "status_code": None,
+            "response_body": None,
+            "created_at": claim.excluded.created_at,
+            "expires_at": claim.excluded.expires_at,
+        },
+        where=key_table.c.expires_at < now,
+    ).returning(key_table.c.key)
+
+    async with session_scope() as session:
+        claimed = (await session.exec(claim)).first()  # type: ignore
+        await session.commit()
+
+    return claimed is not None
+
+
+async def _load(user_id: int, key: str) -> IdempotencyKey | None:
+    async with session_scope() as session:
+        return (
+            await session.exec(
+                select(IdempotencyKey).where(
+                    IdempotencyKey.user_id == user_id, IdempotencyKey.key == key
+                )
+            )
+        ).first()
+
+
+async def _finish(user_id: int, key: str, status_code: int, body: bytes) -> None:
+    async with session_scope() as session:
+        await session.exec(
+            update(IdempotencyKey)
+            .where(
+                col(IdempotencyKey.user_id) == user_id, col(IdempotencyKey.key) == key
+            )
+            .values(
+                status_code=status_code,
+                response_body=body.decode(),
+                expires_at=datetime.now(timezone.utc)
+                + timedelta(hours=settings.idempotency_ttl_hours),
+            )
+        )
+        await session.commit()
+
+
+async def _abandon(user_id: int, key: str) -> None:
+    async with session_scope() as session:
+        await session.exec(
+            delete(IdempotencyKey).where(
+                col(IdempotencyKey.user_id) == user_id,
+                col(IdempotencyKey.key) == key,
+                col(IdempotencyKey.status_code).is_(None),
+            )
+        )
+        await session.commit()
+
+
+def _replay(record: IdempotencyKey) -> Response:
+    assert record.status_code is not None and record.response_body is not None
+
+    return Response(
+        record.response_body,
+        status_code=record.status_code,
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+async def _execute(
+    user_id: int,
+    key: str,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int,
+) -> Response:
+    event = _in_flight[user_id, key] = asyncio.Event()
+
+    try:
+        try:
+            result = await handler()
+        except HTTPException as e:
+            # Client errors are part of the outcome; anything else may succeed
+            # on retry, so the key is released.
+            if e.status_code < 500:
+                await _finish(
+                    user_id, key, e.status_code, to_json({"detail": e.detail})
+                )
+            else:
+                await _abandon(user_id, key)
+            raise
+        except Exception:
+            await _abandon(user_id, key)
+            raise
+
+        body = to_json(result)
+        await _finish(user_id, key, status_code, body)
+    finally:
+        _in_flight.pop((user_id, key), None)
+        event.set()
+
+    return Response(body, status_code=status_code, media_type="application/json")
+
+
+async def run_idempotent(
+    request: Request,
+    user_id: int,
+    key: str | None,
+    handler: Callable[[], Awaitable[Any]],
+    status_code: int = status.HTTP_200_OK,
+) -> Any:
+    """Runs ``handler`` once per user and Idempotency-Key.
+
+    Repeats of a finished request replay its stored response; repeats of a
+    request still in flight wait for it to finish.
+    """
+    if key is None:
+        return await handler()
+
+    fingerprint = await request_fingerprint(request)
+    deadline = time.monotonic() + settings.idempotency_wait_seconds
+
+    while True:
+        if await _claim(user_id, key, fingerprint):
+            return await _execute(user_id, key, handler, status_code)
+
+        record = await _load(user_id, key)
+        if record is not None:
+            if record.fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+            if record.status_code is not None:
+                return _replay(record)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "1"},
+            )
+
+        event = _in_flight.get((user_id, key))
+        if event is None:
+            await asyncio.sleep(min(POLL_INTERVAL_SECONDS, remaining))
+        else:
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except TimeoutError:
+                pass
+
+
+async def purge_expired_idempotency_keys() -> int:
+    batch_size = settings.idempotency_purge_batch_size
+    total = 0
+
+    while True:
+        now = datetime.now(timezone.utc)
+        expired = (
+            select(key_table.c.user_id, key_table.c.key)
+            .where(key_table.c.expires_at < now)
+            .limit(batch_size)
+        )
+        async with session_scope() as session:
+            purged = await session.exec(
+                delete(key_table).where(  # type: ignore
+                    tuple_(key_table.c.user_id, key_table.c.key).in_(expired)
+                )
+            )
+            await session.commit()
+
+        total += purged.rowcount
+        if purged.rowcount < batch_size:
+            return total
+
+
+async def run_idempotency_purger() -> None:
+    while True:
+        await asyncio.sleep(settings.idempotency_purge_interval_seconds)
+
+        try:
+            purged = await purge_expired_idempotency_keys()
+        except Exception:
+            logger.exception("Failed to purge expired idempotency keys")
+            continue
+
+        if purged:
+            logger.info("Purged %d expired idempotency keys", purged)
@@ -1,26 +1,187 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from typing import Any
+from urllib.parse import urlencode
 
-import stripe
+import httpx
 
 from app.config import settings
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpen
 
-stripe.api_key = settings.stripe_secret_key
+logger = logging.getLogger(__name__)
 
+RETRYABLE_STATUS_CODES = {409, 429, 500, 502, 503, 504}
 
-def create_checkout_session(
+# Stripe only accepts a checkout expires_at 30 minutes to 24 hours after the
+# session is created; the margins cover clock skew and the request itself.
+CHECKOUT_MIN_EXPIRY = timedelta(minutes=32)
+CHECKOUT_MAX_EXPIRY = timedelta(hours=23, minutes=58)
+
+
+class PaymentError(Exception):
+    pass
+
+
+class PaymentUnavailable(PaymentError):
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def encode_form(params: dict[str, Any], prefix: str = "") -> list[tuple[str, str]]:
+    """Flattens nested params into Stripe's ``a[b][0][c]=value`` form encoding."""
+    fields: list[tuple[str, str]] = []
+
+    for key, value in params.items():
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        if isinstance(value, dict):
+            fields.extend(encode_form(value, name))
+        elif isinstance(value, list):
+            fields.extend(encode_form(dict(enumerate(value)), name))
+        elif value is not None:
+            fields.append((name, str(value)))
+
+    return fields
+
+
+class StripeClient:
+    """Async Stripe API client sharing one keep-alive connection pool.
+
+    Every POST carries an Idempotency-Key, so timeouts, conflicts, rate limits
+    and 5xx responses are retried with jittered backoff. Calls that still fail
+    count towards the circuit breaker, which then fails fast for a while.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        api_base: str,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.api_key = api_key
+        self.api_base = api_base
+        self.transport = transport
+        self.breaker = CircuitBreaker(
+            settings.stripe_breaker_threshold, settings.stripe_breaker_reset_seconds
+        )
+        self._client: httpx.AsyncClient | None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_base,
+                auth=(self.api_key, ""),
+                timeout=httpx.Timeout(
+                    settings.stripe_read_timeout_seconds,
+                    connect=settings.stripe_connect_timeout_seconds,
+                    pool=settings.stripe_connect_timeout_seconds,
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.stripe_max_connections,
+                    max_keepalive_connections=settings.stripe_max_connections,
+                ),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def post(self, path: str, params: dict[str, Any]) -> dict[str, Any]:
+        try:
+            self.breaker.before_call()
+        except CircuitOpen as e:
+            raise PaymentUnavailable("Payment provider unavailable", e.retry_after)
+
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Idempotency-Key": str(uuid.uuid4()),
+        }
+        content = urlencode(encode_form(params))
+
+        try:
+            response, error = await self._send(path, content, headers)
+        except BaseException:
+            # Whatever went wrong, the call must be recorded, or a half-open
+            # breaker would wait for its trial's outcome forever.
+            self.breaker.record_failure()
+            raise
+
+        if response is None:
+            logger.warning("Stripe request to %s failed: %s", path, error)
+            self.breaker.record_failure()
+            raise PaymentUnavailable(
+                f"Payment provider unavailable: {error}",
+                self.breaker.reset_seconds if self.breaker.is_open else 1,
+            )
+
+        self.breaker.record_success()
+        body = response.json()
+        if response.is_error:
+            raise PaymentError(body.get("error", {}).get("message", error))
+        return body
+
+    async def _send(
+        self, path: str, content: str, headers: dict[str, str]
+    ) -> tuple[httpx.Response | None, str]:
+        error = "No response"
+
+        for attempt in range(settings.stripe_max_retries + 1):
+            if attempt:
+                backoff = settings.stripe_retry_backoff_seconds * 2 ** (attempt - 1)
+                await asyncio.sleep(random.uniform(backoff / 2, backoff))
+
+            try:
+                response = await self.client.post(
+                    path, content=content, headers=headers
+                )
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+
+            should_retry = response.headers.get("Stripe-Should-Retry")
+            if should_retry == "true" or (
+                should_retry != "false"
+                and response.status_code in RETRYABLE_STATUS_CODES
+            ):
+                error = f"HTTP {response.status_code}"
+                continue
+
+            return response, error
+
+        return None, error
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+stripe_client = StripeClient(settings.stripe_secret_key, settings.stripe_api_base)
+
+
+def checkout_expiry(expires_at: datetime) -> datetime:
+    now = datetime.now(timezone.utc)
+    return min(max(expires_at, now + CHECKOUT_MIN_EXPIRY), now + CHECKOUT_MAX_EXPIRY)
+
+
+async def create_checkout_session(
     order_id: int,
     amount: Decimal,
     currency: str = "usd",
     success_url: str = "http://localhost:8000/payment/success",
     cancel_url: str = "http://localhost:8000/payment/cancel",
+    expires_at: datetime | None = None,
 ) -> dict[str, Any]:
     amount_cents = int(amount * 100)
 
-    try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
+    session = await stripe_client.post(
+        "/v1/checkout/sessions",
+        {
+            "payment_method_types": ["card"],
+            "line_items": [
                 {
                     "price_data": {
                         "currency": currency,
@@ -33,12 +194,12 @@ def create_checkout_session(
                     "quantity": 1,
                 }
             ],
-            mode="payment",
-            success_url=success_url,
-            cancel_url=cancel_url,
-            metadata={"order_id": str(order_id)},
-        )
+            "mode": "payment",
+            "success_url": success_url,
+            "cancel_url": cancel_url,
+            "metadata": {"order_id": str(order_id)},
+            "expires_at": int(expires_at.timestamp()) if expires_at else None,
+        },
+    )
 
-        return {"id": session.id, "url": session.url}
-    except stripe.StripeError as e:
-        raise Exception(f"Stripe error: {str(e)}")
+    return {"id": session["id"], "url": session["url"]}
@@ -0,0 +1,157 @@
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.core.cache import TTLCache
+from app.core.conditional import make_etag
+from app.models.product import Product, ProductStockShard
+from app.schemas.product import ProductResponse
+
+
+class CachedProduct(NamedTuple):
+    response: ProductResponse
+    etag: str
+    last_modified: datetime
+
+
+class CachedPage(NamedTuple):
+    products: list[ProductResponse]
+    next_cursor: str | None
+    etag: str
+
+
+product_cache: TTLCache[int, CachedProduct] = TTLCache(
+    settings.product_cache_size, settings.product_cache_ttl_seconds
+)
+product_page_cache: TTLCache[tuple[Any, ...], CachedPage] = TTLCache(
+    settings.product_cache_size, settings.product_cache_ttl_seconds
+)
+
+
+def cache_product(product: Product, stock_quantity: int | None = None) -> CachedProduct:
+    assert product.id is not None
+
+    response = ProductResponse.model_validate(product)
+    if stock_quantity is not None:
+        response.stock_quantity = stock_quantity
+
+    cached = CachedProduct(
+        response=response,
+        etag=make_etag("product", product.id, product.version, response.stock_quantity),
+        last_modified=product.updated_at,
+    )
+    product_cache.set(product.id, cached)
+
+    return cached
+
+
+async def cache_page(
+    key: tuple[Any, ...],
+    products: Sequence[Product],
+    next_cursor: str | None,
+    session: AsyncSession,
+) -> CachedPage:
+    entries = await cache_products(products, session)
+
+    page = CachedPage(
+        products=[entry.response for entry in entries],
+        next_cursor=next_cursor,
+        etag=make_etag("page", next_cursor, *(entry.etag for entry in entries)),
+    )
+    product_page_cache.set(key, page)
+
+    return page
+
+
+async def sharded_stock_totals(
+    products: Iterable[Product], session: AsyncSession
+) -> dict[int, int]:
+    product_ids = [product.id for product in products if product.stock_shards]
+    if not product_ids:
+        return {}
+
+    rows = await session.exec(
+        select(ProductStockShard.product_id, func.sum(ProductStockShard.quantity))
+        .where(ProductStockShard.product_id.in_(product_ids))  # type: ignore
+        .group_by(ProductStockShard.product_id)  # type: ignore
+    )
+
+    return dict(rows.all())  # type: ignore
+
+
+async def available_stock(
+    products: Iterable[Any], session: AsyncSession
+) -> dict[int, int]:
+    """Stock per product, summing the slots of sharded products.
+
+    ``products`` only need ``id``, ``stock_quantity`` and ``stock_shards``.
+    """
+    products = list(products)
+    totals = await sharded_stock_totals(products, session)
+
+    return {
+        product.id: totals.get(product.id, product.stock_quantity)
+        for product in products
+    }
+
+
+async def cache_products(
+    products: Sequence[Product], session: AsyncSession
+) -> list[CachedProduct]:
+    totals = await sharded_stock_totals(products, session)
+
+    return [cache_product(product, totals.get(product.id)) for product in products]  # type: ignore
+
+
+async def get_cached_product(
+    product_id: int, session: AsyncSession
+) -> CachedProduct | None:
+    cached = product_cache.get(product_id)
+    if cached is not None:
+        return cached
+
+    product = await session.get(Product, product_id)
+    if not product:
+        return None
+
+    return (await cache_products([product], session))[0]
+
+
+async def get_cached_products(
+    product_ids: Iterable[int], session: AsyncSession
+) -> dict[int, CachedProduct]:
+    products: dict[int, CachedProduct] = {}
+    missing: list[int] = []
+
+    for product_id in set(product_ids):
+        cached = product_cache.get(product_id)
+        if cached is None:
+            missing.append(product_id)
+        else:
+            products[product_id] = cached
+
+    if missing:
+        rows = (
+            await session.exec(select(Product).where(Product.id.in_(missing)))  # type: ignore
+        ).all()
+        for cached in await cache_products(rows, session):
+            products[cached.response.id] = cached
+
+    return products
+
+
+def clear_product_caches() -> None:
+    product_cache.clear()
+    product_page_cache.clear()
+
+
+def invalidate_products(*product_ids: int) -> None:
+    for product_id in product_ids:
+        product_cache.delete(product_id)
+
+    product_page_cache.clear()
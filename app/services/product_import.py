@@ -0,0 +1,219 @@
+import codecs
+import csv
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from typing import Any
+
+from pydantic import ValidationError
+from sqlalchemy import case
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.util import await_only, greenlet_spawn
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.product import Product
+from app.schemas.product import ProductCreate, ProductImportError, ProductImportReport
+
+product_table = Product.__table__  # type: ignore
+
+OPTIONAL_FIELDS = {
+    name
+    for name, field in ProductCreate.model_fields.items()
+    if not field.is_required()
+}
+
+upsert_product = insert(product_table)
+upsert_product = upsert_product.on_conflict_do_update(
+    index_elements=[product_table.c.sku],
+    set_={
+        "name": upsert_product.excluded.name,
+        "description": upsert_product.excluded.description,
+        "price": upsert_product.excluded.price,
+        # Sharded stock lives in its slots; use the stock-shards endpoint instead.
+        "stock_quantity": case(
+            (product_table.c.stock_shards == 0, upsert_product.excluded.stock_quantity),
+            else_=product_table.c.stock_quantity,
+        ),
+        "image_url": upsert_product.excluded.image_url,
+        "version": product_table.c.version + 1,
+        "updated_at": upsert_product.excluded.updated_at,
+    },
+)
+
+
+class RowError(ValueError):
+    pass
+
+
+async def iter_lines(
+    chunks: AsyncIterator[bytes], max_length: int
+) -> AsyncIterator[str | RowError]:
+    """Splits a byte stream into lines, replacing over-long lines by an error."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    overflow = False
+
+    async for chunk in chunks:
+        *lines, buffer = (buffer + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            if overflow or len(line) > max_length:
+                overflow = False
+                yield RowError(f"Line longer than {max_length} characters")
+            else:
+                yield line.removesuffix("\r")
+        # Drop the rest of an over-long line as it arrives instead of keeping it.
+        if len(buffer) > max_length:
+            overflow, buffer = True, ""
+
+    buffer += decoder.decode(b"", final=True)
+    if overflow or len(buffer) > max_length:
+        yield RowError(f"Line longer than {max_length} characters")
+    elif buffer:
+        yield buffer.removesuffix("\r")
+
+
+class LineFeeder:
+    """Feeds ``csv.reader`` from an async line stream, one line at a time.
+
+    ``next(reader)`` must run under ``greenlet_spawn`` so that each line can be
+    awaited. A record that grows past ``max_length`` raises ``RowError``; the
+    reader then starts over at the next line.
+    """
+
+    def __init__(self, lines: AsyncIterator[str | RowError], max_length: int) -> None:
+        self.lines = lines
+        self.max_length = max_length
+        self.record_length = 0
+
+    def __iter__(self) -> "LineFeeder":
+        return self
+
+    def __next__(self) -> str:
+        line = await_only(anext(self.lines, None))
+        if line is None:
+            raise StopIteration
+        if isinstance(line, RowError):
+            raise line
+
+        self.record_length += len(line) + 1
+        if self.record_length > self.max_length:
+            raise RowError(f"Record longer than {self.max_length} characters")
+
+        return line + "\n"
+
+
+async def iter_csv_rows(
+    chunks: AsyncIterator[bytes], max_length: int
+) -> AsyncIterator[dict[str, Any] | RowError]:
+    feeder = LineFeeder(iter_lines(chunks, max_length), max_length)
+    reader = csv.reader(feeder, strict=True)
+    header: list[str] | None = None
+
+    while True:
+        feeder.record_length = 0
+        try:
+            values = await greenlet_spawn(next, reader, None)
+        except RowError as e:
+            yield e
+            continue
+        except csv.Error as e:
+            yield RowError(str(e).capitalize())
+            continue
+
+        if values is None:
+            return
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if not values:
+            continue
+
+        if len(values) != len(header):
+            yield RowError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+
+        row: dict[str, Any] = dict(zip(header, values))
+        for name in OPTIONAL_FIELDS:
+            if row.get(name) == "":
+                row[name] = None
+
+        yield row
+
+
+async def iter_ndjson_rows(
+    chunks: AsyncIterator[bytes], max_length: int
+) -> AsyncIterator[dict[str, Any] | RowError]:
+    async for line in iter_lines(chunks, max_length):
+        if isinstance(line, RowError):
+            yield line
+            continue
+        if not line.strip():
+            continue
+
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield RowError(f"Invalid JSON: {e.msg}")
+            continue
+
+        yield row if isinstance(row, dict) else RowError("Expected a JSON object")
+
+
+async def import_products(
+    session: AsyncSession,
+    rows: AsyncIterator[dict[str, Any] | RowError],
+    batch_size: int,
+    max_errors: int,
+) -> ProductImportReport:
+    report = ProductImportReport(rows=0, imported=0, failed=0, errors=[])
+    batch: list[dict[str, Any]] = []
+
+    async def flush() -> None:
+        await session.exec(upsert_product, params=batch)  # type: ignore
+        await session.commit()
+        report.imported += len(batch)
+        batch.clear()
+
+    def fail(errors: list[str]) -> None:
+        report.failed += 1
+        if len(report.errors) < max_errors:
+            report.errors.append(ProductImportError(row=report.rows, errors=errors))
+
+    async for row in rows:
+        report.rows += 1
+
+        if isinstance(row, RowError):
+            fail([str(row)])
+            continue
+
+        try:
+            product = ProductCreate.model_validate(row)
+        except ValidationError as e:
+            fail(format_errors(e))
+            continue
+
+        now = datetime.now(timezone.utc)
+        batch.append(
+            {
+                **product.model_dump(),
+                "reserved_quantity": 0,
+                "stock_shards": 0,
+                "version": 1,
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+
+    return report
+
+
+def format_errors(error: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+        for detail in error.errors()
+    ]
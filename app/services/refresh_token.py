@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import col, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.core.security import generate_refresh_token, hash_refresh_token
+from app.models.token import RefreshToken
+
+
+def issue_refresh_token(
+    session: AsyncSession, user_id: int, family_id: str | None = None
+) -> str:
+    token = generate_refresh_token()
+
+    session.add(
+        RefreshToken(
+            user_id=user_id,
+            token_hash=hash_refresh_token(token),
+            family_id=family_id or uuid.uuid4().hex,
+            expires_at=datetime.now(timezone.utc)
+            + timedelta(days=settings.refresh_token_expire_days),
+        )
+    )
+
+    return token
+
+
+async def revoke_token_family(session: AsyncSession, family_id: str) -> None:
+    await session.exec(
+        update(RefreshToken)
+        .where(
+            col(RefreshToken.family_id) == family_id,
+            col(RefreshToken.revoked_at).is_(None),
+        )
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+async def revoke_user_refresh_tokens(session: AsyncSession, user_id: int) -> None:
+    await session.exec(
+        update(RefreshToken)
+        .where(
+            col(RefreshToken.user_id) == user_id,
+            col(RefreshToken.revoked_at).is_(None),
+        )
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+
+async def rotate_refresh_token(
+    session: AsyncSession, token: str
+) -> tuple[int, str] | None:
+    stored = (
+        await session.exec(
+            select(RefreshToken).where(
+                RefreshToken.token_hash == hash_refresh_token(token)
+            )
+        )
+    ).first()
+    if stored is None:
+        return None
+
+    now = datetime.now(timezone.utc)
+    if stored.expires_at <= now:
+        return None
+
+    # The conditional UPDATE claims the token, so two concurrent refreshes
+    # with the same token cannot both rotate it; the loser is treated as reuse.
+    claimed = await session.exec(
+        update(RefreshToken)
+        .where(
+            col(RefreshToken.id) == stored.id,
+            col(RefreshToken.revoked_at).is_(None),
+        )
+        .values(revoked_at=now)
+    )
+    if claimed.rowcount != 1:
+        await revoke_token_family(session, stored.family_id)
+        await session.commit()
+        return None
+
+    new_token = issue_refresh_token(session, stored.user_id, stored.family_id)
+    await session.commit()
+
+    return stored.user_id, new_token
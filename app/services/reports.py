@@ -0,0 +1,184 @@
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any
+
+from sqlalchemy import Connection, Integer, cast, delete, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.report import DailyOrderStatus, DailyProductSales
+
+sales_table = DailyProductSales.__table__  # type: ignore
+status_table = DailyOrderStatus.__table__  # type: ignore
+order_table = Order.__table__  # type: ignore
+item_table = OrderItem.__table__  # type: ignore
+
+_sales = insert(sales_table)
+upsert_sales = _sales.on_conflict_do_update(
+    index_elements=[sales_table.c.day, sales_table.c.product_id],
+    set_={
+        "quantity": sales_table.c.quantity + _sales.excluded.quantity,
+        "revenue_cents": sales_table.c.revenue_cents + _sales.excluded.revenue_cents,
+    },
+)
+
+_status = insert(status_table)
+upsert_status = _status.on_conflict_do_update(
+    index_elements=[status_table.c.day, status_table.c.status],
+    set_={
+        "orders": status_table.c.orders + _status.excluded.orders,
+        "revenue_cents": status_table.c.revenue_cents + _status.excluded.revenue_cents,
+    },
+)
+
+
+def to_cents(amount: Decimal) -> int:
+    return int((amount * 100).to_integral_value())
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents) / 100
+
+
+def order_day(created_at: datetime) -> date:
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date()
+
+
+async def _add_sales(
+    session: AsyncSession, items: Iterable[tuple[date, int, int, Decimal]], sign: int
+) -> None:
+    totals: dict[tuple[date, int], list[int]] = defaultdict(lambda: [0, 0])
+    for day, product_id, quantity, subtotal in items:
+        totals[day, product_id][0] += sign * quantity
+        totals[day, product_id][1] += sign * to_cents(subtotal)
+
+    if totals:
+        await session.exec(
+            upsert_sales,  # type: ignore
+            params=[
+                {
+                    "day": day,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "revenue_cents": revenue_cents,
+                }
+                for (day, product_id), (quantity, revenue_cents) in totals.items()
+            ],
+        )
+
+
+async def _add_statuses(
+    session: AsyncSession, rows: Iterable[tuple[date, OrderStatus, int, int]]
+) -> None:
+    totals: dict[tuple[date, OrderStatus], list[int]] = defaultdict(lambda: [0, 0])
+    for day, status, orders, revenue_cents in rows:
+        totals[day, status][0] += orders
+        totals[day, status][1] += revenue_cents
+
+    if totals:
+        await session.exec(
+            upsert_status,  # type: ignore
+            params=[
+                {
+                    "day": day,
+                    "status": status,
+                    "orders": orders,
+                    "revenue_cents": revenue_cents,
+                }
+                for (day, status), (orders, revenue_cents) in totals.items()
+            ],
+        )
+
+
+async def record_order_placed(
+    session: AsyncSession, order: Order, items: Sequence[OrderItem]
+) -> None:
+    day = order_day(order.created_at)
+
+    await _add_statuses(session, [(day, order.status, 1, to_cents(order.total_price))])
+    await _add_sales(
+        session,
+        ((day, item.product_id, item.quantity, item.subtotal) for item in items),
+        sign=1,
+    )
+
+
+async def record_status_changes(
+    session: AsyncSession,
+    orders: Sequence[Any],
+    previous: OrderStatus,
+    current: OrderStatus,
+) -> None:
+    """``orders`` only need ``id``, ``created_at`` and ``total_price``."""
+    if previous == current or not orders:
+        return
+
+    rows: list[tuple[date, OrderStatus, int, int]] = []
+    for order in orders:
+        day, cents = order_day(order.created_at), to_cents(order.total_price)
+        rows.append((day, previous, -1, -cents))
+        rows.append((day, current, 1, cents))
+    await _add_statuses(session, rows)
+
+    if OrderStatus.CANCELLED not in (previous, current):
+        return
+
+    days = {order.id: order_day(order.created_at) for order in orders}
+    items = (
+        await session.exec(
+            select(
+                OrderItem.order_id,
+                OrderItem.product_id,
+                OrderItem.quantity,
+                OrderItem.subtotal,
+            ).where(col(OrderItem.order_id).in_(days))
+        )
+    ).all()
+    await _add_sales(
+        session,
+        (
+            (days[order_id], product_id, quantity, subtotal)
+            for order_id, product_id, quantity, subtotal in items
+        ),
+        sign=-1 if current == OrderStatus.CANCELLED else 1,
+    )
+
+
+def rebuild_reports(connection: Connection) -> None:
+    day = func.date(order_table.c.created_at)
+
+    connection.execute(delete(sales_table))
+    connection.execute(delete(status_table))
+
+    connection.execute(
+        status_table.insert().from_select(
+            ["day", "status", "orders", "revenue_cents"],
+            select(
+                day,
+                order_table.c.status,
+                func.count(),
+                cast(func.round(func.sum(order_table.c.total_price) * 100), Integer),
+            ).group_by(day, order_table.c.status),
+        )
+    )
+    connection.execute(
+        sales_table.insert().from_select(
+            ["day", "product_id", "quantity", "revenue_cents"],
+            select(
+                day,
+                item_table.c.product_id,
+                func.sum(item_table.c.quantity),
+                cast(func.round(func.sum(item_table.c.subtotal) * 100), Integer),
+            )
+            .select_from(order_table)
+            .join(item_table, item_table.c.order_id == order_table.c.id)
+            .where(order_table.c.status != OrderStatus.CANCELLED)
+            .group_by(day, item_table.c.product_id),
+        )
+    )
@@ -0,0 +1,190 @@
+import asyncio
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import col, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.database import session_scope
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product
+from app.models.reservation import ReservationStatus, StockReservation
+from app.services.product_cache import invalidate_products
+from app.services.reports import record_status_changes
+from app.services.stock import return_stock, settle_stock, take_stock
+
+logger = logging.getLogger(__name__)
+
+
+def reservation_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(
+        minutes=settings.reservation_ttl_minutes
+    )
+
+
+def _total_by_slot(
+    rows: Iterable[tuple[int, int, int | None, int]],
+) -> dict[tuple[int, int | None], int]:
+    quantities: dict[tuple[int, int | None], int] = defaultdict(int)
+    for _, product_id, slot, quantity in rows:
+        quantities[product_id, slot] += quantity
+
+    return quantities
+
+
+async def _transition(
+    session: AsyncSession, condition: object, status: ReservationStatus
+) -> list[tuple[int, int, int | None, int]]:
+    rows = await session.exec(
+        update(StockReservation)
+        .where(condition, col(StockReservation.status) == ReservationStatus.ACTIVE)  # type: ignore
+        .values(status=status)
+        .returning(
+            col(StockReservation.order_id),
+            col(StockReservation.product_id),
+            col(StockReservation.stock_slot),
+            col(StockReservation.quantity),
+        )
+    )
+
+    return [tuple(row) for row in rows.all()]  # type: ignore
+
+
+async def _release(
+    session: AsyncSession, released: list[tuple[int, int, int | None, int]]
+) -> list[int]:
+    if not released:
+        return []
+
+    await return_stock(session, _total_by_slot(released))
+
+    return list({product_id for _, product_id, _, _ in released})
+
+
+async def _cancel_pending_orders(session: AsyncSession, order_ids: set[int]) -> None:
+    cancelled = await session.exec(
+        update(Order)
+        .where(col(Order.id).in_(order_ids), col(Order.status) == OrderStatus.PENDING)
+        .values(status=OrderStatus.CANCELLED, updated_at=datetime.now(timezone.utc))
+        .returning(col(Order.id), col(Order.created_at), col(Order.total_price))
+    )
+    await record_status_changes(
+        session, cancelled.all(), OrderStatus.PENDING, OrderStatus.CANCELLED
+    )
+
+
+async def extend_order_reservations(
+    session: AsyncSession, order_id: int, expires_at: datetime
+) -> int:
+    extended = await session.exec(
+        update(StockReservation)
+        .where(
+            col(StockReservation.order_id) == order_id,
+            col(StockReservation.status) == ReservationStatus.ACTIVE,
+        )
+        .values(expires_at=expires_at)
+    )
+
+    return extended.rowcount
+
+
+async def confirm_order_reservations(session: AsyncSession, order_id: int) -> None:
+    confirmed = await _transition(
+        session, col(StockReservation.order_id) == order_id, ReservationStatus.CONFIRMED
+    )
+    if confirmed:
+        await settle_stock(session, _total_by_slot(confirmed))
+
+
+async def retake_order_stock(session: AsyncSession, order_id: int) -> list[int]:
+    """Takes the stock of a cancelled order again, for a payment that arrived late.
+
+    Raises ``InsufficientStock`` when any item is no longer available; the
+    caller must roll back the stock already taken.
+    """
+    items = (
+        await session.exec(select(OrderItem).where(OrderItem.order_id == order_id))
+    ).all()
+    products = {
+        product.id: product
+        for product in (
+            await session.exec(
+                select(Product).where(
+                    col(Product.id).in_([item.product_id for item in items])
+                )
+            )
+        ).all()
+    }
+
+    taken: dict[tuple[int, int | None], int] = defaultdict(int)
+    for item in items:
+        slot = await take_stock(session, products[item.product_id], item.quantity)
+        taken[item.product_id, slot] += item.quantity
+    await settle_stock(session, taken)
+
+    return list(products)
+
+
+async def release_order_reservations(session: AsyncSession, order_id: int) -> list[int]:
+    released = await _transition(
+        session, col(StockReservation.order_id) == order_id, ReservationStatus.RELEASED
+    )
+
+    return await _release(session, released)
+
+
+async def release_expired_reservations(session: AsyncSession, batch_size: int) -> int:
+    expired_ids = (
+        await session.exec(
+            select(StockReservation.id)
+            .where(
+                StockReservation.status == ReservationStatus.ACTIVE,
+                StockReservation.expires_at <= datetime.now(timezone.utc),
+            )
+            .order_by(StockReservation.expires_at)  # type: ignore
+            .limit(batch_size)
+        )
+    ).all()
+    if not expired_ids:
+        return 0
+
+    released = await _transition(
+        session, col(StockReservation.id).in_(expired_ids), ReservationStatus.RELEASED
+    )
+    product_ids = await _release(session, released)
+    await _cancel_pending_orders(session, {order_id for order_id, _, _, _ in released})
+    await session.commit()
+
+    invalidate_products(*product_ids)
+
+    return len(expired_ids)
+
+
+async def sweep_expired_reservations() -> int:
+    batch_size = settings.reservation_sweep_batch_size
+    total = 0
+
+    while True:
+        async with session_scope() as session:
+            released = await release_expired_reservations(session, batch_size)
+
+        total += released
+        if released < batch_size:
+            return total
+
+
+async def run_reservation_sweeper() -> None:
+    while True:
+        await asyncio.sleep(settings.reservation_sweep_interval_seconds)
+
+        try:
+            released = await sweep_expired_reservations()
+        except Exception:
+            logger.exception("Failed to release expired stock reservations")
+            continue
+
+        if released:
+            logger.info("Released %d expired stock reservations", released)
@@ -0,0 +1,82 @@
+import re
+from typing import Any
+
+from sqlalchemy import Connection, column, event, func, literal_column, table, text
+from sqlmodel import select
+
+from app.models.product import Product
+
+product_fts = table("product_fts", column("rowid"))
+
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts
+    USING fts5(name, description, content='product', content_rowid='id')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_au
+    AFTER UPDATE OF name, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO product_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+def create_search_index(connection: Connection) -> None:
+    if connection.dialect.name != "sqlite":
+        return
+
+    exists = connection.execute(
+        text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+        )
+    ).first()
+
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+
+    if not exists:
+        connection.execute(
+            text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+        )
+
+
+@event.listens_for(Product.__table__, "after_create")
+def _create_search_index(target: Any, connection: Connection, **kwargs: Any) -> None:
+    create_search_index(connection)
+
+
+def build_match_query(q: str) -> str | None:
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_products_query(match: str, skip: int, limit: int) -> Any:
+    fts = literal_column("product_fts")
+
+    return (
+        select(Product)
+        .join(product_fts, product_fts.c.rowid == Product.id)
+        .where(fts.op("MATCH")(match))
+        .order_by(func.bm25(fts))
+        .offset(skip)
+        .limit(limit)
+    )
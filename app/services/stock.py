@@ -0,0 +1,364 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, delete, func, insert
+from sqlmodel import col, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.database import session_scope
+from app.models.product import Product, ProductStockShard
+from app.models.reservation import ReservationStatus, StockReservation
+from app.services.product_cache import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+shard_table = ProductStockShard.__table__  # type: ignore
+
+product_table = Product.__table__  # type: ignore
+
+TAKE_ATTEMPTS = 3
+
+write_shard = (
+    update(shard_table)
+    .where(
+        shard_table.c.product_id == bindparam("b_product_id"),
+        shard_table.c.slot == bindparam("b_slot"),
+    )
+    .values(quantity=bindparam("b_quantity"))
+)
+
+return_to_product = (
+    update(product_table)
+    .where(product_table.c.id == bindparam("b_product_id"))
+    .values(
+        stock_quantity=product_table.c.stock_quantity + bindparam("b_quantity"),
+        reserved_quantity=product_table.c.reserved_quantity - bindparam("b_quantity"),
+        version=product_table.c.version + 1,
+        updated_at=bindparam("b_now"),
+    )
+)
+
+return_to_shard = (
+    update(shard_table)
+    .where(
+        shard_table.c.product_id == bindparam("b_product_id"),
+        shard_table.c.slot == bindparam("b_slot"),
+    )
+    .values(
+        quantity=shard_table.c.quantity + bindparam("b_quantity"),
+        reserved=shard_table.c.reserved - bindparam("b_quantity"),
+    )
+)
+
+settle_product = (
+    update(product_table)
+    .where(product_table.c.id == bindparam("b_product_id"))
+    .values(
+        reserved_quantity=product_table.c.reserved_quantity - bindparam("b_quantity")
+    )
+)
+
+settle_shard = (
+    update(shard_table)
+    .where(
+        shard_table.c.product_id == bindparam("b_product_id"),
+        shard_table.c.slot == bindparam("b_slot"),
+    )
+    .values(reserved=shard_table.c.reserved - bindparam("b_quantity"))
+)
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def split_quantity(total: int, shards: int) -> list[int]:
+    base, extra = divmod(total, shards)
+    return [base + (1 if slot < extra else 0) for slot in range(shards)]
+
+
+async def _take_from_shard(
+    session: AsyncSession, product_id: int, quantity: int
+) -> tuple[int, int] | None:
+    """Returns the slot taken from and what is left in it."""
+    candidate = (
+        select(shard_table.c.slot)
+        .where(
+            shard_table.c.product_id == product_id,
+            shard_table.c.quantity >= quantity,
+        )
+        .order_by(func.random())
+        .limit(1)
+        .scalar_subquery()
+    )
+    taken = await session.exec(
+        update(shard_table)
+        .where(
+            shard_table.c.product_id == product_id,
+            shard_table.c.slot == candidate,
+            shard_table.c.quantity >= quantity,
+        )
+        .values(
+            quantity=shard_table.c.quantity - quantity,
+            reserved=shard_table.c.reserved + quantity,
+        )
+        .returning(shard_table.c.slot, shard_table.c.quantity)
+    )
+
+    row = taken.first()
+    return None if row is None else tuple(row)  # type: ignore
+
+
+async def _sync_sharded_totals(
+    session: AsyncSession, product_ids: list[int], only_sold_out: bool = False
+) -> None:
+    """Copies the slot totals into ``stock_quantity``.
+
+    Sharded takes leave the column for the rebalancer, but they sync it
+    whenever a slot empties or a sold-out product gets stock back, so the
+    column is always positive exactly when there is stock. That keeps the
+    in-stock filter and its partial indexes correct.
+    """
+    total = (
+        select(func.coalesce(func.sum(shard_table.c.quantity), 0))
+        .where(shard_table.c.product_id == product_table.c.id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(product_table)
+        .where(product_table.c.id.in_(product_ids), product_table.c.stock_shards > 0)
+        .values(stock_quantity=total)
+    )
+    if only_sold_out:
+        statement = statement.where(product_table.c.stock_quantity == 0)
+
+    await session.exec(statement)  # type: ignore
+
+
+async def _lock_shards(session: AsyncSession, product_id: int) -> list[tuple[int, int]]:
+    # A no-op write takes the write lock on SQLite (and the row locks elsewhere)
+    # before the read, so no decrement can land between reading and rewriting.
+    await session.exec(
+        update(shard_table)
+        .where(shard_table.c.product_id == product_id)
+        .values(quantity=shard_table.c.quantity)
+    )
+    rows = await session.exec(
+        select(shard_table.c.quantity, shard_table.c.reserved)
+        .where(shard_table.c.product_id == product_id)
+        .order_by(shard_table.c.slot)
+    )
+
+    return [tuple(row) for row in rows.all()]  # type: ignore
+
+
+async def _write_shards(
+    session: AsyncSession, product_id: int, quantities: list[int]
+) -> None:
+    await session.exec(
+        write_shard,  # type: ignore
+        params=[
+            {"b_product_id": product_id, "b_slot": slot, "b_quantity": quantity}
+            for slot, quantity in enumerate(quantities)
+        ],
+    )
+
+
+async def take_stock(
+    session: AsyncSession, product: Product, quantity: int
+) -> int | None:
+    assert product.id is not None
+
+    if not product.stock_shards:
+        taken = await session.exec(
+            update(Product)
+            .where(
+                col(Product.id) == product.id,
+                col(Product.stock_quantity) >= quantity,
+            )
+            .values(
+                stock_quantity=col(Product.stock_quantity) - quantity,
+                reserved_quantity=col(Product.reserved_quantity) + quantity,
+                version=col(Product.version) + 1,
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        if taken.rowcount != 1:
+            raise InsufficientStock(product.id)
+        return None
+
+    for _ in range(TAKE_ATTEMPTS):
+        shard = await _take_from_shard(session, product.id, quantity)
+        if shard is not None:
+            break
+    else:
+        shard = await _gather_and_take(session, product.id, quantity)
+
+    slot, left = shard
+    if not left:
+        await _sync_sharded_totals(session, [product.id])
+
+    return slot
+
+
+async def _gather_and_take(
+    session: AsyncSession, product_id: int, quantity: int
+) -> tuple[int, int]:
+    # No single slot holds enough, so gather everything into slot 0 and retry;
+    # the rebalancer spreads it out again later.
+    shards = await _lock_shards(session, product_id)
+    total = sum(available for available, _ in shards)
+    if total < quantity:
+        raise InsufficientStock(product_id)
+
+    await _write_shards(session, product_id, [total] + [0] * (len(shards) - 1))
+    taken = await _take_from_shard(session, product_id, quantity)
+    if taken is None:
+        raise InsufficientStock(product_id)
+
+    return taken
+
+
+async def _apply_by_slot(
+    session: AsyncSession,
+    product_statement: object,
+    shard_statement: object,
+    quantities: dict[tuple[int, int | None], int],
+) -> None:
+    now = datetime.now(timezone.utc)
+    product_params = [
+        {"b_product_id": product_id, "b_quantity": quantity, "b_now": now}
+        for (product_id, slot), quantity in quantities.items()
+        if slot is None
+    ]
+    shard_params = [
+        {"b_product_id": product_id, "b_slot": slot, "b_quantity": quantity}
+        for (product_id, slot), quantity in quantities.items()
+        if slot is not None
+    ]
+
+    if product_params:
+        await session.exec(product_statement, params=product_params)  # type: ignore
+    if shard_params:
+        await session.exec(shard_statement, params=shard_params)  # type: ignore
+
+
+async def return_stock(
+    session: AsyncSession, quantities: dict[tuple[int, int | None], int]
+) -> None:
+    await _apply_by_slot(session, return_to_product, return_to_shard, quantities)
+    sharded = {product_id for product_id, slot in quantities if slot is not None}
+    if sharded:
+        await _sync_sharded_totals(session, list(sharded), only_sold_out=True)
+
+
+async def settle_stock(
+    session: AsyncSession, quantities: dict[tuple[int, int | None], int]
+) -> None:
+    await _apply_by_slot(session, settle_product, settle_shard, quantities)
+
+
+async def set_sharded_stock(
+    session: AsyncSession, product: Product, total: int
+) -> None:
+    assert product.id is not None
+
+    shards = await _lock_shards(session, product.id)
+    await _write_shards(session, product.id, split_quantity(total, len(shards)))
+
+
+async def rebalance_stock_shards(session: AsyncSession, product_id: int) -> None:
+    shards = await _lock_shards(session, product_id)
+    if not shards:
+        return
+
+    total = sum(available for available, _ in shards)
+    await _write_shards(session, product_id, split_quantity(total, len(shards)))
+    await session.exec(
+        update(Product)
+        .where(col(Product.id) == product_id)
+        .values(
+            stock_quantity=total,
+            reserved_quantity=sum(reserved for _, reserved in shards),
+            version=col(Product.version) + 1,
+            updated_at=datetime.now(timezone.utc),
+        )
+    )
+
+
+async def set_stock_shards(
+    session: AsyncSession, product: Product, shards: int
+) -> None:
+    assert product.id is not None
+
+    if product.stock_shards:
+        await rebalance_stock_shards(session, product.id)
+        await session.refresh(product)
+        await session.exec(
+            delete(shard_table).where(shard_table.c.product_id == product.id)
+        )
+        await session.exec(
+            update(StockReservation)
+            .where(
+                col(StockReservation.product_id) == product.id,
+                col(StockReservation.status) == ReservationStatus.ACTIVE,
+            )
+            .values(stock_slot=None)
+        )
+
+    if shards:
+        quantities = split_quantity(product.stock_quantity, shards)
+        await session.exec(
+            insert(shard_table),  # type: ignore
+            params=[
+                {
+                    "product_id": product.id,
+                    "slot": slot,
+                    "quantity": quantity,
+                    "reserved": product.reserved_quantity if slot == 0 else 0,
+                }
+                for slot, quantity in enumerate(quantities)
+            ],
+        )
+        await session.exec(
+            update(StockReservation)
+            .where(
+                col(StockReservation.product_id) == product.id,
+                col(StockReservation.status) == ReservationStatus.ACTIVE,
+            )
+            .values(stock_slot=0)
+        )
+
+    product.stock_shards = shards
+    product.version += 1
+    product.updated_at = datetime.now(timezone.utc)
+    session.add(product)
+
+
+async def rebalance_all_stock_shards() -> int:
+    async with session_scope() as session:
+        product_ids = (
+            await session.exec(select(Product.id).where(Product.stock_shards > 0))
+        ).all()
+
+    for product_id in product_ids:
+        assert product_id is not None
+        async with session_scope() as session:
+            await rebalance_stock_shards(session, product_id)
+            await session.commit()
+
+    invalidate_products(*product_ids)  # type: ignore
+
+    return len(product_ids)
+
+
+async def run_stock_rebalancer() -> None:
+    while True:
+        await asyncio.sleep(settings.stock_rebalance_interval_seconds)
+
+        try:
+            await rebalance_all_stock_shards()
+        except Exception:
+            logger.exception("Failed to rebalance stock shards")
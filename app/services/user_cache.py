@@ -0,0 +1,50 @@
+from typing import NamedTuple
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.core.cache import TTLCache
+from app.models.user import User, UserRole
+from app.schemas.user import UserResponse
+
+
+class CachedUser(NamedTuple):
+    id: int
+    role: UserRole
+    token_version: int
+    profile: UserResponse
+
+
+user_cache: TTLCache[int, CachedUser] = TTLCache(
+    settings.user_cache_size, settings.user_cache_ttl_seconds
+)
+
+
+def cache_user(user: User) -> CachedUser:
+    assert user.id is not None
+
+    cached = CachedUser(
+        id=user.id,
+        role=user.role,
+        token_version=user.token_version,
+        profile=UserResponse.model_validate(user),
+    )
+    user_cache.set(user.id, cached)
+
+    return cached
+
+
+async def get_cached_user(user_id: int, session: AsyncSession) -> CachedUser | None:
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = await session.get(User, user_id)
+    if not user:
+        return None
+
+    return cache_user(user)
+
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.delete(user_id)
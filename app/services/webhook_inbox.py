@@ -0,0 +1,257 @@
+import asyncio
+import json
+import logging
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import col, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import settings
+from app.database import session_scope
+from app.models.order import Order, OrderStatus
+from app.models.webhook import WebhookEvent, WebhookEventStatus
+from app.schemas.webhook import WebhookInboxStats
+from app.services.product_cache import invalidate_products
+from app.services.reports import record_status_changes
+from app.services.reservation import confirm_order_reservations, retake_order_stock
+from app.services.stock import InsufficientStock
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_SECONDS = 5
+
+
+async def enqueue_webhook_event(
+    session: AsyncSession, event_id: str, event_type: str, payload: str
+) -> bool:
+    now = datetime.now(timezone.utc)
+    inserted = await session.exec(
+        insert(WebhookEvent.__table__)  # type: ignore
+        .values(
+            id=event_id,
+            type=event_type,
+            payload=payload,
+            status=WebhookEventStatus.PENDING,
+            attempts=0,
+            received_at=now,
+            next_attempt_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    await session.commit()
+
+    return inserted.rowcount == 1
+
+
+class UnfulfillablePayment(Exception):
+    pass
+
+
+async def apply_webhook_event(
+    session: AsyncSession, event: dict[str, Any]
+) -> list[int]:
+    """Applies ``event`` and returns the ids of products whose stock changed."""
+    if event["type"] != "checkout.session.completed":
+        return []
+
+    order_id = event["data"]["object"].get("metadata", {}).get("order_id")
+    if not order_id:
+        logger.warning("Webhook event %s has no order_id in metadata", event.get("id"))
+        return []
+    order_id = int(order_id)
+
+    paid = await session.exec(
+        update(Order)
+        .where(col(Order.id) == order_id, col(Order.status) == OrderStatus.PENDING)
+        .values(status=OrderStatus.PAID, updated_at=datetime.now(timezone.utc))
+        .returning(col(Order.id), col(Order.created_at), col(Order.total_price))
+    )
+    rows = paid.all()
+    if rows:
+        await confirm_order_reservations(session, order_id)
+        await record_status_changes(
+            session, rows, OrderStatus.PENDING, OrderStatus.PAID
+        )
+        return []
+
+    order = await session.get(Order, order_id)
+    if not order or order.status != OrderStatus.CANCELLED:
+        return []
+
+    # The payment arrived after the sweeper cancelled the order and returned its
+    # stock, so the stock has to be taken again before the order counts as paid.
+    try:
+        product_ids = await retake_order_stock(session, order_id)
+    except InsufficientStock as e:
+        raise UnfulfillablePayment(
+            f"Order {order_id} was paid after it was cancelled and product {e} "
+            "is out of stock; the payment needs a refund"
+        )
+
+    await record_status_changes(
+        session, [order], OrderStatus.CANCELLED, OrderStatus.PAID
+    )
+    order.status = OrderStatus.PAID
+    order.updated_at = datetime.now(timezone.utc)
+    session.add(order)
+
+    return product_ids
+
+
+async def claim_webhook_events(batch_size: int) -> Sequence[tuple[str, str]]:
+    now = datetime.now(timezone.utc)
+    candidates = (
+        select(WebhookEvent.id)
+        .where(
+            col(WebhookEvent.status).in_(
+                [WebhookEventStatus.PENDING, WebhookEventStatus.PROCESSING]
+            ),
+            WebhookEvent.next_attempt_at <= now,
+        )
+        .order_by(col(WebhookEvent.next_attempt_at))
+        .limit(batch_size)
+    )
+
+    # Claiming sets a lease; events whose worker died become claimable again
+    # once it expires.
+    async with session_scope() as session:
+        claimed = await session.exec(
+            update(WebhookEvent)
+            .where(col(WebhookEvent.id).in_(candidates.scalar_subquery()))
+            .values(
+                status=WebhookEventStatus.PROCESSING,
+                next_attempt_at=now + timedelta(seconds=settings.webhook_lease_seconds),
+            )
+            .returning(col(WebhookEvent.id), col(WebhookEvent.payload))
+            .execution_options(synchronize_session=False)
+        )
+        rows = claimed.all()
+        await session.commit()
+
+    return rows  # type: ignore
+
+
+async def process_webhook_event(event_id: str, payload: str) -> bool:
+    now = datetime.now(timezone.utc)
+
+    try:
+        async with session_scope() as session:
+            product_ids = await apply_webhook_event(session, json.loads(payload))
+            await session.exec(
+                update(WebhookEvent)
+                .where(col(WebhookEvent.id) == event_id)
+                .values(
+                    status=WebhookEventStatus.PROCESSED,
+                    processed_at=now,
+                    last_error=None,
+                )
+            )
+            await session.commit()
+        invalidate_products(*product_ids)
+        return True
+    except Exception as e:
+        logger.exception("Failed to process webhook event %s", event_id)
+        error = f"{type(e).__name__}: {e}"
+
+    async with session_scope() as session:
+        event = await session.get(WebhookEvent, event_id)
+        assert event is not None
+
+        event.attempts += 1
+        event.last_error = error
+        if event.attempts >= settings.webhook_max_attempts:
+            event.status = WebhookEventStatus.FAILED
+        else:
+            event.status = WebhookEventStatus.PENDING
+            event.next_attempt_at = now + timedelta(
+                seconds=RETRY_BASE_SECONDS * 2 ** (event.attempts - 1)
+            )
+        session.add(event)
+        await session.commit()
+
+    return False
+
+
+async def process_webhook_batch(batch_size: int) -> int:
+    events = await claim_webhook_events(batch_size)
+    for event_id, payload in events:
+        await process_webhook_event(event_id, payload)
+
+    return len(events)
+
+
+async def drain_webhook_inbox() -> int:
+    total = 0
+    while processed := await process_webhook_batch(settings.webhook_batch_size):
+        total += processed
+
+    return total
+
+
+async def run_webhook_worker() -> None:
+    while True:
+        try:
+            processed = await process_webhook_batch(settings.webhook_batch_size)
+        except Exception:
+            logger.exception("Webhook worker failed to claim events")
+            processed = 0
+
+        if not processed:
+            await asyncio.sleep(settings.webhook_poll_interval_seconds)
+
+
+async def webhook_inbox_stats(session: AsyncSession) -> WebhookInboxStats:
+    counts = dict(
+        (
+            await session.exec(
+                select(WebhookEvent.status, func.count()).group_by(
+                    col(WebhookEvent.status)
+                )
+            )
+        ).all()
+    )
+    oldest = (
+        await session.exec(
+            select(func.min(WebhookEvent.received_at)).where(
+                col(WebhookEvent.status).in_(
+                    [WebhookEventStatus.PENDING, WebhookEventStatus.PROCESSING]
+                )
+            )
+        )
+    ).one()
+
+    lag = 0.0
+    if oldest is not None:
+        if oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        lag = (datetime.now(timezone.utc) - oldest).total_seconds()
+
+    return WebhookInboxStats(
+        **{status.value: counts.get(status, 0) for status in WebhookEventStatus},
+        lag_seconds=lag,
+    )
+
+
+async def replay_webhook_events(
+    session: AsyncSession, event_ids: Sequence[str] | None = None
+) -> int:
+    query = update(WebhookEvent)
+    if event_ids:
+        query = query.where(col(WebhookEvent.id).in_(event_ids))
+    else:
+        query = query.where(col(WebhookEvent.status) == WebhookEventStatus.FAILED)
+
+    replayed = await session.exec(
+        query.values(
+            status=WebhookEventStatus.PENDING,
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc),
+        )
+    )
+    await session.commit()
+
+    return replayed.rowcount
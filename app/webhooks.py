@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+
+from app.database import create_db_and_tables, session_scope
+from app.services.webhook_inbox import (
+    drain_webhook_inbox,
+    replay_webhook_events,
+    webhook_inbox_stats,
+)
+
+
+async def stats():
+    async with session_scope() as session:
+        inbox = await webhook_inbox_stats(session)
+
+    for name, value in inbox.model_dump().items():
+        print(f"{name}: {value}")
+
+
+async def replay(event_ids: list[str], drain: bool):
+    async with session_scope() as session:
+        replayed = await replay_webhook_events(session, event_ids)
+    print(f"{replayed} webhook events queued for replay")
+
+    if drain:
+        processed = await drain_webhook_inbox()
+        print(f"{processed} webhook events processed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the webhook inbox")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show event counts and processing lag")
+    replay_parser = commands.add_parser(
+        "replay", help="Requeue failed events, or the given event ids"
+    )
+    replay_parser.add_argument("event_ids", nargs="*")
+    replay_parser.add_argument(
+        "--drain", action="store_true", help="Process the inbox before exiting"
+    )
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    if args.command == "stats":
+        asyncio.run(stats())
+    else:
+        asyncio.run(replay(args.event_ids, args.drain))
+
+
+if __name__ == "__main__":
+    main()
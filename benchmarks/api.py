@@ -0,0 +1,421 @@
+"""Drive the API in-process and report latency, throughput and SQL per request.
+
+Each scenario runs against a freshly seeded SQLite database through an httpx
+AsyncClient bound to the ASGI app. Results are written as JSON and compared
+with a stored baseline; a regression beyond the tolerance exits non-zero.
+
+Run with ``uv run -m benchmarks.api``; refresh the baseline with
+``uv run -m benchmarks.api --save-baseline``.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+
+from app import database
+from app.config import settings
+from app.core.security import hash_password
+from app.main import app
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User, UserRole
+
+BASELINE = Path(__file__).parent / "baseline.json"
+RESULTS = Path(__file__).parent / "results.json"
+
+PASSWORD = "BenchPass123!"
+
+
+@dataclass
+class Worker:
+    """One simulated client; each worker shops as its own customer."""
+
+    client: httpx.AsyncClient
+    customer: dict[str, str]
+    admin: dict[str, str]
+    product_count: int
+    rng: random.Random
+
+    def product_id(self) -> int:
+        return self.rng.randint(1, self.product_count)
+
+    async def add_to_cart(self) -> httpx.Response:
+        return await self.client.post(
+            "/api/v1/cart/items",
+            headers=self.customer,
+            json={"product_id": self.product_id(), "quantity": 1},
+        )
+
+    async def refill_cart(self) -> int:
+        await self.client.delete("/api/v1/cart/", headers=self.customer)
+        response = await self.add_to_cart()
+        return response.json()["items"][0]["id"]
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[Worker, Any], Awaitable[httpx.Response]]
+    # Untimed setup run before every request; its result is passed to it.
+    prepare: Callable[[Worker], Awaitable[Any]] | None = None
+
+
+SCENARIOS = [
+    Scenario(
+        "catalog_browse",
+        lambda w, _: w.client.get(
+            "/api/v1/products/",
+            params={"skip": w.rng.randrange(0, w.product_count - 20), "limit": 20},
+        ),
+    ),
+    Scenario(
+        "product_detail",
+        lambda w, _: w.client.get(f"/api/v1/products/{w.product_id()}"),
+    ),
+    Scenario(
+        "cart_add",
+        lambda w, _: w.add_to_cart(),
+        lambda w: w.client.delete("/api/v1/cart/", headers=w.customer),
+    ),
+    Scenario(
+        "cart_update",
+        lambda w, item_id: w.client.patch(
+            f"/api/v1/cart/items/{item_id}",
+            headers=w.customer,
+            json={"quantity": w.rng.randint(2, 5)},
+        ),
+        Worker.refill_cart,
+    ),
+    Scenario(
+        "order_create",
+        lambda w, _: w.client.post("/api/v1/orders/", headers=w.customer),
+        Worker.refill_cart,
+    ),
+    Scenario(
+        "order_history",
+        lambda w, _: w.client.get(
+            "/api/v1/orders/", headers=w.customer, params={"limit": 20}
+        ),
+    ),
+    Scenario(
+        "admin_orders",
+        lambda w, _: w.client.get(
+            "/api/v1/orders/all", headers=w.admin, params={"limit": 20}
+        ),
+    ),
+]
+
+
+# Set while a timed request runs so statements issued by the prepare steps of
+# concurrent workers are not attributed to it.
+_statements: ContextVar[list[int] | None] = ContextVar("statements", default=None)
+
+
+def count_statement(*args: Any) -> None:
+    tally = _statements.get()
+    if tally is not None:
+        tally[0] += 1
+
+
+def seed(db_path: Path, products: int, customers: int, orders: int) -> None:
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    rng = random.Random(7)
+    hashed = hash_password(PASSWORD)
+
+    with Session(engine) as session:
+        catalog = [
+            Product(
+                name=f"Benchmark product {i}",
+                description=f"Benchmark product number {i}",
+                price=Decimal(rng.randint(100, 10000)) / 100,
+                stock_quantity=1_000_000,
+                image_url=f"https://example.com/{i}.jpg",
+                sku=f"BENCH-{i:05d}",
+            )
+            for i in range(products)
+        ]
+        users = [
+            User(
+                email=f"customer{i}@example.com",
+                full_name=f"Customer {i}",
+                hashed_password=hashed,
+                role=UserRole.CUSTOMER,
+            )
+            for i in range(customers)
+        ]
+        users.append(
+            User(
+                email="admin@example.com",
+                full_name="Admin",
+                hashed_password=hashed,
+                role=UserRole.ADMIN,
+            )
+        )
+        session.add_all(catalog + users)
+        session.commit()
+
+        now = datetime.now(timezone.utc)
+        for i in range(orders):
+            picked = rng.sample(catalog, 3)
+            order = Order(
+                user_id=users[i % customers].id,  # type: ignore
+                total_price=sum((p.price for p in picked), Decimal(0)),
+                created_at=now,
+                updated_at=now,
+            )
+            session.add(order)
+            session.flush()
+            session.add_all(
+                OrderItem(
+                    order_id=order.id,  # type: ignore
+                    product_id=product.id,  # type: ignore
+                    quantity=1,
+                    price_at_purchase=product.price,
+                    subtotal=product.price,
+                )
+                for product in picked
+            )
+        session.commit()
+
+    engine.dispose()
+
+
+async def login(client: httpx.AsyncClient, email: str) -> dict[str, str]:
+    response = await client.post(
+        "/api/v1/auth/login", data={"username": email, "password": PASSWORD}
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run_scenario(
+    workers: list[Worker], scenario: Scenario, requests: int
+) -> dict[str, Any]:
+    tally = [0]
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def drive(worker: Worker) -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            prepared = await scenario.prepare(worker) if scenario.prepare else None
+
+            token = _statements.set(tally)
+            started = time.perf_counter()
+            try:
+                response = await scenario.request(worker, prepared)
+            finally:
+                elapsed = time.perf_counter() - started
+                _statements.reset(token)
+
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(worker) for worker in workers))
+    wall = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(quantiles[50 - 1] * 1000, 3),
+        "p95_ms": round(quantiles[95 - 1] * 1000, 3),
+        "p99_ms": round(quantiles[99 - 1] * 1000, 3),
+        "sql_per_request": round(tally[0] / len(latencies), 2),
+    }
+
+
+async def run(args: argparse.Namespace, db_path: Path) -> dict[str, Any]:
+    settings.bcrypt_rounds = 4
+    settings.webhook_workers = 0
+    settings.database_async = not args.sync
+    seed(db_path, args.products, args.customers, args.orders)
+
+    database.engine = create_engine(
+        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+    )
+    database.async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    for target in (database.engine, database.async_engine.sync_engine):
+        database.use_write_ahead_log(target)
+        event.listen(target, "before_cursor_execute", count_statement)
+
+    results: dict[str, Any] = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            admin = await login(client, "admin@example.com")
+            workers = [
+                Worker(
+                    client=client,
+                    customer=await login(client, f"customer{i}@example.com"),
+                    admin=admin,
+                    product_count=args.products,
+                    rng=random.Random(i),
+                )
+                for i in range(args.concurrency)
+            ]
+
+            for scenario in SCENARIOS:
+                if args.scenario and scenario.name not in args.scenario:
+                    continue
+                # Warm caches and connections so the first requests don't skew
+                # the percentiles.
+                await run_scenario(workers, scenario, args.concurrency)
+                results[scenario.name] = await run_scenario(
+                    workers, scenario, args.requests
+                )
+
+    await database.async_engine.dispose()
+    database.engine.dispose()
+
+    return results
+
+
+def compare(
+    results: dict[str, Any],
+    baseline: dict[str, Any],
+    tolerance: float,
+    tail_tolerance: float,
+) -> list[str]:
+    regressions = []
+
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+
+        # Tail latency of the write scenarios depends on SQLite lock retries
+        # and is noisier than the median.
+        for metric, allowed in (("p50_ms", tolerance), ("p95_ms", tail_tolerance)):
+            if current[metric] > previous[metric] * (1 + allowed):
+                regressions.append(
+                    f"{name}: {metric} {previous[metric]} -> {current[metric]}"
+                )
+        if current["throughput_rps"] * (1 + tolerance) < previous["throughput_rps"]:
+            regressions.append(
+                f"{name}: throughput_rps {previous['throughput_rps']} -> "
+                f"{current['throughput_rps']}"
+            )
+        # Statement counts only vary with cache hits, so any real increase is
+        # a regression.
+        if current["sql_per_request"] > previous["sql_per_request"] + 0.05:
+            regressions.append(
+                f"{name}: sql_per_request {previous['sql_per_request']} -> "
+                f"{current['sql_per_request']}"
+            )
+        if current["errors"] > previous["errors"]:
+            regressions.append(
+                f"{name}: errors {previous['errors']} -> {current['errors']}"
+            )
+
+    return regressions
+
+
+def print_table(results: dict[str, Any]) -> None:
+    print(
+        f"{'scenario':<16}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'sql/req':>9}{'errors':>8}"
+    )
+    for name, result in results.items():
+        print(
+            f"{name:<16}{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.2f}"
+            f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+            f"{result['sql_per_request']:>9.2f}{result['errors']:>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--customers", type=int, default=20)
+    parser.add_argument("--orders", type=int, default=200, help="seeded orders")
+    parser.add_argument("--scenario", action="append", help="run only these")
+    parser.add_argument("--sync", action="store_true", help="use sync DB sessions")
+    parser.add_argument("--output", type=Path, default=RESULTS)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="allowed p50 and throughput slowdown as a fraction of the baseline",
+    )
+    parser.add_argument(
+        "--tail-tolerance",
+        type=float,
+        default=1.0,
+        help="allowed p95 slowdown as a fraction of the baseline",
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+    if args.concurrency > args.customers:
+        parser.error("--concurrency cannot exceed --customers")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = asyncio.run(run(args, Path(tmp) / "bench.db"))
+
+    print_table(results)
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database_async": not args.sync,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline")
+        return
+
+    regressions = compare(
+        results,
+        json.loads(args.baseline.read_text())["scenarios"],
+        args.tolerance,
+        args.tail_tolerance,
+    )
+    if regressions:
+        print("Regressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Time building and encoding cart and order responses with 50 items.
+
+Compares the previous path (dict round-trips, validating constructors and
+``jsonable_encoder`` + ``json.dumps``) with the current one (``from_attributes``,
+``model_construct`` and Pydantic's JSON serializer, as FastAPI uses when a
+route declares a ``response_model``).
+
+Run with ``uv run -m benchmarks.serialization``.
+"""
+
+import argparse
+import json
+import timeit
+from collections.abc import Callable
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from app.api.v1.cart import assemble_cart_response
+from app.api.v1.orders import assemble_order_responses
+from app.database import MODELS  # noqa: F401
+from app.models.cart import Cart, CartItem
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.schemas.cart import CartItemResponse, CartResponse
+from app.schemas.order import OrderItemResponse, OrderResponse
+from app.schemas.product import ProductResponse
+from app.services.product_cache import CachedProduct
+
+cart_adapter = TypeAdapter(CartResponse)
+order_adapter = TypeAdapter(OrderResponse)
+
+
+def make_fixtures(items: int) -> dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    products = [
+        Product(
+            id=i,
+            name=f"Product {i}",
+            description="A product used for benchmarking serialization",
+            price=Decimal("19.99"),
+            stock_quantity=100,
+            image_url=f"https://example.com/{i}.jpg",
+            sku=f"SKU-{i:05d}",
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(1, items + 1)
+    ]
+    cart = Cart(id=1, user_id=1, created_at=now, updated_at=now)
+    cart_items = [
+        CartItem(id=i, cart_id=1, product_id=product.id, quantity=2, added_at=now)
+        for i, product in enumerate(products, 1)
+    ]
+    order = Order(
+        id=1,
+        user_id=1,
+        total_price=Decimal("19.99") * 2 * items,
+        created_at=now,
+        updated_at=now,
+    )
+    order_items = [
+        OrderItem(
+            id=i,
+            order_id=1,
+            product_id=product.id,
+            quantity=2,
+            price_at_purchase=product.price,
+            subtotal=product.price * 2,
+        )
+        for i, product in enumerate(products, 1)
+    ]
+
+    return {
+        "products": products,
+        "cart": cart,
+        "cart_items": cart_items,
+        "order": order,
+        "order_items": order_items,
+    }
+
+
+def cached_products(
+    products: list[Product], build: Callable[[Product], ProductResponse]
+) -> dict[int, CachedProduct]:
+    return {
+        product.id: CachedProduct(build(product), "", product.updated_at)  # type: ignore
+        for product in products
+    }
+
+
+def previous_cart(fixtures: dict[str, Any]) -> bytes:
+    products = cached_products(
+        fixtures["products"], lambda p: ProductResponse(**p.model_dump())
+    )
+    cart = fixtures["cart"]
+    items = [
+        CartItemResponse(
+            id=item.id,
+            product=products[item.product_id].response,
+            quantity=item.quantity,
+            subtotal=products[item.product_id].response.price * item.quantity,
+            added_at=item.added_at,
+        )
+        for item in fixtures["cart_items"]
+    ]
+    response = CartResponse(
+        id=cart.id,
+        user_id=cart.user_id,
+        items=items,
+        total=sum((item.subtotal for item in items), Decimal(0)),
+        created_at=cart.created_at,
+        updated_at=cart.updated_at,
+    )
+
+    return json.dumps(jsonable_encoder(response)).encode()
+
+
+def current_cart(fixtures: dict[str, Any]) -> bytes:
+    products = cached_products(fixtures["products"], ProductResponse.model_validate)
+    response = assemble_cart_response(
+        fixtures["cart"], fixtures["cart_items"], products
+    )
+    value = cart_adapter.validate_python(response, from_attributes=True)
+
+    return cart_adapter.dump_json(value)
+
+
+def previous_order(fixtures: dict[str, Any]) -> bytes:
+    products = cached_products(
+        fixtures["products"], lambda p: ProductResponse(**p.model_dump())
+    )
+    order = fixtures["order"]
+    response = OrderResponse(
+        id=order.id,
+        user_id=order.user_id,
+        items=[
+            OrderItemResponse(
+                id=item.id,
+                product=products[item.product_id].response,
+                quantity=item.quantity,
+                price_at_purchase=item.price_at_purchase,
+                subtotal=item.subtotal,
+            )
+            for item in fixtures["order_items"]
+        ],
+        total_price=order.total_price,
+        status=order.status,
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+    )
+
+    return json.dumps(jsonable_encoder(response)).encode()
+
+
+def current_order(fixtures: dict[str, Any]) -> bytes:
+    products = cached_products(fixtures["products"], ProductResponse.model_validate)
+    (response,) = assemble_order_responses(
+        [fixtures["order"]], fixtures["order_items"], products
+    )
+    value = order_adapter.validate_python(response, from_attributes=True)
+
+    return order_adapter.dump_json(value)
+
+
+def measure(func: Callable[[dict[str, Any]], bytes], fixtures: dict[str, Any]) -> float:
+    timer = timeit.Timer(lambda: func(fixtures))
+    loops, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=loops)) / loops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=50)
+    args = parser.parse_args()
+
+    fixtures = make_fixtures(args.items)
+    assert json.loads(previous_cart(fixtures)) == json.loads(current_cart(fixtures))
+    assert json.loads(previous_order(fixtures)) == json.loads(current_order(fixtures))
+
+    for name, previous, current in [
+        ("CartResponse", previous_cart, current_cart),
+        ("OrderResponse", previous_order, current_order),
+    ]:
+        before = measure(previous, fixtures)
+        after = measure(current, fixtures)
+        print(
+            f"{name} ({args.items} items): {before * 1e6:8.1f} us -> "
+            f"{after * 1e6:8.1f} us ({before / after:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
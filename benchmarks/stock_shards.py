@@ -0,0 +1,85 @@
+"""Compare checkout throughput on one hot product with and without stock shards.
+
+Run with ``uv run -m benchmarks.stock_shards``.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import MODELS  # noqa: F401
+from app.models.product import Product
+from app.services.stock import InsufficientStock, set_stock_shards, take_stock
+
+
+async def run(db_path: Path, buyers: int, orders: int, shards: int) -> float:
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}",
+        pool_size=buyers,
+        connect_args={"timeout": 60},
+    )
+
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        product = Product(
+            name="Flash Sale Product",
+            description="Benchmark product",
+            price=Decimal("10.00"),
+            stock_quantity=buyers * orders,
+        )
+        session.add(product)
+        await session.commit()
+        await set_stock_shards(session, product, shards)
+        await session.commit()
+
+    failures = 0
+
+    async def buyer() -> None:
+        nonlocal failures
+        for _ in range(orders):
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                try:
+                    await take_stock(session, product, 1)
+                    await session.commit()
+                except InsufficientStock:
+                    failures += 1
+                    await session.rollback()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(buyer() for _ in range(buyers)))
+    elapsed = time.perf_counter() - started
+
+    await async_engine.dispose()
+
+    if failures:
+        print(f"  {failures} checkouts failed")
+
+    return buyers * orders / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--buyers", type=int, default=64)
+    parser.add_argument("--orders", type=int, default=20, help="orders per buyer")
+    parser.add_argument("--shards", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for shards in (0, args.shards):
+            db_path = Path(tmp) / f"shards-{shards}.db"
+            throughput = asyncio.run(run(db_path, args.buyers, args.orders, shards))
+            print(f"shards={shards:<3} {throughput:8.1f} checkouts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,96 @@
-from typing import Generator
+import asyncio
+from pathlib import Path
+from typing import Any, Generator
 
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
 
+from app import database
+from app.config import settings
 from app.core.security import hash_password
-from app.database import get_session
 from app.main import app
 from app.models.product import Product
 from app.models.user import User, UserRole
+from app.services.product_cache import product_cache, product_page_cache
+from app.services.user_cache import user_cache
 
 
-@pytest.fixture(name="session")
-def session_fixture() -> Generator[Session, None, None]:
+@pytest.fixture(autouse=True)
+def fast_password_hashing(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "bcrypt_rounds", 4)
+
+
+@pytest.fixture(autouse=True)
+def no_webhook_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "webhook_workers", 0)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches() -> Generator[None, None, None]:
+    yield
+    product_cache.clear()
+    product_page_cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Generator[Engine, None, None]:
+    db_path = tmp_path / "test.db"
     engine = create_engine(
-        "sqlite:///:memory:",
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
+        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
     )
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    database.use_write_ahead_log(engine)
+    database.use_write_ahead_log(async_engine.sync_engine)
     SQLModel.metadata.create_all(engine)
 
-    with Session(engine) as session:
-        yield session
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "async_engine", async_engine)
+
+    yield engine
 
     engine.dispose()
+    asyncio.run(async_engine.dispose())
 
 
-@pytest.fixture(name="client")
-def client_fixture(session: Session) -> Generator[TestClient, None, None]:
-    def get_session_override() -> Generator[Session, None, None]:
+class QueryCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args: Any) -> None:
+        self.count += 1
+
+
+@pytest.fixture(name="query_counter")
+def query_counter_fixture(engine: Engine) -> Generator[QueryCounter, None, None]:
+    counter = QueryCounter()
+    engines = [database.engine, database.async_engine.sync_engine]
+
+    for target in engines:
+        event.listen(target, "before_cursor_execute", counter)
+
+    yield counter
+
+    for target in engines:
+        event.remove(target, "before_cursor_execute", counter)
+
+
+@pytest.fixture(name="session")
+def session_fixture(engine: Engine) -> Generator[Session, None, None]:
+    with Session(engine) as session:
         yield session
 
-    app.dependency_overrides[get_session] = get_session_override
 
+@pytest.fixture(name="client")
+def client_fixture(session: Session) -> Generator[TestClient, None, None]:
     with TestClient(app) as client:
         yield client
 
-    app.dependency_overrides.clear()
-
 
 @pytest.fixture(name="test_user")
 def test_user_fixture(session: Session) -> User:
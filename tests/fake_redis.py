@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+from typing import Any
+
+from app.core.cache_backend import CacheError, read_reply
+
+
+def encode_reply(value: Any) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, CacheError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return f"*{len(value)}\r\n".encode() + b"".join(map(encode_reply, value))
+
+
+class FakeRedisServer:
+    """Serves a subset of the Redis protocol from a background thread."""
+
+    def __init__(self, password: str | None = None) -> None:
+        self.password = password
+        self.data: dict[bytes, tuple[float | None, bytes]] = {}
+        self.commands: list[str] = []
+        self.port = 0
+        self._clients: set[asyncio.Task[None]] = set()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/0"
+
+    def start(self) -> "FakeRedisServer":
+        self._thread.start()
+        server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, "127.0.0.1", 0), self._loop
+        ).result()
+        self._server = server
+        self.port = server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        for task in self._clients:
+            task.cancel()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self._clients.add(task)
+        authenticated = self.password is None
+        try:
+            while True:
+                command = await read_reply(reader)
+                name = command[0].decode().upper()
+                self.commands.append(name)
+
+                if name == "AUTH":
+                    authenticated = command[1].decode() == self.password
+                    reply: Any = "OK" if authenticated else CacheError("WRONGPASS")
+                elif not authenticated:
+                    reply = CacheError("NOAUTH Authentication required.")
+                else:
+                    reply = self._run(name, command[1:])
+
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.discard(task)
+            writer.close()
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+            self.data.pop(key, None)
+            return None
+        return entry[1]
+
+    def _run(self, name: str, args: list[bytes]) -> Any:
+        now = time.monotonic()
+
+        if name in ("PING", "SELECT"):
+            return "OK"
+        if name == "GET":
+            return self._get(args[0])
+        if name == "MGET":
+            return [self._get(key) for key in args]
+        if name == "SET":
+            options = [arg.upper() for arg in args[2:]]
+            if b"NX" in options and self._get(args[0]) is not None:
+                return None
+            expires_at = None
+            if b"PX" in options:
+                expires_at = now + int(options[options.index(b"PX") + 1]) / 1000
+            self.data[args[0]] = (expires_at, args[1])
+            return "OK"
+        if name == "DEL":
+            return sum(
+                self._get(key) is not None and bool(self.data.pop(key)) for key in args
+            )
+        if name == "INCRBY":
+            current = self._get(args[0])
+            try:
+                value = int(current or 0) + int(args[1])
+            except ValueError:
+                return CacheError("ERR value is not an integer or out of range")
+            expires_at = self.data[args[0]][0] if current is not None else None
+            self.data[args[0]] = (expires_at, str(value).encode())
+            return value
+        if name == "PEXPIRE":
+            value = self._get(args[0])
+            if value is None:
+                return 0
+            self.data[args[0]] = (now + int(args[1]) / 1000, value)
+            return 1
+        if name == "PTTL":
+            if self._get(args[0]) is None:
+                return -2
+            expires_at = self.data[args[0]][0]
+            return -1 if expires_at is None else int((expires_at - now) * 1000)
+
+        return CacheError(f"ERR unknown command '{name}'")
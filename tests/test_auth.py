@@ -1,5 +1,9 @@
+import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session
 
+from app.config import settings
+from app.core.security import password_hasher
 from app.models.user import User
 
 
@@ -60,3 +64,111 @@ def test_login_nonexistent_user(client: TestClient):
         data={"username": "nobody@example.com", "password": "Password123!"},
     )
     assert response.status_code == 401
+
+
+def test_login_rehashes_password_with_new_cost(
+    client: TestClient,
+    session: Session,
+    test_user: User,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "bcrypt_rounds", 5)
+
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": test_user.email, "password": "TestPass123!"},
+    )
+    assert response.status_code == 200
+
+    session.refresh(test_user)
+    assert test_user.hashed_password.startswith("$2b$05$")
+
+    token = response.json()["access_token"]
+    profile = client.get(
+        "/api/v1/users/me", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert profile.status_code == 200
+
+
+def test_login_fails_fast_when_hashing_queue_is_full(
+    client: TestClient, test_user: User, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+
+    response = client.post(
+        "/api/v1/auth/login",
+        data={"username": test_user.email, "password": "TestPass123!"},
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def login(client: TestClient, email: str, password: str = "TestPass123!") -> dict:
+    response = client.post(
+        "/api/v1/auth/login", data={"username": email, "password": password}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_rotates_token(client: TestClient, test_user: User):
+    tokens = login(client, test_user.email)
+    assert tokens["refresh_token"]
+
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["refresh_token"] != tokens["refresh_token"]
+
+    profile = client.get(
+        "/api/v1/users/me", headers={"Authorization": f"Bearer {data['access_token']}"}
+    )
+    assert profile.status_code == 200
+    assert profile.json()["email"] == test_user.email
+
+
+def test_refresh_with_unknown_token(client: TestClient):
+    response = client.post("/api/v1/auth/refresh", json={"refresh_token": "nope"})
+    assert response.status_code == 401
+
+
+def test_refresh_reuse_revokes_token_family(client: TestClient, test_user: User):
+    tokens = login(client, test_user.email)
+
+    rotated = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    ).json()
+
+    reused = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert reused.status_code == 401
+
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": rotated["refresh_token"]}
+    )
+    assert response.status_code == 401
+
+
+def test_change_password_revokes_refresh_tokens(client: TestClient, test_user: User):
+    tokens = login(client, test_user.email)
+
+    response = client.put(
+        "/api/v1/users/me/password",
+        json={
+            "current_password": "TestPass123!",
+            "new_password": "NewPass123!",
+            "confirm_password": "NewPass123!",
+        },
+        headers={"Authorization": f"Bearer {tokens['access_token']}"},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
@@ -0,0 +1,190 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Generator
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.config import settings
+from app.core.cache_backend import (
+    CacheBackend,
+    CacheError,
+    MemoryCache,
+    RedisCache,
+    create_cache_backend,
+)
+from app.main import app
+from tests.fake_redis import FakeRedisServer
+
+RunCache = Callable[[Callable[[CacheBackend], Awaitable[Any]]], Any]
+
+
+@pytest.fixture(name="redis_server")
+def redis_server_fixture() -> Generator[FakeRedisServer, None, None]:
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(name="run_cache", params=["memory", "redis"])
+def run_cache_fixture(
+    request: pytest.FixtureRequest,
+) -> Generator[RunCache, None, None]:
+    server = FakeRedisServer().start() if request.param == "redis" else None
+
+    def run(scenario: Callable[[CacheBackend], Awaitable[Any]]) -> Any:
+        async def main() -> Any:
+            cache = create_cache_backend(
+                request.param, server.url if server else "", 100, 2, 1
+            )
+            try:
+                return await scenario(cache)
+            finally:
+                await cache.close()
+
+        return asyncio.run(main())
+
+    yield run
+
+    if server is not None:
+        server.stop()
+
+
+def test_get_set_delete(run_cache: RunCache):
+    async def scenario(cache: CacheBackend) -> None:
+        assert await cache.get("missing") is None
+
+        await cache.set("a", b"1")
+        await cache.set("b", b"\x00binary\r\n")
+        assert await cache.get("a") == b"1"
+        assert await cache.get_many(["a", "missing", "b"]) == [
+            b"1",
+            None,
+            b"\x00binary\r\n",
+        ]
+        assert await cache.get_many([]) == []
+
+        assert await cache.delete("a", "missing") == 1
+        assert await cache.get("a") is None
+
+    run_cache(scenario)
+
+
+def test_ttl_and_expiry(run_cache: RunCache):
+    async def scenario(cache: CacheBackend) -> None:
+        await cache.set("short", b"x", ttl=0.05)
+        await cache.set("forever", b"x")
+
+        remaining = await cache.ttl("short")
+        assert remaining is not None and 0 < remaining <= 0.05
+        assert await cache.ttl("forever") is None
+        assert await cache.ttl("missing") is None
+
+        assert await cache.expire("forever", 0.05)
+        assert not await cache.expire("missing", 1)
+
+        await asyncio.sleep(0.1)
+        assert await cache.get_many(["short", "forever"]) == [None, None]
+
+    run_cache(scenario)
+
+
+def test_incr(run_cache: RunCache):
+    async def scenario(cache: CacheBackend) -> None:
+        assert await cache.incr("hits", ttl=10) == 1
+        assert await cache.incr("hits", 4, ttl=0.01) == 5
+        assert await cache.get("hits") == b"5"
+
+        remaining = await cache.ttl("hits")
+        assert remaining is not None and remaining > 1
+
+        await cache.set("name", b"abc")
+        with pytest.raises(CacheError):
+            await cache.incr("name")
+
+    run_cache(scenario)
+
+
+def test_memory_cache_evicts_least_recently_used():
+    async def scenario() -> None:
+        cache = MemoryCache(2)
+        await cache.set("a", b"1")
+        await cache.set("b", b"2")
+        await cache.get("a")
+        await cache.set("c", b"3")
+
+        assert await cache.get_many(["a", "b", "c"]) == [b"1", None, b"3"]
+        assert len(cache) == 2
+
+    asyncio.run(scenario())
+
+
+def test_redis_cache_authenticates_and_reuses_connections():
+    server = FakeRedisServer(password="s3cret").start()
+
+    async def scenario() -> None:
+        cache = RedisCache(server.url, pool_size=2, timeout=1)
+        await asyncio.gather(*(cache.set(f"k{i}", b"v") for i in range(10)))
+        assert await cache.get("k9") == b"v"
+        await cache.close()
+
+        with pytest.raises(CacheError, match="WRONGPASS"):
+            await RedisCache(server.url.replace("s3cret", "nope"), 1, 1).get("k1")
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        server.stop()
+
+    assert server.commands.count("AUTH") == 3
+
+
+def test_redis_incr_creates_the_counter_with_its_ttl(redis_server: FakeRedisServer):
+    async def scenario() -> None:
+        cache = RedisCache(redis_server.url, pool_size=1, timeout=1)
+        assert await cache.incr("hits", 2, ttl=10) == 2
+        assert await cache.incr("hits", 3, ttl=10) == 5
+
+        await cache.set("name", b"abc")
+        with pytest.raises(CacheError):
+            await cache.incr("name", ttl=10)
+        assert await cache.get("hits") == b"5"
+        await cache.close()
+
+    asyncio.run(scenario())
+
+    assert "PEXPIRE" not in redis_server.commands
+    assert redis_server.data[b"hits"][0] is not None
+
+
+def test_redis_cache_unavailable():
+    server = FakeRedisServer().start()
+    server.stop()
+
+    async def scenario() -> None:
+        with pytest.raises(CacheError, match="Cache unavailable"):
+            await RedisCache(server.url, 1, 0.5).get("key")
+
+    asyncio.run(scenario())
+
+
+def test_lifespan_uses_configured_backend(
+    session: Session,
+    redis_server: FakeRedisServer,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "cache_backend", "redis")
+    monkeypatch.setattr(settings, "cache_url", redis_server.url)
+
+    with TestClient(app) as client:
+        cache = app.state.cache
+        assert isinstance(cache, RedisCache)
+        client.portal.call(cache.set, "greeting", b"hello")  # type: ignore
+
+    assert redis_server.data[b"greeting"] == (None, b"hello")
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_cache_backend("memcached", "", 1, 1, 1)
@@ -1,9 +1,14 @@
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select, update
 
+from app.models.cart import Cart, CartItem
 from app.models.product import Product
+from app.models.user import User
+from app.services.product_cache import product_cache
+from tests.conftest import QueryCounter
 
 
 def test_add_item_to_cart(
@@ -145,3 +150,242 @@ def test_clear_cart(
 
     cart_response = client.get("/api/v1/cart/", headers=auth_headers)
     assert len(cart_response.json()["items"]) == 0
+
+
+def test_get_cart_query_count_is_constant(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    test_user: User,
+    session: Session,
+    query_counter: QueryCounter,
+):
+    from decimal import Decimal
+
+    def add_products(count: int) -> int:
+        cart = session.exec(select(Cart).where(Cart.user_id == test_user.id)).one()
+        assert cart.id is not None
+        for i in range(count):
+            product = Product(
+                name=f"Bulk Product {i}",
+                description="Bulk",
+                price=Decimal("1.00"),
+                stock_quantity=100,
+            )
+            session.add(product)
+            session.flush()
+            assert product.id is not None
+            session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1))
+        session.commit()
+
+        before = query_counter.count
+        response = client.get("/api/v1/cart/", headers=auth_headers)
+        assert response.status_code == 200
+        return query_counter.count - before
+
+    client.get("/api/v1/cart/", headers=auth_headers)
+
+    assert add_products(1) == add_products(30)
+
+
+def test_get_cart_conditional_request(
+    client: TestClient, auth_headers: dict[str, Any], test_product: Product
+):
+    etag = client.get("/api/v1/cart/", headers=auth_headers).headers["ETag"]
+
+    response = client.get(
+        "/api/v1/cart/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 304
+
+    client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": test_product.id, "quantity": 1},
+    )
+
+    response = client.get(
+        "/api/v1/cart/", headers={**auth_headers, "If-None-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+
+def test_placing_an_order_modifies_the_cart(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": test_product.id, "quantity": 1},
+    )
+    an_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+    for model in (Cart, Product):
+        session.exec(update(model).values(updated_at=an_hour_ago))  # type: ignore
+    session.commit()
+    product_cache.clear()
+
+    last_modified = client.get("/api/v1/cart/", headers=auth_headers).headers[
+        "Last-Modified"
+    ]
+    assert client.post("/api/v1/orders/", headers=auth_headers).status_code == 201
+
+    response = client.get(
+        "/api/v1/cart/", headers={**auth_headers, "If-Modified-Since": last_modified}
+    )
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+def make_products(session: Session, count: int, stock: int = 10) -> list[Product]:
+    from decimal import Decimal
+
+    products = [
+        Product(
+            name=f"Batch Product {i}",
+            description="Batch",
+            price=Decimal("2.50"),
+            stock_quantity=stock,
+        )
+        for i in range(count)
+    ]
+    session.add_all(products)
+    session.commit()
+    for product in products:
+        session.refresh(product)
+    return products
+
+
+def test_batch_cart_operations(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    session: Session,
+    test_product: Product,
+):
+    kept, replaced, removed = make_products(session, 3)
+    client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": removed.id, "quantity": 1},
+    )
+
+    response = client.post(
+        "/api/v1/cart/items:batch",
+        headers=auth_headers,
+        json={
+            "operations": [
+                {"op": "add", "product_id": kept.id, "quantity": 2},
+                {"op": "add", "product_id": kept.id, "quantity": 3},
+                {"op": "add", "product_id": replaced.id, "quantity": 4},
+                {"op": "set", "product_id": replaced.id, "quantity": 1},
+                {"op": "remove", "product_id": removed.id},
+                {"op": "set", "product_id": test_product.id, "quantity": 10},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert {item["product"]["id"]: item["quantity"] for item in data["items"]} == {
+        kept.id: 5,
+        replaced.id: 1,
+        test_product.id: 10,
+    }
+    assert data["total"] == "1014.90"
+
+
+def test_batch_cart_is_all_or_nothing(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    session: Session,
+    test_product: Product,
+):
+    (product,) = make_products(session, 1, stock=3)
+
+    response = client.post(
+        "/api/v1/cart/items:batch",
+        headers=auth_headers,
+        json={
+            "operations": [
+                {"op": "add", "product_id": test_product.id, "quantity": 1},
+                {"op": "add", "product_id": product.id, "quantity": 2},
+                {"op": "add", "product_id": product.id, "quantity": 2},
+            ]
+        },
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Insufficient stock for products: {product.id}"
+
+    response = client.post(
+        "/api/v1/cart/items:batch",
+        headers=auth_headers,
+        json={
+            "operations": [
+                {"op": "add", "product_id": test_product.id, "quantity": 1},
+                {"op": "add", "product_id": 999, "quantity": 1},
+            ]
+        },
+    )
+    assert response.status_code == 404
+
+    response = client.post(
+        "/api/v1/cart/items:batch",
+        headers=auth_headers,
+        json={"operations": [{"op": "add", "product_id": test_product.id}]},
+    )
+    assert response.status_code == 422
+
+    response = client.get("/api/v1/cart/", headers=auth_headers)
+    assert response.json()["items"] == []
+
+
+def test_batch_cart_query_count_is_constant(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    session: Session,
+    query_counter: QueryCounter,
+):
+    client.get("/api/v1/cart/", headers=auth_headers)
+
+    def add_products(count: int) -> int:
+        products = make_products(session, count)
+        before = query_counter.count
+        response = client.post(
+            "/api/v1/cart/items:batch",
+            headers=auth_headers,
+            json={
+                "operations": [
+                    {"op": "add", "product_id": product.id, "quantity": 1}
+                    for product in products
+                ]
+            },
+        )
+        assert response.status_code == 200
+        count = query_counter.count - before
+        client.delete("/api/v1/cart/", headers=auth_headers)
+        return count
+
+    assert add_products(1) == add_products(30)
+
+
+def test_reorder_adds_order_items_to_cart(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    session: Session,
+    test_product: Product,
+):
+    client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": test_product.id, "quantity": 2},
+    )
+    order = client.post("/api/v1/orders/", headers=auth_headers).json()
+
+    response = client.post(f"/api/v1/cart/reorder/{order['id']}", headers=auth_headers)
+    assert response.status_code == 200
+    assert [item["quantity"] for item in response.json()["items"]] == [2]
+
+    response = client.post(f"/api/v1/cart/reorder/{order['id']}", headers=admin_headers)
+    assert response.status_code == 404
@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+from decimal import Decimal
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from sqlalchemy import Engine
+from sqlmodel import Session, col, select
+
+from app.config import Settings, settings
+from app.database import stream_records
+from app.models.product import Product
+
+
+@pytest.fixture(name="sync_mode")
+def sync_mode_fixture(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "database_async", False)
+
+
+def test_sync_mode_cart_and_order_flow(
+    sync_mode: None,
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    response = client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": test_product.id, "quantity": 2},
+    )
+    assert response.status_code == 200
+
+    response = client.post("/api/v1/orders/", headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json()["items"][0]["quantity"] == 2
+
+    product_response = client.get(f"/api/v1/products/{test_product.id}")
+    assert product_response.json()["stock_quantity"] == test_product.stock_quantity - 2
+
+
+def test_sync_mode_profile(
+    sync_mode: None, client: TestClient, auth_headers: dict[str, Any]
+):
+    response = client.get("/api/v1/users/me", headers=auth_headers)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("database_async", [True, False])
+def test_writes_commit_while_an_export_streams(
+    engine: Engine,
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+    database_async: bool,
+):
+    monkeypatch.setattr(settings, "database_async", database_async)
+    monkeypatch.setattr(settings, "export_chunk_size", 1)
+    with Session(engine) as session:
+        session.add(
+            Product(name="Second", description="", price=Decimal("1"), stock_quantity=1)
+        )
+        session.commit()
+
+    async def export_while_writing() -> list[str]:
+        chunks = stream_records(select(Product.name).order_by(col(Product.id)))
+        names = [row["name"] for row in await anext(chunks)]
+
+        connection = sqlite3.connect(str(engine.url.database), timeout=0.1)
+        with connection:
+            connection.execute("UPDATE product SET name = 'Renamed'")
+        connection.close()
+
+        async for chunk in chunks:
+            names += [row["name"] for row in chunk]
+        return names
+
+    assert asyncio.run(export_while_writing()) == ["Test Product", "Second"]
+    with Session(engine) as session:
+        assert set(session.exec(select(Product.name)).all()) == {"Renamed"}
+
+
+def test_async_database_url_follows_database_url():
+    derived = Settings(database_url="sqlite:////tmp/shop.db")
+    assert derived.async_database_url == "sqlite+aiosqlite:////tmp/shop.db"
+
+    with pytest.raises(ValidationError, match="same database"):
+        Settings(
+            database_url="sqlite:////tmp/shop.db",
+            async_database_url="sqlite+aiosqlite:///./ecommerce.db",
+        )
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select, update
+
+from app.config import settings
+from app.models.idempotency import IdempotencyKey
+from app.models.order import Order
+from app.models.product import Product
+from app.services.idempotency import purge_expired_idempotency_keys
+from tests.test_payment import flaky_transport, use_transport
+from tests.test_reports import place_order
+
+
+def add_to_cart(client: TestClient, headers: dict[str, Any], product: Product) -> None:
+    response = client.post(
+        "/api/v1/cart/items",
+        headers=headers,
+        json={"product_id": product.id, "quantity": 1},
+    )
+    assert response.status_code in (200, 201)
+
+
+def count_orders(session: Session) -> int:
+    return session.exec(select(func.count()).select_from(Order)).one()
+
+
+def test_repeated_order_is_replayed(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    headers = {**auth_headers, "Idempotency-Key": "order-1"}
+    add_to_cart(client, auth_headers, test_product)
+
+    first = client.post("/api/v1/orders/", headers=headers)
+    assert first.status_code == 201
+    assert "Idempotent-Replayed" not in first.headers
+
+    add_to_cart(client, auth_headers, test_product)
+    second = client.post("/api/v1/orders/", headers=headers)
+    assert second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.json() == first.json()
+    assert count_orders(session) == 1
+
+    response = client.post("/api/v1/orders/", headers=auth_headers)
+    assert response.status_code == 201
+    assert count_orders(session) == 2
+
+
+def test_client_errors_are_replayed(
+    client: TestClient, auth_headers: dict[str, Any], test_product: Product
+):
+    headers = {**auth_headers, "Idempotency-Key": "order-1"}
+
+    response = client.post("/api/v1/orders/", headers=headers)
+    assert response.status_code == 400
+
+    add_to_cart(client, auth_headers, test_product)
+    response = client.post("/api/v1/orders/", headers=headers)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Cart is empty"}
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+def test_key_reused_for_another_request_is_rejected(
+    client: TestClient, auth_headers: dict[str, Any], test_product: Product
+):
+    order = place_order(client, auth_headers, test_product, 1)
+    add_to_cart(client, auth_headers, test_product)
+    headers = {**auth_headers, "Idempotency-Key": "reused"}
+
+    response = client.post("/api/v1/orders/", headers=headers)
+    assert response.status_code == 201
+
+    response = client.post(f"/api/v1/orders/{order['id']}/checkout", headers=headers)
+    assert response.status_code == 422
+
+
+def test_concurrent_duplicates_run_once(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    add_to_cart(client, auth_headers, test_product)
+    headers = {**auth_headers, "Idempotency-Key": "order-1"}
+    requests = 8
+    barrier = threading.Barrier(requests)
+
+    def create() -> httpx.Response:
+        barrier.wait()
+        return client.post("/api/v1/orders/", headers=headers)
+
+    with ThreadPoolExecutor(max_workers=requests) as executor:
+        responses = list(executor.map(lambda _: create(), range(requests)))
+
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum("Idempotent-Replayed" in r.headers for r in responses) == requests - 1
+    assert count_orders(session) == 1
+
+
+def test_checkout_is_created_once(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "stripe_retry_backoff_seconds", 0)
+    monkeypatch.setattr(settings, "stripe_max_retries", 0)
+    calls: list[httpx.Request] = []
+    use_transport(monkeypatch, flaky_transport([503, 200], calls))
+    order = place_order(client, auth_headers, test_product, 1)
+    headers = {**auth_headers, "Idempotency-Key": "checkout-1"}
+
+    # Server errors release the key so the client can retry with it.
+    response = client.post(f"/api/v1/orders/{order['id']}/checkout", headers=headers)
+    assert response.status_code == 503
+
+    for _ in range(2):
+        response = client.post(
+            f"/api/v1/orders/{order['id']}/checkout", headers=headers
+        )
+        assert response.status_code == 200
+        assert response.json()["session_id"] == "cs_test_1"
+    assert len(calls) == 2
+
+
+def test_expired_keys_are_purged(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    add_to_cart(client, auth_headers, test_product)
+    headers = {**auth_headers, "Idempotency-Key": "order-1"}
+    client.post("/api/v1/orders/", headers=headers)
+    client.post("/api/v1/orders/", headers={**auth_headers, "Idempotency-Key": "x"})
+
+    session.exec(
+        update(IdempotencyKey)  # type: ignore
+        .where(IdempotencyKey.key == "order-1")  # type: ignore
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+    )
+    session.commit()
+
+    assert asyncio.run(purge_expired_idempotency_keys()) == 1
+    assert session.exec(select(IdempotencyKey.key)).all() == ["x"]
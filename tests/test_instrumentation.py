@@ -0,0 +1,108 @@
+import logging
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.models.product import Product
+from tests.conftest import QueryCounter
+
+
+def timing_queries(header: str) -> int:
+    match = re.search(r'db;dur=[\d.]+;desc="(\d+) queries"', header)
+    assert match is not None, header
+    return int(match.group(1))
+
+
+def test_server_timing_counts_request_queries(
+    client: TestClient,
+    auth_headers: dict[str, str],
+    test_product: Product,
+    query_counter: QueryCounter,
+):
+    query_counter.count = 0
+    response = client.get(f"/api/v1/products/{test_product.id}")
+
+    assert response.status_code == 200
+    assert timing_queries(response.headers["Server-Timing"]) == query_counter.count
+    assert re.search(r"total;dur=[\d.]+", response.headers["Server-Timing"])
+
+    query_counter.count = 0
+    response = client.get("/api/v1/orders/", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert query_counter.count > 0
+    assert timing_queries(response.headers["Server-Timing"]) == query_counter.count
+
+
+def test_server_timing_without_queries(client: TestClient):
+    response = client.get("/")
+
+    assert timing_queries(response.headers["Server-Timing"]) == 0
+
+
+def test_server_timing_can_be_disabled(
+    client: TestClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(settings, "server_timing", False)
+
+    response = client.get("/")
+
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+
+
+def test_access_log_line(
+    client: TestClient, auth_headers: dict[str, str], caplog: pytest.LogCaptureFixture
+):
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        response = client.get("/api/v1/orders/", headers=auth_headers)
+
+    record = next(r for r in caplog.records if r.name == "app.access")
+    assert record.method == "GET"  # type: ignore
+    assert record.path == "/api/v1/orders/"  # type: ignore
+    assert record.status == 200  # type: ignore
+    assert record.db_queries == timing_queries(  # type: ignore
+        response.headers["Server-Timing"]
+    )
+    assert "method=GET path=/api/v1/orders/ status=200" in record.getMessage()
+
+
+def test_access_log_records_errors(
+    client: TestClient, caplog: pytest.LogCaptureFixture
+):
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        response = client.get("/api/v1/products/999999")
+
+    assert response.status_code == 404
+    record = next(r for r in caplog.records if r.name == "app.access")
+    assert record.status == 404  # type: ignore
+
+
+def test_warns_over_query_threshold(
+    client: TestClient,
+    auth_headers: dict[str, str],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+):
+    monkeypatch.setattr(settings, "query_count_warning_threshold", 1)
+
+    item = {"product_id": test_product.id, "quantity": 1}
+
+    with caplog.at_level(logging.WARNING, logger="app.core.instrumentation"):
+        client.post("/api/v1/cart/items", headers=auth_headers, json=item)
+
+    assert any(
+        "POST /api/v1/cart/items issued" in record.getMessage()
+        for record in caplog.records
+    )
+
+    caplog.clear()
+    monkeypatch.setattr(settings, "query_count_warning_threshold", 0)
+
+    with caplog.at_level(logging.WARNING, logger="app.core.instrumentation"):
+        client.post("/api/v1/cart/items", headers=auth_headers, json=item)
+
+    assert not caplog.records
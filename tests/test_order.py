@@ -1,8 +1,29 @@
+import asyncio
+import csv
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from typing import Any
 
+import pytest
 from fastapi.testclient import TestClient
-
-from app.models.product import Product
+from sqlmodel import Session, func, select
+
+from app.api.v1.auth import issue_access_token
+from app.config import settings
+from app.models.cart import Cart, CartItem
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product, ProductStockShard
+from app.models.reservation import ReservationStatus, StockReservation
+from app.models.user import User, UserRole
+from app.services.product_cache import product_cache
+from app.services.reservation import sweep_expired_reservations
+from app.services.stock import rebalance_all_stock_shards, split_quantity
+from app.services.webhook_inbox import drain_webhook_inbox
+from tests.conftest import QueryCounter
 
 
 def test_create_order_from_cart(
@@ -186,3 +207,403 @@ def test_regular_user_cannot_update_order_status(
     )
 
     assert response.status_code == 403
+
+
+def test_get_order_query_count_is_constant(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    test_user: User,
+    session: Session,
+    query_counter: QueryCounter,
+):
+    def create_order(item_count: int) -> int:
+        assert test_user.id is not None
+        order = Order(user_id=test_user.id, total_price=Decimal(item_count))
+        session.add(order)
+        session.flush()
+        assert order.id is not None
+        for i in range(item_count):
+            product = Product(
+                name=f"Bulk Product {i}",
+                description="Bulk",
+                price=Decimal("1.00"),
+                stock_quantity=100,
+            )
+            session.add(product)
+            session.flush()
+            assert product.id is not None
+            session.add(
+                OrderItem(
+                    order_id=order.id,
+                    product_id=product.id,
+                    quantity=1,
+                    price_at_purchase=product.price,
+                    subtotal=product.price,
+                )
+            )
+        session.commit()
+
+        before = query_counter.count
+        response = client.get(f"/api/v1/orders/{order.id}", headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == item_count
+        return query_counter.count - before
+
+    assert create_order(1) == create_order(30)
+
+
+def test_list_all_orders_query_count_is_constant(
+    client: TestClient,
+    admin_headers: dict[str, Any],
+    test_user: User,
+    test_product: Product,
+    session: Session,
+    query_counter: QueryCounter,
+):
+    def create_orders(count: int) -> int:
+        assert test_user.id is not None
+        assert test_product.id is not None
+        for _ in range(count):
+            order = Order(user_id=test_user.id, total_price=test_product.price)
+            session.add(order)
+            session.flush()
+            assert order.id is not None
+            session.add(
+                OrderItem(
+                    order_id=order.id,
+                    product_id=test_product.id,
+                    quantity=1,
+                    price_at_purchase=test_product.price,
+                    subtotal=test_product.price,
+                )
+            )
+        session.commit()
+        product_cache.clear()
+
+        before = query_counter.count
+        response = client.get("/api/v1/orders/all?limit=100", headers=admin_headers)
+        assert response.status_code == 200
+        assert all(len(order["items"]) == 1 for order in response.json())
+        return query_counter.count - before
+
+    assert create_orders(1) == create_orders(20)
+
+
+def test_admin_list_all_orders_cursor_pagination(
+    client: TestClient,
+    admin_headers: dict[str, Any],
+    test_user: User,
+    test_product: Product,
+    session: Session,
+):
+    assert test_user.id is not None
+    for _ in range(5):
+        session.add(Order(user_id=test_user.id, total_price=test_product.price))
+    session.commit()
+
+    first_page = client.get(
+        "/api/v1/orders/all", headers=admin_headers, params={"limit": 3}
+    )
+    cursor = first_page.headers["X-Next-Cursor"]
+    second_page = client.get(
+        "/api/v1/orders/all",
+        headers=admin_headers,
+        params={"limit": 3, "cursor": cursor},
+    )
+
+    assert "X-Next-Cursor" not in second_page.headers
+    first_ids = [order["id"] for order in first_page.json()]
+    second_ids = [order["id"] for order in second_page.json()]
+    assert first_ids + second_ids == sorted(first_ids + second_ids, reverse=True)
+    assert len(set(first_ids + second_ids)) == 5
+
+
+@pytest.mark.parametrize("stock_shards", [0, 3])
+@pytest.mark.parametrize("database_async", [True, False])
+def test_concurrent_orders_do_not_oversell(
+    client: TestClient,
+    session: Session,
+    database_async: bool,
+    stock_shards: int,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "database_async", database_async)
+
+    stock = 5
+    buyers = 16
+
+    product = Product(
+        name="Limited Product",
+        description="Only a few left",
+        price=Decimal("10.00"),
+        stock_quantity=stock,
+        stock_shards=stock_shards,
+    )
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+
+    for slot, quantity in enumerate(split_quantity(stock, stock_shards or 1)):
+        if stock_shards:
+            session.add(
+                ProductStockShard(product_id=product.id, slot=slot, quantity=quantity)  # type: ignore
+            )
+    session.commit()
+
+    headers = []
+    for i in range(buyers):
+        user = User(
+            email=f"buyer{i}@example.com",
+            full_name=f"Buyer {i}",
+            hashed_password="unused",
+            role=UserRole.CUSTOMER,
+        )
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+        cart = Cart(user_id=user.id)  # type: ignore
+        session.add(cart)
+        session.commit()
+        session.refresh(cart)
+
+        session.add(CartItem(cart_id=cart.id, product_id=product.id, quantity=1))  # type: ignore
+        session.commit()
+
+        headers.append({"Authorization": f"Bearer {issue_access_token(user)}"})
+
+    barrier = threading.Barrier(buyers)
+
+    def buy(buyer_headers: dict[str, str]) -> int:
+        barrier.wait()
+        return client.post("/api/v1/orders/", headers=buyer_headers).status_code
+
+    with ThreadPoolExecutor(max_workers=buyers) as pool:
+        statuses = list(pool.map(buy, headers))
+
+    assert statuses.count(201) == stock
+    assert statuses.count(400) == buyers - stock
+
+    if stock_shards:
+        asyncio.run(rebalance_all_stock_shards())
+
+    session.refresh(product)
+    assert product.stock_quantity == 0
+    assert product.reserved_quantity == stock
+    assert session.exec(select(func.count()).select_from(Order)).one() == stock
+    assert session.exec(select(func.sum(OrderItem.quantity))).one() == stock
+
+
+def place_order(
+    client: TestClient, headers: dict[str, Any], product: Product, quantity: int
+) -> dict[str, Any]:
+    client.post(
+        "/api/v1/cart/items",
+        headers=headers,
+        json={"product_id": product.id, "quantity": quantity},
+    )
+    response = client.post("/api/v1/orders/", headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def test_create_order_reserves_stock(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 3)
+
+    reservation = session.exec(
+        select(StockReservation).where(StockReservation.order_id == order["id"])
+    ).one()
+    assert reservation.status == ReservationStatus.ACTIVE
+    assert reservation.quantity == 3
+
+    session.refresh(test_product)
+    assert test_product.stock_quantity == 7
+    assert test_product.reserved_quantity == 3
+
+
+def test_webhook_confirms_reservation(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 3)
+
+    response = client.post(
+        "/api/v1/webhooks/stripe",
+        json={
+            "type": "checkout.session.completed",
+            "data": {"object": {"metadata": {"order_id": str(order["id"])}}},
+        },
+    )
+    assert response.status_code == 200
+    assert asyncio.run(drain_webhook_inbox()) == 1
+
+    reservation = session.exec(
+        select(StockReservation).where(StockReservation.order_id == order["id"])
+    ).one()
+    assert reservation.status == ReservationStatus.CONFIRMED
+
+    session.refresh(test_product)
+    assert test_product.stock_quantity == 7
+    assert test_product.reserved_quantity == 0
+
+
+def test_sweeper_releases_expired_reservations_in_batches(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    other_product = Product(
+        name="Other Test Product",
+        description="Another test product",
+        price=Decimal("5.00"),
+        stock_quantity=4,
+    )
+    session.add(other_product)
+    session.commit()
+    session.refresh(other_product)
+
+    client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": other_product.id, "quantity": 4},
+    )
+    order = place_order(client, auth_headers, test_product, 3)
+    assert (
+        client.get(f"/api/v1/products/{test_product.id}").json()["stock_quantity"] == 7
+    )
+
+    for reservation in session.exec(select(StockReservation)).all():
+        reservation.expires_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+        session.add(reservation)
+    session.commit()
+
+    monkeypatch.setattr(settings, "reservation_sweep_batch_size", 1)
+    assert asyncio.run(sweep_expired_reservations()) == 2
+
+    session.refresh(test_product)
+    session.refresh(other_product)
+    assert (test_product.stock_quantity, test_product.reserved_quantity) == (10, 0)
+    assert (other_product.stock_quantity, other_product.reserved_quantity) == (4, 0)
+    assert session.get(Order, order["id"]).status == OrderStatus.CANCELLED  # type: ignore
+    assert (
+        client.get(f"/api/v1/products/{test_product.id}").json()["stock_quantity"] == 10
+    )
+
+
+def test_sharded_order_larger_than_any_slot(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    response = client.put(
+        f"/api/v1/products/{test_product.id}/stock-shards",
+        headers=admin_headers,
+        json={"shards": 4},
+    )
+    assert response.status_code == 200
+
+    order = place_order(client, auth_headers, test_product, 9)
+
+    shards = session.exec(
+        select(ProductStockShard).where(ProductStockShard.product_id == test_product.id)
+    ).all()
+    assert sum(shard.quantity for shard in shards) == 1
+    assert sum(shard.reserved for shard in shards) == 9
+    assert (
+        client.get(f"/api/v1/products/{test_product.id}").json()["stock_quantity"] == 1
+    )
+
+    reservation = session.exec(
+        select(StockReservation).where(StockReservation.order_id == order["id"])
+    ).one()
+    reservation.expires_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+    session.add(reservation)
+    session.commit()
+
+    assert asyncio.run(sweep_expired_reservations()) == 1
+    assert asyncio.run(rebalance_all_stock_shards()) == 1
+
+    session.expire_all()
+    assert [shard.quantity for shard in shards] == [3, 3, 2, 2]
+    assert sum(shard.reserved for shard in shards) == 0
+    session.refresh(test_product)
+    assert (test_product.stock_quantity, test_product.reserved_quantity) == (10, 0)
+
+
+@pytest.mark.parametrize("database_async", [True, False])
+def test_export_orders_ndjson_nests_items(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+    database_async: bool,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "database_async", database_async)
+    monkeypatch.setattr(settings, "export_chunk_size", 1)
+
+    first = place_order(client, auth_headers, test_product, 1)
+    second = place_order(client, auth_headers, test_product, 2)
+    client.patch(
+        f"/api/v1/orders/{second['id']}", headers=admin_headers, json={"status": "paid"}
+    )
+
+    response = client.get(
+        "/api/v1/orders/export", headers=admin_headers, params={"format": "ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert [order["order_id"] for order in orders] == [first["id"], second["id"]]
+    assert [len(order["items"]) for order in orders] == [1, 1]
+    assert orders[1]["items"][0]["quantity"] == 2
+
+    response = client.get(
+        "/api/v1/orders/export",
+        headers=admin_headers,
+        params={"format": "ndjson", "status": "paid"},
+    )
+    assert [json.loads(line)["order_id"] for line in response.text.splitlines()] == [
+        second["id"]
+    ]
+
+
+def test_export_orders_csv_gzip(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 3)
+
+    response = client.get(
+        "/api/v1/orders/export", headers=admin_headers, params={"gzip": True}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert 'filename="orders.csv"' in response.headers["content-disposition"]
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["order_id"] == str(order["id"])
+    assert rows[0]["status"] == "pending"
+    assert rows[0]["quantity"] == "3"
+
+
+def test_regular_user_cannot_export_orders(
+    client: TestClient, auth_headers: dict[str, Any]
+):
+    response = client.get("/api/v1/orders/export", headers=auth_headers)
+    assert response.status_code == 403
@@ -0,0 +1,266 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+from sqlmodel import Session, select
+
+from app.api.v1.products import as_utc
+from app.config import Settings, settings
+from app.fake_stripe import create_fake_stripe, decode_form
+from app.models.order import Order
+from app.models.product import Product
+from app.models.reservation import StockReservation
+from app.services import payment
+from app.services.payment import (
+    PaymentError,
+    PaymentUnavailable,
+    StripeClient,
+    encode_form,
+)
+from tests.test_reports import place_order
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "stripe_retry_backoff_seconds", 0)
+    monkeypatch.setattr(settings, "stripe_breaker_threshold", 2)
+
+
+def use_transport(
+    monkeypatch: pytest.MonkeyPatch, transport: httpx.AsyncBaseTransport
+) -> StripeClient:
+    client = StripeClient("sk_test", "http://stripe.test", transport=transport)
+    monkeypatch.setattr(payment, "stripe_client", client)
+    return client
+
+
+def flaky_transport(statuses: list[int], requests: list[httpx.Request]):
+    responses = iter(statuses)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        code = next(responses)
+        if code == 0:
+            raise httpx.ReadTimeout("timed out", request=request)
+        if code == -1:
+            raise RuntimeError("unexpected")
+        if code >= 400:
+            return httpx.Response(code, json={"error": {"message": f"HTTP {code}"}})
+        return httpx.Response(code, json={"id": "cs_test_1", "url": "https://pay"})
+
+    return httpx.MockTransport(handler)
+
+
+def test_encode_form_round_trips():
+    params = {
+        "mode": "payment",
+        "line_items": [{"price_data": {"unit_amount": 100}, "quantity": 1}],
+        "expires_at": None,
+    }
+    fields = encode_form(params)
+
+    assert fields == [
+        ("mode", "payment"),
+        ("line_items[0][price_data][unit_amount]", "100"),
+        ("line_items[0][quantity]", "1"),
+    ]
+    assert decode_form(fields)["line_items"]["0"]["quantity"] == "1"
+
+
+def test_checkout_uses_fake_stripe(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    use_transport(monkeypatch, httpx.ASGITransport(app=create_fake_stripe()))
+    order = place_order(client, auth_headers, test_product, 1)
+
+    response = client.post(
+        f"/api/v1/orders/{order['id']}/checkout", headers=auth_headers
+    )
+    assert response.status_code == 200
+    checkout = response.json()
+    assert checkout["session_id"].startswith("cs_test_")
+    assert checkout["checkout_url"].endswith(checkout["session_id"])
+
+    stored = session.get(Order, order["id"])
+    assert stored is not None
+    assert stored.stripe_checkout_session_id == checkout["session_id"]
+
+
+def write_during_stripe_call(db_path: str, statement: str, writes: list[str]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        connection = sqlite3.connect(db_path, timeout=0.1)
+        try:
+            with connection:
+                connection.execute(statement)
+            writes.append("ok")
+        except sqlite3.OperationalError as e:
+            writes.append(str(e))
+        finally:
+            connection.close()
+        return httpx.Response(200, json={"id": "cs_test_1", "url": "https://pay"})
+
+    return httpx.MockTransport(handler)
+
+
+def test_checkout_holds_no_lock_during_stripe_call(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    order = place_order(client, auth_headers, test_product, 1)
+    writes: list[str] = []
+    statement = f"UPDATE product SET description = 'x' WHERE id = {test_product.id}"
+    use_transport(
+        monkeypatch,
+        write_during_stripe_call(
+            str(session.get_bind().url.database), statement, writes
+        ),
+    )
+
+    response = client.post(
+        f"/api/v1/orders/{order['id']}/checkout", headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert writes == ["ok"]
+    stored = session.get(Order, order["id"])
+    assert stored is not None
+    assert stored.stripe_checkout_session_id == "cs_test_1"
+    reservation = session.exec(
+        select(StockReservation).where(StockReservation.order_id == order["id"])
+    ).one()
+    assert as_utc(reservation.expires_at) > datetime.now(timezone.utc)
+
+
+def test_checkout_of_order_cancelled_during_stripe_call(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    order = place_order(client, auth_headers, test_product, 1)
+    writes: list[str] = []
+    statement = f"UPDATE \"order\" SET status = 'CANCELLED' WHERE id = {order['id']}"
+    use_transport(
+        monkeypatch,
+        write_during_stripe_call(
+            str(session.get_bind().url.database), statement, writes
+        ),
+    )
+
+    response = client.post(
+        f"/api/v1/orders/{order['id']}/checkout", headers=auth_headers
+    )
+
+    assert response.status_code == 409
+    assert writes == ["ok"]
+    stored = session.get(Order, order["id"])
+    assert stored is not None
+    assert stored.stripe_checkout_session_id is None
+
+
+def test_retries_reuse_idempotency_key(monkeypatch: pytest.MonkeyPatch):
+    requests: list[httpx.Request] = []
+    stripe = use_transport(monkeypatch, flaky_transport([0, 503, 200], requests))
+
+    checkout = asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+
+    assert checkout == {"id": "cs_test_1", "url": "https://pay"}
+    assert len(requests) == 3
+    assert len({request.headers["Idempotency-Key"] for request in requests}) == 1
+    assert not stripe.breaker.is_open
+
+
+def test_client_errors_are_not_retried(monkeypatch: pytest.MonkeyPatch):
+    requests: list[httpx.Request] = []
+    use_transport(monkeypatch, flaky_transport([400], requests))
+
+    with pytest.raises(PaymentError, match="HTTP 400"):
+        asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+    assert len(requests) == 1
+
+
+def test_breaker_opens_and_fails_fast(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    requests: list[httpx.Request] = []
+    stripe = use_transport(monkeypatch, flaky_transport([500] * 6, requests))
+    order = place_order(client, auth_headers, test_product, 1)
+
+    for _ in range(2):
+        response = client.post(
+            f"/api/v1/orders/{order['id']}/checkout", headers=auth_headers
+        )
+        assert response.status_code == 503
+    assert len(requests) == 6
+    assert stripe.breaker.is_open
+
+    response = client.post(
+        f"/api/v1/orders/{order['id']}/checkout", headers=auth_headers
+    )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+    assert len(requests) == 6
+
+
+def test_breaker_closes_after_successful_trial(monkeypatch: pytest.MonkeyPatch):
+    requests: list[httpx.Request] = []
+    stripe = use_transport(monkeypatch, flaky_transport([500] * 6 + [200], requests))
+    stripe.breaker.reset_seconds = 0
+
+    for _ in range(2):
+        with pytest.raises(PaymentUnavailable):
+            asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+    assert stripe.breaker.is_open
+
+    asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+    assert not stripe.breaker.is_open
+
+
+def test_breaker_records_a_trial_that_raises(monkeypatch: pytest.MonkeyPatch):
+    requests: list[httpx.Request] = []
+    stripe = use_transport(
+        monkeypatch, flaky_transport([500] * 6 + [-1, 200], requests)
+    )
+    stripe.breaker.reset_seconds = 0
+
+    for _ in range(2):
+        with pytest.raises(PaymentUnavailable):
+            asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+    assert stripe.breaker.is_open
+
+    asyncio.run(payment.create_checkout_session(1, Decimal("10.00")))
+    assert not stripe.breaker.is_open
+
+
+def test_checkout_expiry_stays_within_stripe_limits():
+    now = datetime.now(timezone.utc)
+
+    assert payment.checkout_expiry(now) >= now + timedelta(minutes=30)
+    assert payment.checkout_expiry(now + timedelta(hours=2)) == now + timedelta(hours=2)
+    assert payment.checkout_expiry(now + timedelta(days=2)) <= now + timedelta(hours=24)
+
+
+def test_reservation_ttl_must_fit_a_checkout_session():
+    for minutes in (29, 24 * 60 + 1):
+        with pytest.raises(ValidationError):
+            Settings(reservation_ttl_minutes=minutes)
@@ -1,8 +1,24 @@
+import csv
+import io
+import itertools
+import json
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Any
 
+import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import Engine, event
+from sqlmodel import Session, select
 
-from app.models.product import Product
+from app.api.v1.products import PRODUCT_SORTS, product_list_query
+from app.config import settings
+from app.core.pagination import Cursor
+from app.models.product import Product, ProductStockShard
+from app.schemas.product import ProductResponse
+from app.services.product_cache import product_cache
+from tests.test_reports import place_order
 
 
 def test_list_products(client: TestClient, test_product: Product):
@@ -96,3 +112,589 @@ def test_delete_nonexistent_product(client: TestClient, admin_headers: dict[str,
     response = client.delete("/api/v1/products/9999", headers=admin_headers)
 
     assert response.status_code == 404
+
+
+def test_list_products_cursor_pagination(client: TestClient, session: Session):
+    for i in range(5):
+        session.add(
+            Product(
+                name=f"Paged Product {i}",
+                description="Paged",
+                price=Decimal("1.00"),
+                stock_quantity=1,
+            )
+        )
+    session.commit()
+
+    seen: list[int] = []
+    response = client.get("/api/v1/products/", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        seen.extend(product["id"] for product in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = client.get(
+            "/api/v1/products/", params={"limit": 2, "cursor": cursor}
+        )
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+def test_list_products_invalid_cursor(client: TestClient):
+    response = client.get("/api/v1/products/", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+
+def test_get_product_is_served_from_cache(client: TestClient, test_product: Product):
+    client.get(f"/api/v1/products/{test_product.id}")
+    hits = product_cache.hits
+
+    response = client.get(f"/api/v1/products/{test_product.id}")
+
+    assert response.status_code == 200
+    assert product_cache.hits == hits + 1
+
+
+def test_update_product_invalidates_cache(
+    client: TestClient, admin_headers: dict[str, Any], test_product: Product
+):
+    client.get(f"/api/v1/products/{test_product.id}")
+    client.get("/api/v1/products/")
+
+    client.patch(
+        f"/api/v1/products/{test_product.id}",
+        headers=admin_headers,
+        json={"name": "Renamed Product"},
+    )
+
+    detail = client.get(f"/api/v1/products/{test_product.id}").json()
+    listing = client.get("/api/v1/products/").json()
+    assert detail["name"] == "Renamed Product"
+    assert listing[0]["name"] == "Renamed Product"
+
+
+def test_get_product_conditional_request(
+    client: TestClient, admin_headers: dict[str, Any], test_product: Product
+):
+    response = client.get(f"/api/v1/products/{test_product.id}")
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"].startswith("public")
+    assert "Last-Modified" in response.headers
+
+    not_modified = client.get(
+        f"/api/v1/products/{test_product.id}", headers={"If-None-Match": etag}
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    client.patch(
+        f"/api/v1/products/{test_product.id}",
+        headers=admin_headers,
+        json={"price": 10.00},
+    )
+
+    modified = client.get(
+        f"/api/v1/products/{test_product.id}", headers={"If-None-Match": etag}
+    )
+    assert modified.status_code == 200
+    assert modified.headers["ETag"] != etag
+
+
+def test_list_products_conditional_request(client: TestClient, test_product: Product):
+    etag = client.get("/api/v1/products/").headers["ETag"]
+
+    response = client.get("/api/v1/products/", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+
+
+def test_search_products(client: TestClient, session: Session):
+    session.add(
+        Product(
+            name="Mechanical Keyboard",
+            description="Hot-swappable switches with walnut case",
+            price=Decimal("120.00"),
+            stock_quantity=3,
+        )
+    )
+    session.add(
+        Product(
+            name="Walnut Desk Organizer",
+            description="Walnut tray for walnut desks",
+            price=Decimal("35.00"),
+            stock_quantity=8,
+        )
+    )
+    session.commit()
+
+    response = client.get("/api/v1/products/search", params={"q": "walnut"})
+
+    assert response.status_code == 200
+    names = [product["name"] for product in response.json()]
+    assert names == ["Walnut Desk Organizer", "Mechanical Keyboard"]
+
+    response = client.get("/api/v1/products/search", params={"q": "switch"})
+    assert [product["name"] for product in response.json()] == ["Mechanical Keyboard"]
+
+
+def test_search_reflects_product_updates(
+    client: TestClient, admin_headers: dict[str, Any], test_product: Product
+):
+    for name in ["Renamed Teapot Product", "Renamed Kettle Product"]:
+        client.patch(
+            f"/api/v1/products/{test_product.id}",
+            headers=admin_headers,
+            json={"name": name},
+        )
+
+    found = client.get("/api/v1/products/search", params={"q": "kettle"}).json()
+    stale = client.get("/api/v1/products/search", params={"q": "teapot"}).json()
+
+    assert [product["id"] for product in found] == [test_product.id]
+    assert stale == []
+
+
+def test_list_products_filters_and_sorting(client: TestClient, session: Session):
+    for name, price, stock in [
+        ("Budget Widget", "5.00", 0),
+        ("Standard Widget", "25.00", 4),
+        ("Premium Widget", "80.00", 2),
+    ]:
+        session.add(
+            Product(
+                name=name, description=name, price=Decimal(price), stock_quantity=stock
+            )
+        )
+    session.commit()
+
+    response = client.get(
+        "/api/v1/products/",
+        params={"min_price": 10, "in_stock": True, "sort": "-price"},
+    )
+
+    assert response.status_code == 200
+    assert [product["name"] for product in response.json()] == [
+        "Premium Widget",
+        "Standard Widget",
+    ]
+
+    response = client.get("/api/v1/products/", params={"sort": "name", "limit": 2})
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(
+        "/api/v1/products/", params={"sort": "name", "limit": 2, "cursor": cursor}
+    )
+    assert [product["name"] for product in response.json()] == ["Standard Widget"]
+
+    response = client.get(
+        "/api/v1/products/", params={"sort": "price", "cursor": cursor}
+    )
+    assert response.status_code == 400
+
+
+def test_product_list_queries_use_indexes(engine: Engine):
+    filter_options: list[dict[str, Any]] = [
+        {"min_price": Decimal("10"), "max_price": Decimal("50")},
+        {"in_stock": True},
+        {
+            "created_after": datetime(2025, 1, 1, tzinfo=timezone.utc),
+            "created_before": datetime(2026, 1, 1, tzinfo=timezone.utc),
+        },
+    ]
+    filtered_columns = {
+        "min_price": "price",
+        "max_price": "price",
+        "created_after": "created_at",
+        "created_before": "created_at",
+    }
+    cursor_values = {
+        "created_at": "2025-06-01T00:00:00+00:00",
+        "price": "20.00",
+        "name": "Middle",
+    }
+
+    captured: list[tuple[str, Any]] = []
+
+    def capture(*args: Any) -> None:
+        captured.append((args[2], args[3]))
+
+    with engine.connect() as connection:
+        event.listen(connection, "before_cursor_execute", capture)
+
+        for size in range(len(filter_options) + 1):
+            for combination in itertools.combinations(filter_options, size):
+                filters = {k: v for option in combination for k, v in option.items()}
+                ranges = {filtered_columns[k] for k in filters if k != "in_stock"}
+                for sort, (column, _) in PRODUCT_SORTS.items():
+                    in_stock = "in_stock_" if "in_stock" in filters else ""
+                    sort_index = f"ix_product_{in_stock}{column.key}_id"
+                    cursor = Cursor(column.key, cursor_values[column.key], 1)
+                    for page_cursor in (None, cursor):
+                        query = product_list_query(
+                            **filters, sort=sort, cursor=page_cursor
+                        )
+                        connection.execute(query)
+                        statement, parameters = captured[-1]
+                        plan = [
+                            row[3]
+                            for row in connection.exec_driver_sql(
+                                f"EXPLAIN QUERY PLAN {statement}", parameters
+                            ).all()
+                        ]
+                        case = (filters, sort, page_cursor, plan)
+
+                        if ranges and column.key not in ranges:
+                            # Unsupported: a range on one column sorted by another.
+                            # SQLite searches the range's index and sorts the
+                            # matches, or walks the sort index and skips misses.
+                            assert all(
+                                detail.startswith("SEARCH product USING INDEX")
+                                or detail.startswith(
+                                    f"SCAN product USING INDEX {sort_index}"
+                                )
+                                or detail == "USE TEMP B-TREE FOR ORDER BY"
+                                for detail in plan
+                            ), case
+                            continue
+
+                        # Only the first page of an unfiltered (or in-stock)
+                        # list may walk the index from its start.
+                        scan = "SEARCH" if ranges or page_cursor else "SCAN"
+                        assert len(plan) == 1, case
+                        assert plan[0].startswith(
+                            f"{scan} product USING INDEX {sort_index}"
+                        ), case
+
+
+def test_toggle_stock_shards(
+    client: TestClient,
+    session: Session,
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    response = client.put(
+        f"/api/v1/products/{test_product.id}/stock-shards",
+        headers=admin_headers,
+        json={"shards": 3},
+    )
+    assert response.status_code == 200
+
+    shards = session.exec(
+        select(ProductStockShard).where(ProductStockShard.product_id == test_product.id)
+    ).all()
+    assert [shard.quantity for shard in shards] == [4, 3, 3]
+
+    response = client.patch(
+        f"/api/v1/products/{test_product.id}",
+        headers=admin_headers,
+        json={"stock_quantity": 7},
+    )
+    assert response.status_code == 200
+
+    session.expire_all()
+    assert [shard.quantity for shard in shards] == [3, 2, 2]
+
+    response = client.put(
+        f"/api/v1/products/{test_product.id}/stock-shards",
+        headers=admin_headers,
+        json={"shards": 0},
+    )
+    assert response.status_code == 200
+    assert response.json()["stock_quantity"] == 7
+    assert (
+        session.exec(
+            select(ProductStockShard).where(
+                ProductStockShard.product_id == test_product.id
+            )
+        ).all()
+        == []
+    )
+
+
+def test_export_sums_the_stock_slots(
+    client: TestClient,
+    session: Session,
+    admin_headers: dict[str, Any],
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    client.put(
+        f"/api/v1/products/{test_product.id}/stock-shards",
+        headers=admin_headers,
+        json={"shards": 3},
+    )
+    # No slot runs empty, so the stock_quantity column is not synced.
+    place_order(client, auth_headers, test_product, 1)
+    session.refresh(test_product)
+    assert test_product.stock_quantity == 10
+
+    response = client.get(
+        "/api/v1/products/export", headers=admin_headers, params={"format": "ndjson"}
+    )
+    assert json.loads(response.text)["stock_quantity"] == 9
+
+
+def test_sharded_stock_reads_sum_the_slots(
+    client: TestClient,
+    admin_headers: dict[str, Any],
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    client.put(
+        f"/api/v1/products/{test_product.id}/stock-shards",
+        headers=admin_headers,
+        json={"shards": 3},
+    )
+    place_order(client, auth_headers, test_product, 4)
+
+    def listed_stock(**params: Any) -> list[int]:
+        response = client.get("/api/v1/products/", params=params)
+        return [product["stock_quantity"] for product in response.json()]
+
+    detail = f"/api/v1/products/{test_product.id}"
+    assert client.get(detail).json()["stock_quantity"] == 6
+    assert listed_stock() == [6]
+    assert client.get(detail).json()["stock_quantity"] == 6
+
+    response = client.patch(detail, headers=admin_headers, json={"price": "12.50"})
+    assert response.json()["stock_quantity"] == 6
+
+    response = client.post(
+        "/api/v1/cart/items",
+        headers=auth_headers,
+        json={"product_id": test_product.id, "quantity": 7},
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "/api/v1/cart/items:batch",
+        headers=auth_headers,
+        json={
+            "operations": [{"op": "set", "product_id": test_product.id, "quantity": 7}]
+        },
+    )
+    assert response.status_code == 400
+
+    # Selling out flips the in-stock filter without waiting for the rebalancer.
+    sold_out = place_order(client, auth_headers, test_product, 6)
+    assert listed_stock(in_stock=True) == []
+    assert listed_stock() == [0]
+
+    response = client.patch(
+        f"/api/v1/orders/{sold_out['id']}",
+        headers=admin_headers,
+        json={"status": "cancelled"},
+    )
+    assert response.status_code == 200
+    assert listed_stock(in_stock=True) == [6]
+
+
+def test_regular_user_cannot_shard_stock(
+    client: TestClient, auth_headers: dict[str, Any], test_product: Product
+):
+    response = client.put(
+        f"/api/v1/products/{test_product.id}/stock-shards",
+        headers=auth_headers,
+        json={"shards": 3},
+    )
+    assert response.status_code == 403
+
+
+def chunked(body: bytes, size: int = 7) -> Iterator[bytes]:
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def test_import_products_csv(
+    client: TestClient,
+    session: Session,
+    admin_headers: dict[str, Any],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "product_import_batch_size", 2)
+
+    body = (
+        "sku,name,description,price,stock_quantity,image_url\n"
+        'SKU-1,Café Grinder,"Burr grinder,\nsteel",49.90,5,\n'
+        "SKU-2,Kettle,Gooseneck kettle,30.00,3,https://example.com/k.jpg\n"
+        "SKU-3,Broken,Missing price,,3,\n"
+        "SKU-4,Scale,Coffee scale,15.00,-1,\n"
+        "SKU-5,Filter,Paper filters,4.50,100\n"
+        "SKU-6,Mug,Ceramic mug,8.00,12,\n"
+    ).encode()
+
+    response = client.post(
+        "/api/v1/products/import",
+        headers={**admin_headers, "Content-Type": "text/csv"},
+        content=chunked(body),
+    )
+    assert response.status_code == 200
+
+    report = response.json()
+    assert report["rows"] == 6
+    assert report["imported"] == 3
+    assert report["failed"] == 3
+    assert [error["row"] for error in report["errors"]] == [3, 4, 5]
+    assert report["errors"][0]["errors"][0].startswith("price:")
+    assert report["errors"][2]["errors"] == ["Expected 6 columns, got 5"]
+
+    grinder = session.exec(select(Product).where(Product.sku == "SKU-1")).one()
+    assert grinder.name == "Café Grinder"
+    assert grinder.description == "Burr grinder,\nsteel"
+    assert grinder.image_url is None
+
+
+def test_import_products_csv_resyncs_after_bad_records(
+    client: TestClient,
+    session: Session,
+    admin_headers: dict[str, Any],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "product_import_max_record_length", 120)
+
+    body = "\n".join(
+        [
+            "sku,name,description,price,stock_quantity",
+            'SKU-1,Pizza stone 12" round,Cordierite,10.00,5',
+            'SKU-2,"Quote that never closes,Desc,1.00,1',
+            *["line swallowed by the open quote"] * 3,
+            "x" * 200,
+            "SKU-3,Baking Steel,Carbon steel,20.00,2",
+            'SKU-4,"Open at the end,Desc,3.00,3',
+        ]
+    ).encode()
+
+    response = client.post(
+        "/api/v1/products/import",
+        headers={**admin_headers, "Content-Type": "text/csv"},
+        content=chunked(body, 16),
+    )
+    assert response.status_code == 200
+
+    report = response.json()
+    assert (report["rows"], report["imported"]) == (5, 2)
+    assert [error["errors"] for error in report["errors"]] == [
+        ["Record longer than 120 characters"],
+        ["Line longer than 120 characters"],
+        ["Unexpected end of data"],
+    ]
+    names = session.exec(select(Product.name).order_by(Product.sku)).all()  # type: ignore
+    assert names == ['Pizza stone 12" round', "Baking Steel"]
+
+
+def test_import_products_ndjson_upserts_on_sku(
+    client: TestClient,
+    session: Session,
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    test_product.sku = "SKU-1"
+    session.add(test_product)
+    session.commit()
+
+    assert client.get(f"/api/v1/products/{test_product.id}").status_code == 200
+
+    body = b"\n".join(
+        [
+            b'{"sku": "SKU-1", "name": "Renamed Product", "description": "New",'
+            b' "price": "12.50", "stock_quantity": 4}',
+            b'{"sku": "SKU-2", "name": "Second Product", "description": "Fresh",'
+            b' "price": "3.00", "stock_quantity": 9}',
+            b"not json",
+            b"[1, 2]",
+        ]
+    )
+
+    response = client.post(
+        "/api/v1/products/import",
+        headers={**admin_headers, "Content-Type": "application/x-ndjson"},
+        content=body,
+    )
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert [error["row"] for error in response.json()["errors"]] == [3, 4]
+
+    product = client.get(f"/api/v1/products/{test_product.id}").json()
+    assert product["name"] == "Renamed Product"
+    assert product["stock_quantity"] == 4
+
+    session.refresh(test_product)
+    assert test_product.version == 2
+    assert len(session.exec(select(Product)).all()) == 2
+
+    search = client.get("/api/v1/products/search", params={"q": "renamed"})
+    assert [item["id"] for item in search.json()] == [test_product.id]
+
+
+def test_import_products_rejects_unknown_format(
+    client: TestClient, admin_headers: dict[str, Any]
+):
+    response = client.post(
+        "/api/v1/products/import",
+        headers={**admin_headers, "Content-Type": "application/json"},
+        content=b"[]",
+    )
+    assert response.status_code == 415
+
+
+def test_import_products_as_user_fails(
+    client: TestClient, auth_headers: dict[str, Any]
+):
+    response = client.post(
+        "/api/v1/products/import",
+        headers={**auth_headers, "Content-Type": "text/csv"},
+        content=b"name\n",
+    )
+    assert response.status_code == 403
+
+
+def test_create_product_with_duplicate_sku(
+    client: TestClient, admin_headers: dict[str, Any]
+):
+    product = {
+        "name": "SKU Product",
+        "description": "Has a SKU",
+        "price": "10.00",
+        "stock_quantity": 1,
+        "sku": "DUP-1",
+    }
+
+    assert (
+        client.post("/api/v1/products/", headers=admin_headers, json=product)
+    ).status_code == 201
+    assert (
+        client.post("/api/v1/products/", headers=admin_headers, json=product)
+    ).status_code == 409
+
+
+def test_export_products(
+    client: TestClient,
+    session: Session,
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    session.add(
+        Product(
+            name="Sold Out Product",
+            description="Nothing left",
+            price=Decimal("5.00"),
+            stock_quantity=0,
+        )
+    )
+    session.commit()
+
+    response = client.get("/api/v1/products/export", headers=admin_headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["name"] for row in rows] == ["Test Product", "Sold Out Product"]
+    assert rows[0]["price"] == "99.99"
+
+    response = client.get(
+        "/api/v1/products/export",
+        headers=admin_headers,
+        params={"format": "ndjson", "in_stock": True},
+    )
+    products = [json.loads(line) for line in response.text.splitlines()]
+    assert [product["id"] for product in products] == [test_product.id]
+    assert set(products[0]) == set(ProductResponse.model_fields)
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.models.order import OrderStatus
+from app.models.product import Product
+from app.models.report import DailyOrderStatus, DailyProductSales
+from app.models.reservation import StockReservation
+from app.services.reports import rebuild_reports
+from app.services.reservation import sweep_expired_reservations
+from app.services.webhook_inbox import drain_webhook_inbox
+
+
+def place_order(
+    client: TestClient, headers: dict[str, Any], product: Product, quantity: int
+) -> dict[str, Any]:
+    client.post(
+        "/api/v1/cart/items",
+        headers=headers,
+        json={"product_id": product.id, "quantity": quantity},
+    )
+    response = client.post("/api/v1/orders/", headers=headers)
+    assert response.status_code == 201
+    return response.json()
+
+
+def snapshot(session: Session) -> tuple[list[Any], list[Any]]:
+    session.expire_all()
+    sales = session.exec(
+        select(
+            DailyProductSales.day,
+            DailyProductSales.product_id,
+            DailyProductSales.quantity,
+            DailyProductSales.revenue_cents,
+        )
+        .where(DailyProductSales.quantity != 0)
+        .order_by(DailyProductSales.product_id)  # type: ignore
+    ).all()
+    statuses = session.exec(
+        select(
+            DailyOrderStatus.day,
+            DailyOrderStatus.status,
+            DailyOrderStatus.orders,
+            DailyOrderStatus.revenue_cents,
+        )
+        .where(DailyOrderStatus.orders != 0)
+        .order_by(DailyOrderStatus.status)  # type: ignore
+    ).all()
+    return list(sales), list(statuses)
+
+
+def test_reports_follow_order_lifecycle(
+    client: TestClient,
+    engine: Engine,
+    session: Session,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    paid = place_order(client, auth_headers, test_product, 2)
+    cancelled = place_order(client, auth_headers, test_product, 1)
+    place_order(client, auth_headers, test_product, 3)
+
+    client.post(
+        "/api/v1/webhooks/stripe",
+        json={
+            "type": "checkout.session.completed",
+            "data": {"object": {"metadata": {"order_id": str(paid["id"])}}},
+        },
+    )
+    asyncio.run(drain_webhook_inbox())
+    response = client.patch(
+        f"/api/v1/orders/{cancelled['id']}",
+        headers=admin_headers,
+        json={"status": "cancelled"},
+    )
+    assert response.status_code == 200
+
+    response = client.get(
+        "/api/v1/admin/reports/revenue-by-product", headers=admin_headers
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"product_id": test_product.id, "quantity": 5, "revenue": "499.95"}
+    ]
+
+    response = client.get(
+        "/api/v1/admin/reports/orders-by-status", headers=admin_headers
+    )
+    assert [(row["status"], row["orders"]) for row in response.json()] == [
+        ("cancelled", 1),
+        ("paid", 1),
+        ("pending", 1),
+    ]
+
+    incremental = snapshot(session)
+    with engine.begin() as connection:
+        rebuild_reports(connection)
+    assert snapshot(session) == incremental
+
+
+def test_reports_count_swept_orders_as_cancelled(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    place_order(client, auth_headers, test_product, 2)
+
+    reservation = session.exec(select(StockReservation)).one()
+    reservation.expires_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+    session.add(reservation)
+    session.commit()
+
+    asyncio.run(sweep_expired_reservations())
+
+    sales, statuses = snapshot(session)
+    assert sales == []
+    assert [(status, orders) for _, status, orders, _ in statuses] == [
+        (OrderStatus.CANCELLED, 1)
+    ]
+
+    response = client.get(
+        "/api/v1/admin/reports/revenue-by-product", headers=admin_headers
+    )
+    assert response.json() == []
+
+
+def test_reports_filter_by_day(
+    client: TestClient,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    place_order(client, auth_headers, test_product, 1)
+    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).date()
+
+    response = client.get(
+        "/api/v1/admin/reports/orders-by-status",
+        headers=admin_headers,
+        params={"start": tomorrow.isoformat()},
+    )
+    assert response.json() == []
+
+    response = client.get(
+        "/api/v1/admin/reports/revenue-by-product",
+        headers=admin_headers,
+        params={"end": tomorrow.isoformat()},
+    )
+    assert Decimal(response.json()[0]["revenue"]) == Decimal("99.99")
+
+
+def test_regular_user_cannot_read_reports(
+    client: TestClient, auth_headers: dict[str, Any]
+):
+    response = client.get(
+        "/api/v1/admin/reports/orders-by-status", headers=auth_headers
+    )
+    assert response.status_code == 403
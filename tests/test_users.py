@@ -1,8 +1,10 @@
 from typing import Any
 
 from fastapi.testclient import TestClient
+from sqlmodel import Session
 
-from app.models.user import User
+from app.models.user import User, UserRole
+from tests.conftest import QueryCounter
 
 
 def test_get_my_profile(
@@ -101,3 +103,43 @@ def test_change_password_mismatch(client: TestClient, auth_headers: dict[str, An
 
     assert response.status_code == 422
     assert "do not match" in str(response.json()).lower()
+
+
+def test_get_profile_from_token_claims_without_queries(
+    client: TestClient, auth_headers: dict[str, Any], query_counter: QueryCounter
+):
+    before = query_counter.count
+
+    response = client.get("/api/v1/users/me", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert query_counter.count == before
+
+
+def test_change_password_revokes_existing_tokens(
+    client: TestClient, auth_headers: dict[str, Any]
+):
+    client.put(
+        "/api/v1/users/me/password",
+        headers=auth_headers,
+        json={
+            "current_password": "TestPass123!",
+            "new_password": "NewPass123!",
+            "confirm_password": "NewPass123!",
+        },
+    )
+
+    response = client.get("/api/v1/users/me", headers=auth_headers)
+
+    assert response.status_code == 401
+
+
+def test_role_change_bumps_token_version(session: Session, test_user: User):
+    version = test_user.token_version
+
+    test_user.role = UserRole.ADMIN
+    session.add(test_user)
+    session.commit()
+    session.refresh(test_user)
+
+    assert test_user.token_version == version + 1
@@ -0,0 +1,234 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select, update
+
+from app.config import settings
+from app.models.order import Order, OrderStatus
+from app.models.product import Product
+from app.models.reservation import StockReservation
+from app.models.webhook import WebhookEvent, WebhookEventStatus
+from app.services import webhook_inbox
+from app.services.reservation import sweep_expired_reservations
+from app.services.webhook_inbox import drain_webhook_inbox
+from tests.test_reports import place_order
+
+
+def completed_event(event_id: str, order_id: int) -> dict[str, Any]:
+    return {
+        "id": event_id,
+        "type": "checkout.session.completed",
+        "data": {"object": {"metadata": {"order_id": str(order_id)}}},
+    }
+
+
+def test_webhook_is_queued_and_applied_once(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 2)
+    event = completed_event("evt_1", order["id"])
+
+    for _ in range(3):
+        response = client.post("/api/v1/webhooks/stripe", json=event)
+        assert response.status_code == 200
+
+    assert session.get(Order, order["id"]).status == OrderStatus.PENDING  # type: ignore
+    assert asyncio.run(drain_webhook_inbox()) == 1
+    assert asyncio.run(drain_webhook_inbox()) == 0
+
+    session.expire_all()
+    assert session.get(Order, order["id"]).status == OrderStatus.PAID  # type: ignore
+    inbox = session.exec(select(WebhookEvent)).one()
+    assert inbox.status == WebhookEventStatus.PROCESSED
+    assert inbox.processed_at is not None
+
+
+def test_webhook_rejects_invalid_payload(client: TestClient):
+    response = client.post("/api/v1/webhooks/stripe", content=b"not json")
+    assert response.status_code == 400
+
+    response = client.post("/api/v1/webhooks/stripe", json=[1, 2])
+    assert response.status_code == 400
+
+
+def test_expired_lease_is_reclaimed(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 1)
+    client.post("/api/v1/webhooks/stripe", json=completed_event("evt_1", order["id"]))
+
+    # Simulate a worker that claimed the event and died.
+    session.exec(
+        update(WebhookEvent).values(  # type: ignore
+            status=WebhookEventStatus.PROCESSING,
+            next_attempt_at=datetime.now(timezone.utc) + timedelta(minutes=1),
+        )
+    )
+    session.commit()
+    assert asyncio.run(drain_webhook_inbox()) == 0
+
+    session.exec(
+        update(WebhookEvent).values(  # type: ignore
+            next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1)
+        )
+    )
+    session.commit()
+    assert asyncio.run(drain_webhook_inbox()) == 1
+
+    session.expire_all()
+    assert session.get(Order, order["id"]).status == OrderStatus.PAID  # type: ignore
+
+
+def test_failed_events_are_retried_then_replayed(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "webhook_max_attempts", 2)
+    monkeypatch.setattr(webhook_inbox, "RETRY_BASE_SECONDS", 0)
+    order = place_order(client, auth_headers, test_product, 1)
+    client.post("/api/v1/webhooks/stripe", json=completed_event("evt_1", order["id"]))
+
+    original = webhook_inbox.apply_webhook_event
+
+    async def broken(*args: Any) -> None:
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(webhook_inbox, "apply_webhook_event", broken)
+    assert asyncio.run(drain_webhook_inbox()) == 2
+
+    event = session.exec(select(WebhookEvent)).one()
+    assert event.status == WebhookEventStatus.FAILED
+    assert event.attempts == 2
+    assert event.last_error == "RuntimeError: boom"
+    assert json.loads(event.payload)["id"] == "evt_1"
+
+    response = client.get("/api/v1/admin/webhooks/stats", headers=admin_headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "pending": 0,
+        "processing": 0,
+        "processed": 0,
+        "failed": 1,
+        "lag_seconds": 0.0,
+    }
+
+    response = client.get("/api/v1/admin/webhooks/events", headers=admin_headers)
+    assert [event["id"] for event in response.json()] == ["evt_1"]
+
+    monkeypatch.setattr(webhook_inbox, "apply_webhook_event", original)
+    response = client.post(
+        "/api/v1/admin/webhooks/replay", headers=admin_headers, json={}
+    )
+    assert response.json() == {"replayed": 1}
+
+    response = client.get("/api/v1/admin/webhooks/stats", headers=admin_headers)
+    assert response.json()["pending"] == 1
+    assert response.json()["lag_seconds"] > 0
+
+    assert asyncio.run(drain_webhook_inbox()) == 1
+    session.expire_all()
+    assert session.get(Order, order["id"]).status == OrderStatus.PAID  # type: ignore
+
+
+def test_webhook_admin_endpoints_require_admin(
+    client: TestClient, auth_headers: dict[str, Any]
+):
+    response = client.get("/api/v1/admin/webhooks/stats", headers=auth_headers)
+    assert response.status_code == 403
+
+
+def expire_and_sweep(session: Session, order_id: int) -> None:
+    session.exec(
+        update(StockReservation)  # type: ignore
+        .where(StockReservation.order_id == order_id)  # type: ignore
+        .values(expires_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+    )
+    session.commit()
+    assert asyncio.run(sweep_expired_reservations()) == 1
+
+
+def test_late_payment_takes_stock_again(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 4)
+    expire_and_sweep(session, order["id"])
+    session.refresh(test_product)
+    assert test_product.stock_quantity == 10
+
+    client.post("/api/v1/webhooks/stripe", json=completed_event("evt_1", order["id"]))
+    assert asyncio.run(drain_webhook_inbox()) == 1
+
+    session.expire_all()
+    assert session.get(Order, order["id"]).status == OrderStatus.PAID  # type: ignore
+    session.refresh(test_product)
+    assert (test_product.stock_quantity, test_product.reserved_quantity) == (6, 0)
+    assert (
+        client.get(f"/api/v1/products/{test_product.id}").json()["stock_quantity"] == 6
+    )
+
+
+def test_late_payment_without_stock_is_flagged_for_refund(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    test_product: Product,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(settings, "webhook_max_attempts", 1)
+    order = place_order(client, auth_headers, test_product, 4)
+    expire_and_sweep(session, order["id"])
+
+    # Someone else buys the returned stock before the payment lands.
+    place_order(client, auth_headers, test_product, 8)
+
+    client.post("/api/v1/webhooks/stripe", json=completed_event("evt_1", order["id"]))
+    assert asyncio.run(drain_webhook_inbox()) == 1
+
+    session.expire_all()
+    assert session.get(Order, order["id"]).status == OrderStatus.CANCELLED  # type: ignore
+    session.refresh(test_product)
+    assert (test_product.stock_quantity, test_product.reserved_quantity) == (2, 8)
+    inbox = session.exec(select(WebhookEvent)).one()
+    assert inbox.status == WebhookEventStatus.FAILED
+    assert "needs a refund" in (inbox.last_error or "")
+
+
+def test_admin_cannot_reopen_cancelled_order(
+    client: TestClient,
+    session: Session,
+    auth_headers: dict[str, Any],
+    admin_headers: dict[str, Any],
+    test_product: Product,
+):
+    order = place_order(client, auth_headers, test_product, 4)
+    expire_and_sweep(session, order["id"])
+
+    for new_status in ("paid", "shipping", "pending"):
+        response = client.patch(
+            f"/api/v1/orders/{order['id']}",
+            headers=admin_headers,
+            json={"status": new_status},
+        )
+        assert response.status_code == 400
+
+    session.expire_all()
+    assert session.get(Order, order["id"]).status == OrderStatus.CANCELLED  # type: ignore
+    session.refresh(test_product)
+    assert test_product.stock_quantity == 10